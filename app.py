@@ -4,16 +4,19 @@ Flask application for tenant portal management
 """
 import os
 from datetime import datetime, timedelta
+from decimal import Decimal
 from functools import wraps
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, url_for, send_file, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate, upgrade
 from flask_jwt_extended import (
-    JWTManager, create_access_token, jwt_required, 
+    JWTManager, create_access_token, create_refresh_token, jwt_required, 
     get_jwt_identity, get_jwt
 )
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import select
+from werkzeug.http import generate_etag, quote_etag
 import stripe
 
 # Initialize Flask app
@@ -24,13 +27,55 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'postgresql://
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-change-in-production')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', '15')))
+app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=int(os.getenv('JWT_REFRESH_TOKEN_DAYS', '30')))
+app.config['CACHE_REDIS_URL'] = os.getenv('CACHE_REDIS_URL')
+app.config['CACHE_L1_TTL'] = int(os.getenv('CACHE_L1_TTL', '5'))
+app.config['CHANGES_NOTIFY'] = os.getenv('CHANGES_NOTIFY', 'false').lower() == 'true'
+app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', 'true').lower() == 'true'
+# Redis in production: the database fallback writes a row on every login attempt
+app.config['RATELIMIT_REDIS_URL'] = os.getenv('RATELIMIT_REDIS_URL', app.config['CACHE_REDIS_URL'])
+app.config['RATELIMIT_STORAGE'] = os.getenv(
+    'RATELIMIT_STORAGE', 'redis' if app.config['RATELIMIT_REDIS_URL'] not in (None, 'memory') else 'database'
+)
+app.config['RATE_LIMITS'] = {}  # scope -> '10/minute' overrides for the defaults on each route
 
 # Initialize extensions (db is initialized in models.py)
-from models import db, User, Tenant, PropertyManager, Payment, Event, EventDocument, EventRSVP, Room, Booking, ServiceRequest, Message, DirectoryEntry
+from models import db, User, Tenant, PropertyManager, Payment, Event, EventDocument, EventRSVP, Room, Booking, ServiceRequest, Message, DirectoryEntry, AuditLog, SyncTombstone
+from keys import parse_key
+from serializers import FastJSONProvider, serialize_many, select_fields
+import compression
+import exports
+import notifications
+import jobs
+import changes
+import cache
+import ratelimit
+import passwords
+import revocation
+import directory_import
+import sync
+import dashboard
+import rollups
+import map_tiles
+import calendar_feeds
+import search
+import audit
+from ratelimit import limiter
 
+app.json = FastJSONProvider(app)
 db.init_app(app)
+migrate = Migrate(app, db)
+compression.init_app(app)
+cache.init_app(app)
+changes.init_app(app)
+ratelimit.init_app(app)
+# Behind Azure's front end remote_addr is the proxy; trust that many X-Forwarded-For hops
+if int(os.getenv('PROXY_FIX_HOPS', '0')):
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.getenv('PROXY_FIX_HOPS')))
 jwt = JWTManager(app)
+revocation.init_app(jwt)
 CORS(app, origins=os.getenv('CORS_ORIGINS', '*').split(','))
 
 # Stripe configuration
@@ -45,16 +90,33 @@ def role_required(roles):
         @jwt_required()
         def wrapper(*args, **kwargs):
             current_user_id = get_jwt_identity()
-            user = User.query.get(int(current_user_id))
+            user = User.query.get(parse_key(current_user_id))
             if not user or user.role not in roles:
                 return jsonify({'error': 'Unauthorized access'}), 403
             return fn(*args, **kwargs)
         return wrapper
     return decorator
 
+@app.errorhandler(passwords.HashPoolBusy)
+def password_hashing_busy(e):
+    """Shed login load instead of queueing requests behind the hash pool"""
+    response = jsonify({'error': 'Service busy, please retry'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '2'
+    return response
+
 # ==================== AUTHENTICATION ROUTES ====================
 
+def issue_tokens(user_id, family=None):
+    """Access and refresh tokens sharing a family id, so logout can revoke the whole login"""
+    claims = {'fam': family or revocation.new_family()}
+    return {
+        'access_token': create_access_token(identity=str(user_id), additional_claims=claims),
+        'refresh_token': create_refresh_token(identity=str(user_id), additional_claims=claims),
+    }
+
 @app.route('/api/auth/register', methods=['POST'])
+@limiter.limit('10/hour', scope='register')
 def register():
     """Register a new tenant user"""
     data = request.get_json()
@@ -71,7 +133,7 @@ def register():
     # Create user
     user = User(
         email=data['email'],
-        password_hash=generate_password_hash(data['password']),
+        password_hash=passwords.hash_password(data['password']),
         role='tenant'
     )
     db.session.add(user)
@@ -88,12 +150,9 @@ def register():
     db.session.add(tenant)
     db.session.commit()
     
-    # Generate access token
-    access_token = create_access_token(identity=str(user.id))
-    
     return jsonify({
         'message': 'User registered successfully',
-        'access_token': access_token,
+        **issue_tokens(user.id),
         'user': {
             'id': user.id,
             'email': user.email,
@@ -102,6 +161,7 @@ def register():
     }), 201
 
 @app.route('/api/auth/login', methods=['POST'])
+@limiter.limit('10/minute', scope='login')
 def login():
     """Login user and return JWT token"""
     data = request.get_json()
@@ -111,13 +171,16 @@ def login():
     
     user = User.query.filter_by(email=data['email']).first()
     
-    if not user or not check_password_hash(user.password_hash, data['password']):
+    if not user or not passwords.verify_password(user.password_hash, data['password']):
         return jsonify({'error': 'Invalid email or password'}), 401
     
-    access_token = create_access_token(identity=str(user.id))
+    # Upgrade hashes made with older parameters while we have the plaintext
+    if passwords.needs_rehash(user.password_hash):
+        user.password_hash = passwords.hash_password(data['password'])
+        db.session.commit()
     
     return jsonify({
-        'access_token': access_token,
+        **issue_tokens(user.id),
         'user': {
             'id': user.id,
             'email': user.email,
@@ -125,16 +188,50 @@ def login():
         }
     }), 200
 
+@app.route('/api/auth/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    """Exchange a refresh token for new tokens; the old refresh token is single-use"""
+    claims = get_jwt()
+    if not revocation.revoke_token(claims):
+        # A concurrent refresh spent this token first: treat it as a replay and end the login
+        revocation.revoke_token(claims, family=True)
+        db.session.commit()
+        return jsonify({'msg': 'Token has been revoked'}), 401
+    db.session.commit()
+    return jsonify(issue_tokens(get_jwt_identity(), claims.get('fam'))), 200
+
+@app.route('/api/auth/logout', methods=['POST'])
+@jwt_required(verify_type=False)
+def logout():
+    """Revoke every token issued by this login"""
+    revocation.revoke_token(get_jwt(), family=True)
+    db.session.commit()
+    return jsonify({'message': 'Logged out'}), 200
+
 @app.route('/api/auth/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
     """Get current user profile"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(int(current_user_id))
+    profile = _cached_profile(parse_key(get_jwt_identity()))
     
-    if not user:
+    if not profile:
         return jsonify({'error': 'User not found'}), 404
     
+    return jsonify(profile), 200
+
+def _cached_profile(user_id):
+    return cache.data_cache.get_or_set(
+        f'profile:{user_id}', lambda: _load_profile(user_id), ttl=300, tags=('profiles',)
+    )
+
+def _load_profile(user_id):
+    """Build the profile payload for a user, or None when the user is missing"""
+    user = User.query.get(user_id)
+    
+    if not user:
+        return None
+    
     profile = {'id': user.id, 'email': user.email, 'role': user.role}
     
     if user.role == 'tenant':
@@ -148,14 +245,14 @@ def get_profile():
         if manager:
             profile['name'] = manager.name
     
-    return jsonify(profile), 200
+    return profile
 
 @app.route('/api/auth/profile', methods=['PUT'])
 @jwt_required()
 def update_profile():
     """Update user profile"""
     current_user_id = get_jwt_identity()
-    user = User.query.get(int(current_user_id))
+    user = User.query.get(parse_key(current_user_id))
     data = request.get_json()
     
     if not user:
@@ -182,29 +279,27 @@ def update_profile():
 def get_payments():
     """Get payment history for current tenant"""
     current_user_id = get_jwt_identity()
-    tenant = Tenant.query.filter_by(user_id=int(current_user_id)).first()
+    tenant_id = db.session.execute(
+        select(Tenant.id).filter_by(user_id=parse_key(current_user_id))
+    ).scalar()
     
-    if not tenant:
+    if not tenant_id:
         return jsonify({'error': 'Tenant not found'}), 404
     
-    payments = Payment.query.filter_by(tenant_id=tenant.id).order_by(Payment.due_date.desc()).all()
+    payments = db.session.execute(
+        select_fields(Payment).filter_by(tenant_id=tenant_id).order_by(Payment.due_date.desc())
+    )
     
-    return jsonify([{
-        'id': p.id,
-        'amount': float(p.amount),
-        'due_date': p.due_date.isoformat(),
-        'paid_date': p.paid_date.isoformat() if p.paid_date else None,
-        'status': p.status,
-        'is_recurring': p.is_recurring
-    } for p in payments]), 200
+    return jsonify(serialize_many(payments, Payment)), 200
 
 @app.route('/api/payments/initiate', methods=['POST'])
 @jwt_required()
 @role_required(['tenant'])
+@limiter.limit('5/minute', scope='payments.initiate', key='identity')
 def initiate_payment():
     """Initiate a new payment with Stripe"""
     current_user_id = get_jwt_identity()
-    tenant = Tenant.query.filter_by(user_id=int(current_user_id)).first()
+    tenant = Tenant.query.filter_by(user_id=parse_key(current_user_id)).first()
     data = request.get_json()
     
     if not tenant:
@@ -257,24 +352,15 @@ def stripe_webhook():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
     
-    # Handle payment success
-    if event['type'] == 'payment_intent.succeeded':
-        payment_intent = event['data']['object']
-        payment = Payment.query.filter_by(stripe_charge_id=payment_intent['id']).first()
-        
-        if payment:
-            payment.status = 'paid'
-            payment.paid_date = datetime.now()
-            db.session.commit()
-    
-    # Handle payment failure
-    elif event['type'] == 'payment_intent.payment_failed':
-        payment_intent = event['data']['object']
-        payment = Payment.query.filter_by(stripe_charge_id=payment_intent['id']).first()
-        
-        if payment:
-            payment.status = 'failed'
-            db.session.commit()
+    # Apply the event off the request path; Stripe retries dedupe on event id
+    if event['type'] in ('payment_intent.succeeded', 'payment_intent.payment_failed'):
+        jobs.enqueue(
+            'payments.apply_stripe_event',
+            {'event_type': event['type'], 'intent_id': event['data']['object']['id']},
+            priority=10,
+            dedupe_key=f"stripe:{event['id']}"
+        )
+        db.session.commit()
     
     return jsonify({'status': 'success'}), 200
 
@@ -284,19 +370,12 @@ def stripe_webhook():
 @jwt_required()
 def get_events():
     """Get all events"""
-    events = Event.query.order_by(Event.event_date.desc(), Event.event_time.desc()).all()
-    
-    return jsonify([{
-        'id': e.id,
-        'title': e.title,
-        'description': e.description,
-        'event_date': e.event_date.isoformat(),
-        'event_time': e.event_time.isoformat(),
-        'location': e.location,
-        'contact_person': e.contact_person,
-        'requires_rsvp': e.requires_rsvp,
-        'created_at': e.created_at.isoformat()
-    } for e in events]), 200
+    return jsonify(_cached_events()), 200
+
+def _cached_events():
+    return cache.data_cache.get_or_set('events:list', lambda: serialize_many(db.session.execute(
+        select_fields(Event).order_by(Event.event_date.desc(), Event.event_time.desc())
+    ), Event), ttl=300, tags=('events',))
 
 @app.route('/api/events', methods=['POST'])
 @jwt_required()
@@ -304,7 +383,7 @@ def get_events():
 def create_event():
     """Create a new event"""
     current_user_id = get_jwt_identity()
-    tenant = Tenant.query.filter_by(user_id=int(current_user_id)).first()
+    tenant = Tenant.query.filter_by(user_id=parse_key(current_user_id)).first()
     data = request.get_json()
     
     if not tenant:
@@ -326,28 +405,537 @@ def create_event():
     
     return jsonify({'message': 'Event created successfully', 'event_id': event.id}), 201
 
+# ==================== CALENDAR ROUTES ====================
+
+@app.route('/api/calendar/feeds', methods=['GET'])
+@jwt_required()
+def get_calendar_feeds():
+    """Subscription URLs for the user's .ics feeds, issuing a feed token on first use"""
+    user = User.query.get(parse_key(get_jwt_identity()))
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    if not user.calendar_token:
+        user.calendar_token = calendar_feeds.new_token()
+        db.session.commit()
+    return jsonify(_calendar_feed_urls(user)), 200
+
+@app.route('/api/calendar/feeds/rotate', methods=['POST'])
+@jwt_required()
+def rotate_calendar_feeds():
+    """Issue a new feed token; subscriptions using the old URLs stop updating"""
+    user = User.query.get(parse_key(get_jwt_identity()))
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    user.calendar_token = calendar_feeds.new_token()
+    db.session.commit()
+    return jsonify(_calendar_feed_urls(user)), 200
+
+def _calendar_feed_urls(user):
+    urls = {'events': url_for('get_events_feed', token=user.calendar_token, _external=True)}
+    if user.role == 'tenant':
+        urls['bookings'] = url_for('get_bookings_feed', token=user.calendar_token, _external=True)
+    return urls
+
+@app.route('/api/calendar/<token>/events.ics', methods=['GET'])
+def get_events_feed(token):
+    """Building events from 30 days ago to a year ahead, for calendar subscriptions"""
+    if not calendar_feeds.subscriber(token):
+        return jsonify({'error': 'Feed not found'}), 404
+    return _calendar_response(calendar_feeds.events_feed())
+
+@app.route('/api/calendar/<token>/bookings.ics', methods=['GET'])
+def get_bookings_feed(token):
+    """The tenant's pending and approved room bookings, for calendar subscriptions"""
+    subscriber = calendar_feeds.subscriber(token)
+    if not subscriber or not subscriber['tenant_id']:
+        return jsonify({'error': 'Feed not found'}), 404
+    return _calendar_response(calendar_feeds.bookings_feed(subscriber['tenant_id']))
+
+def _calendar_response(feed):
+    # Calendar apps revalidate every poll; unchanged feeds cost a cache hit and a 304
+    response = app.response_class(feed['body'], mimetype='text/calendar')
+    response.set_etag(feed['etag'])
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 # ==================== DIRECTORY ROUTES ====================
 
 @app.route('/api/directory', methods=['GET'])
 @jwt_required()
 def get_directory():
     """Get building directory"""
-    entries = DirectoryEntry.query.order_by(DirectoryEntry.suite_number).all()
-    
-    return jsonify([{
-        'id': e.id,
-        'suite_number': e.suite_number,
-        'business_name': e.business_name,
-        'map_coordinates': e.map_coordinates
-    } for e in entries]), 200
+    response = jsonify(_cached_directory())
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def _cached_directory():
+    return cache.data_cache.get_or_set('directory:list', lambda: serialize_many(db.session.execute(
+        select_fields(DirectoryEntry).order_by(DirectoryEntry.suite_number)
+    ), DirectoryEntry), ttl=3600, tags=('directory',))
+
+def _directory_etag():
+    """The ETag GET /api/directory sends, so clients can revalidate without downloading the list"""
+    return cache.data_cache.get_or_set(
+        'directory:etag', lambda: quote_etag(generate_etag(jsonify(_cached_directory()).get_data())),
+        ttl=3600, tags=('directory',)
+    )
 
 @app.route('/api/directory/map/pdf', methods=['GET'])
 def get_map_pdf():
     """Get map PDF URL"""
     # In production, this would return the Azure Blob Storage URL
-    map_url = os.getenv('MAP_PDF_URL', '/static/OfficeDirectory_and_Map.pdf')
+    map_url = os.getenv('MAP_PDF_URL') or url_for('get_map_pdf_file')
     return jsonify({'url': map_url}), 200
 
+MAP_PDF_PATH = map_tiles.MAP_PDF_PATH
+_map_pdf_cache = {}
+
+@app.route('/api/directory/map/pdf/file', methods=['GET'])
+def get_map_pdf_file():
+    """Serve the map PDF with an ETag so compressed copies are cached"""
+    try:
+        mtime = os.path.getmtime(MAP_PDF_PATH)
+    except OSError:
+        return jsonify({'error': 'Map not found'}), 404
+    
+    if _map_pdf_cache.get('mtime') != mtime:
+        with open(MAP_PDF_PATH, 'rb') as f:
+            _map_pdf_cache.update(mtime=mtime, data=f.read())
+    
+    response = app.response_class(_map_pdf_cache['data'], mimetype='application/pdf')
+    response.add_etag()
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    return response.make_conditional(request)
+
+MAP_TILE_MAX_AGE = 3600
+
+@app.route('/api/directory/map/tiles', methods=['GET'])
+def get_map_tiles():
+    """Floor tile pyramids: size, zoom levels and a versioned tile URL template per floor"""
+    manifest = map_tiles.read_manifest()
+    if not manifest:
+        return jsonify({'error': 'Map tiles not generated'}), 404
+    
+    floors = {}
+    for floor, info in manifest['floors'].items():
+        floors[floor] = {
+            'width': info['width'],
+            'height': info['height'],
+            'max_zoom': info['max_zoom'],
+            'version': info['version'],
+            'url': f"{request.script_root}/api/directory/map/tiles/{floor}/{{z}}/{{x}}/{{y}}?v={info['version']}",
+        }
+    return jsonify({'tile_size': manifest['tile_size'], 'format': manifest['format'], 'floors': floors}), 200
+
+@app.route('/api/directory/map/tiles/<int:floor>/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def get_map_tile(floor, z, x, y):
+    """Serve one map tile straight from disk; gunicorn hands the file to sendfile()"""
+    tile = map_tiles.tile(floor, z, x, y)
+    if not tile:
+        return jsonify({'error': 'Tile not found'}), 404
+    path, version, mimetype = tile
+    
+    try:
+        response = send_file(path, mimetype=mimetype, etag=f'{version}-{z}-{x}-{y}',
+                             max_age=MAP_TILE_MAX_AGE, conditional=True)
+    except FileNotFoundError:
+        return jsonify({'error': 'Tile not found'}), 404
+    if request.args.get('v') == version:
+        # Versioned URLs change whenever the floor is re-tiled, so they never need revalidating
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    return response
+
+@app.route('/api/manager/directory/import', methods=['POST'])
+@jwt_required()
+@role_required(['property_manager'])
+def import_directory():
+    """Bulk upsert directory entries from an uploaded CSV/JSON file or request body"""
+    upload = request.files.get('file')
+    if upload is not None:
+        text = upload.read().decode('utf-8-sig')
+        fmt = 'csv' if (upload.filename or '').lower().endswith('.csv') else 'json'
+    else:
+        text = request.get_data(as_text=True)
+        fmt = 'csv' if request.mimetype == 'text/csv' else 'json'
+    
+    try:
+        summary = directory_import.import_entries(
+            directory_import.parse(text, fmt),
+            prune=request.args.get('prune', 'false').lower() == 'true',
+            dry_run=request.args.get('dry_run', 'false').lower() == 'true',
+        )
+    except directory_import.DirectoryImportError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(summary), 200
+
+# ==================== MESSAGE ROUTES ====================
+
+MESSAGE_AUDIENCES = {'tenant': ['all', 'tenant'], 'property_manager': ['all', 'manager']}
+
+@app.route('/api/messages', methods=['GET'])
+@jwt_required()
+def get_messages():
+    """Get current message board posts for the user's role"""
+    user = User.query.get(parse_key(get_jwt_identity()))
+    
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    now = datetime.utcnow()
+    messages = db.session.execute(
+        select_fields(Message)
+        .where(Message.recipient_type.in_(MESSAGE_AUDIENCES.get(user.role, ['all'])))
+        .where(db.or_(Message.expires_at.is_(None), Message.expires_at > now))
+        .order_by(Message.created_at.desc())
+        .limit(100)
+    )
+    
+    return jsonify(serialize_many(messages, Message)), 200
+
+@app.route('/api/messages', methods=['POST'])
+@jwt_required()
+@role_required(['property_manager'])
+def create_message():
+    """Post a message; urgent messages are also queued for email delivery"""
+    current_user_id = get_jwt_identity()
+    data = request.get_json()
+    
+    if not data.get('content'):
+        return jsonify({'error': 'Content is required'}), 400
+    
+    recipient_type = data.get('recipient_type', 'all')
+    if recipient_type not in ('all', 'tenant', 'manager'):
+        return jsonify({'error': 'Invalid recipient_type'}), 400
+    
+    message = Message(
+        sender_id=parse_key(current_user_id),
+        recipient_type=recipient_type,
+        content=data['content'],
+        is_urgent=data.get('is_urgent', False),
+        is_important=data.get('is_important', False),
+        expires_at=datetime.fromisoformat(data['expires_at']) if data.get('expires_at') else None
+    )
+    db.session.add(message)
+    
+    queued = 0
+    if message.is_urgent:
+        # Outbox rows are written in this transaction; the notification worker delivers them
+        queued = notifications.enqueue_broadcast(
+            'Urgent building announcement', message.content,
+            recipient_type=recipient_type, urgent=True
+        )
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Message posted successfully',
+        'message_id': message.id,
+        'notifications_queued': queued
+    }), 201
+
+# ==================== BOOTSTRAP ROUTES ====================
+
+BOOTSTRAP_SECTIONS = ('profile', 'events', 'directory', 'payments', 'messages')
+OUTSTANDING_STATUSES = ('due', 'overdue', 'failed')
+UPCOMING_EVENTS_LIMIT = 20
+
+@app.route('/api/bootstrap', methods=['GET'])
+@jwt_required()
+def bootstrap():
+    """Everything the app loads on launch, in one response
+
+    ?sections=profile,events limits the response to those sections. ?since= (ISO
+    timestamp of the client's last launch) limits urgent messages to newer ones.
+    """
+    sections = BOOTSTRAP_SECTIONS
+    if request.args.get('sections'):
+        sections = [s.strip() for s in request.args['sections'].split(',') if s.strip()]
+        unknown = sorted(set(sections) - set(BOOTSTRAP_SECTIONS))
+        if unknown:
+            return jsonify({'error': f'Unknown sections: {", ".join(unknown)}'}), 400
+    since = None
+    if request.args.get('since'):
+        try:
+            since = datetime.fromisoformat(request.args['since'])
+        except ValueError:
+            return jsonify({'error': 'since must be an ISO timestamp'}), 400
+    
+    # Profile, events and directory come from the shared cache; the remaining
+    # sections are one query each in this request's session transaction
+    user_id = parse_key(get_jwt_identity())
+    profile = _cached_profile(user_id)
+    if not profile:
+        return jsonify({'error': 'User not found'}), 404
+    
+    result = {}
+    if 'profile' in sections:
+        result['profile'] = profile
+    if 'events' in sections:
+        today = datetime.utcnow().date().isoformat()
+        upcoming = [e for e in _cached_events() if e['event_date'] >= today]
+        upcoming.sort(key=lambda e: (e['event_date'], e['event_time']))
+        result['events'] = upcoming[:UPCOMING_EVENTS_LIMIT]
+    if 'directory' in sections:
+        result['directory'] = {'etag': _directory_etag()}
+    if 'payments' in sections and profile['role'] == 'tenant':
+        result['payments'] = _outstanding_payments(user_id)
+    if 'messages' in sections:
+        result['messages'] = _urgent_messages(profile['role'], since)
+    
+    return jsonify(result), 200
+
+def _outstanding_payments(user_id):
+    """Count, total and earliest due date of unpaid charges, by status"""
+    rows = db.session.execute(
+        select(Payment.status, db.func.count(), db.func.sum(Payment.amount), db.func.min(Payment.due_date))
+        .join(Tenant, Tenant.id == Payment.tenant_id)
+        .where(Tenant.user_id == user_id, Payment.status.in_(OUTSTANDING_STATUSES))
+        .group_by(Payment.status)
+    ).all()
+    by_status = {status: {'count': count, 'total': total} for status, count, total, _ in rows}
+    next_due = min((due for _, _, _, due in rows), default=None)
+    return {
+        'count': sum(count for _, count, _, _ in rows),
+        'total': sum((total for _, _, total, _ in rows), Decimal('0.00')),
+        'next_due_date': next_due.isoformat() if next_due else None,
+        'by_status': by_status,
+    }
+
+def _urgent_messages(role, since=None):
+    now = datetime.utcnow()
+    query = (
+        select_fields(Message)
+        .where(Message.is_urgent.is_(True))
+        .where(Message.recipient_type.in_(MESSAGE_AUDIENCES.get(role, ['all'])))
+        .where(db.or_(Message.expires_at.is_(None), Message.expires_at > now))
+        .order_by(Message.created_at.desc())
+        .limit(20)
+    )
+    if since is not None:
+        query = query.where(Message.created_at > since)
+    return serialize_many(db.session.execute(query), Message)
+
+# ==================== SYNC ROUTES ====================
+
+@app.route('/api/sync', methods=['GET'])
+@jwt_required()
+def delta_sync():
+    """Rows changed and deleted since ?since=<version>, one page per call
+
+    Clients start from since=0 and repeat with the returned version while
+    has_more is true. A 410 means the version is too old: clear local data and
+    start again from 0.
+    """
+    try:
+        since = int(request.args.get('since', 0))
+        limit = min(int(request.args.get('limit', sync.PAGE_SIZE)), sync.MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'since and limit must be integers'}), 400
+    if since < 0 or limit < 1:
+        return jsonify({'error': 'since must be >= 0 and limit >= 1'}), 400
+    
+    user = db.session.execute(
+        select(User.role, Tenant.id.label('tenant_id'))
+        .outerjoin(Tenant, Tenant.user_id == User.id)
+        .where(User.id == parse_key(get_jwt_identity()))
+    ).first()
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    audiences = MESSAGE_AUDIENCES.get(user.role, ['all'])
+    filters = {'messages': [Message.recipient_type.in_(audiences)]}
+    deleted_filters = {'messages': [SyncTombstone.recipient_type.in_(audiences)]}
+    if user.role == 'tenant':
+        filters['bookings'] = [Booking.tenant_id == user.tenant_id]
+        filters['service_requests'] = [ServiceRequest.tenant_id == user.tenant_id]
+        deleted_filters['bookings'] = [SyncTombstone.tenant_id == user.tenant_id]
+        deleted_filters['service_requests'] = [SyncTombstone.tenant_id == user.tenant_id]
+    
+    try:
+        changes, deleted, version, has_more = sync.changes_since(since, limit, filters, deleted_filters)
+    except sync.SyncExpired:
+        return jsonify({'error': 'Sync version expired, resync from 0', 'reset': True}), 410
+    
+    return jsonify({'version': version, 'has_more': has_more, 'changes': changes, 'deleted': deleted}), 200
+
+# ==================== SEARCH ROUTES ====================
+
+@app.route('/api/search', methods=['GET'])
+@jwt_required()
+def search_content():
+    """Ranked full-text search over events, messages and service requests
+
+    ?q= takes web search syntax; ?type= (repeatable) limits the result types.
+    Pass next_cursor back as ?cursor= for the following page.
+    """
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({'error': 'q is required'}), 400
+    if len(text) > search.MAX_QUERY_LENGTH:
+        return jsonify({'error': f'q must be at most {search.MAX_QUERY_LENGTH} characters'}), 400
+    types = request.args.getlist('type') or search.TYPES
+    unknown = sorted(set(types) - set(search.TYPES))
+    if unknown:
+        return jsonify({'error': f'Unknown types: {", ".join(unknown)}'}), 400
+    try:
+        limit = min(int(request.args.get('limit', search.PAGE_SIZE)), search.MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be >= 1'}), 400
+    
+    user = db.session.execute(
+        select(User.role, Tenant.id.label('tenant_id'))
+        .outerjoin(Tenant, Tenant.user_id == User.id)
+        .where(User.id == parse_key(get_jwt_identity()))
+    ).first()
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    filters = {'messages': [
+        Message.recipient_type.in_(MESSAGE_AUDIENCES.get(user.role, ['all'])),
+        db.or_(Message.expires_at.is_(None), Message.expires_at > datetime.utcnow()),
+    ]}
+    if user.role != 'property_manager':
+        # Tenants only see their own requests (none without a tenant record)
+        filters['service_requests'] = [ServiceRequest.tenant_id == user.tenant_id]
+    
+    try:
+        results, next_cursor = search.search(text, types, filters, limit, request.args.get('cursor'))
+    except search.InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    return jsonify({'results': results, 'next_cursor': next_cursor}), 200
+
+# ==================== MANAGER DASHBOARD ROUTES ====================
+
+@app.route('/api/manager/dashboard', methods=['GET'])
+@jwt_required()
+@role_required(['property_manager'])
+def manager_dashboard():
+    """Building-wide vacancy, rent, service request and booking counts"""
+    return jsonify(dashboard.summary()), 200
+
+# ==================== MANAGER REPORT ROUTES ====================
+
+@app.route('/api/manager/reports/rooms', methods=['GET'])
+@jwt_required()
+@role_required(['property_manager'])
+def room_usage_report():
+    """Room utilization, approval rate and revenue by hour, day or month, from rollups"""
+    grain = request.args.get('grain', 'day')
+    if grain not in rollups.GRAINS:
+        return jsonify({'error': 'grain must be hour, day or month'}), 400
+    
+    try:
+        start = exports.parse_date(request.args.get('start'))
+        end = exports.parse_date(request.args.get('end'))
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    end = datetime.combine(end or datetime.utcnow().date(), datetime.min.time()) + timedelta(days=1)
+    start = datetime.combine(start, datetime.min.time()) if start else end - timedelta(days=365)
+    if start >= end:
+        return jsonify({'error': 'start must be on or before end'}), 400
+    if grain == 'hour' and end - start > rollups.MAX_HOURLY_RANGE:
+        return jsonify({'error': 'Hourly reports cover at most 31 days'}), 400
+    
+    try:
+        room_ids = [parse_key(value) for value in request.args.getlist('room_id')]
+    except ValueError:
+        return jsonify({'error': 'Invalid room_id'}), 400
+    return jsonify({
+        'grain': grain,
+        'start': start.date().isoformat(),
+        'end': (end - timedelta(days=1)).date().isoformat(),
+        'rooms': rollups.report(start, end, grain, room_ids),
+    }), 200
+
+# ==================== MANAGER EXPORT ROUTES ====================
+
+@app.route('/api/manager/exports/<kind>', methods=['GET'])
+@jwt_required()
+@role_required(['property_manager'])
+def export_records(kind):
+    """Stream payments, bookings or service requests as NDJSON or CSV"""
+    export = exports.EXPORTS.get(kind)
+    if not export:
+        return jsonify({'error': 'Unknown export'}), 404
+    
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in exports.FORMATS:
+        return jsonify({'error': 'Format must be ndjson or csv'}), 400
+    
+    try:
+        start = exports.parse_date(request.args.get('start'))
+        end = exports.parse_date(request.args.get('end'))
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    
+    status = request.args.getlist('status') or None
+    chunks = exports.generate(export, fmt, start=start, end=end, status=status)
+    
+    response = app.response_class(stream_with_context(chunks), mimetype=exports.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={kind}.{fmt}'
+    return response
+
+# ==================== MANAGER JOB ROUTES ====================
+
+@app.route('/api/manager/jobs', methods=['GET'])
+@jwt_required()
+@role_required(['property_manager'])
+def get_job_stats():
+    """Background job queue depth and latency"""
+    window = request.args.get('window_minutes', 60, type=int)
+    return jsonify(jobs.queue_stats(window)), 200
+
+# ==================== MANAGER AUDIT ROUTES ====================
+
+AUDIT_PAGE_SIZE = 50
+AUDIT_MAX_PAGE_SIZE = 500
+
+@app.route('/api/manager/audit', methods=['GET'])
+@jwt_required()
+@role_required(['property_manager'])
+def get_audit_log():
+    """Audit entries, newest first
+
+    Filters: entity_type, entity_id, actor_id, action, source, since and until
+    (ISO timestamps). Pass next_before back as ?before= for the following page.
+    Buffered entries appear within AUDIT_FLUSH_SECONDS of the change.
+    """
+    try:
+        limit = min(request.args.get('limit', AUDIT_PAGE_SIZE, type=int), AUDIT_MAX_PAGE_SIZE)
+        before = int(request.args['before']) if request.args.get('before') else None
+        since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+        until = datetime.fromisoformat(request.args['until']) if request.args.get('until') else None
+        actor_id = parse_key(request.args['actor_id']) if request.args.get('actor_id') else None
+    except ValueError:
+        return jsonify({'error': 'before must be an integer and since/until ISO timestamps'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be >= 1'}), 400
+    
+    filters = []
+    for name in ('entity_type', 'entity_id', 'action', 'source'):
+        if request.args.get(name):
+            filters.append(getattr(AuditLog, name) == request.args[name])
+    if actor_id is not None:
+        filters.append(AuditLog.actor_id == actor_id)
+    if since:
+        filters.append(AuditLog.occurred_at >= since)
+    if until:
+        filters.append(AuditLog.occurred_at < until)
+    
+    entries = audit.entries(filters, before, limit + 1)
+    next_before = entries[limit - 1]['id'] if len(entries) > limit else None
+    return jsonify({'entries': entries[:limit], 'next_before': next_before}), 200
+
 # ==================== HEALTH CHECK ====================
 
 @app.route('/api/health', methods=['GET'])
@@ -369,5 +957,5 @@ def index():
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        upgrade()
     app.run(debug=os.getenv('FLASK_ENV') == 'development', host='0.0.0.0', port=5000)
@@ -0,0 +1,324 @@
+"""
+Audit log for Corporate Office 101
+Session hooks record who changed which row, from which endpoint or job, with
+the old and new value of every changed column. AUDIT_DURABILITY picks when the
+records are written:
+
+  transaction  in the same transaction as the change (never lost, one extra
+               INSERT per commit)
+  buffered     after commit, in batches from a background thread (the default;
+               records still buffered when a process dies are lost)
+  off          not recorded
+
+Buffered batches use COPY on psycopg 3 and a multi-row INSERT elsewhere. A batch
+that fails AUDIT_MAX_ATTEMPTS writes in a row is logged and dropped
+"""
+import atexit
+import contextvars
+import logging
+import os
+import threading
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from flask import has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, inspect, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement
+
+from keys import parse_key
+from models import (
+    db, AuditLog, Booking, DirectoryEntry, Event, EventRSVP, Message, Payment, PropertyManager, Room,
+    ServiceRequest, Tenant, User,
+)
+from serializers import serialize_many, select_fields
+
+DURABILITIES = ('transaction', 'buffered', 'off')
+DURABILITY = os.getenv('AUDIT_DURABILITY', 'buffered')
+if DURABILITY not in DURABILITIES:
+    raise ValueError(f'AUDIT_DURABILITY must be one of {", ".join(DURABILITIES)}')
+FLUSH_SECONDS = float(os.getenv('AUDIT_FLUSH_SECONDS', '2'))
+BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '1000'))
+MAX_BUFFERED = int(os.getenv('AUDIT_MAX_BUFFERED', '100000'))
+MAX_ATTEMPTS = int(os.getenv('AUDIT_MAX_ATTEMPTS', '5'))
+
+AUDITED = frozenset({User, Tenant, PropertyManager, Payment, Event, EventRSVP, Room, Booking,
+                     ServiceRequest, Message, DirectoryEntry})
+_audited_tables = frozenset(model.__tablename__ for model in AUDITED)
+REDACTED = frozenset({'password_hash', 'calendar_token'})
+IGNORED = frozenset({'change_version', 'search_vector', 'updated_at'})
+COLUMNS = ('occurred_at', 'actor_id', 'source', 'ip', 'action', 'entity_type', 'entity_id', 'changes')
+
+logger = logging.getLogger(__name__)
+
+_source = contextvars.ContextVar('audit_source', default=None)
+
+
+@contextmanager
+def source(name):
+    """Attribute changes made outside a request, e.g. source(f'job:{name}')"""
+    token = _source.set(name)
+    try:
+        yield
+    finally:
+        _source.reset(token)
+
+
+# ==================== CAPTURE ====================
+
+def _plain(value):
+    if value is None or isinstance(value, (bool, int, float, str, dict, list)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return str(value)
+
+
+def _value(key, value):
+    return '[redacted]' if key in REDACTED and value is not None else _plain(value)
+
+
+def _actor():
+    """(actor_id, source, ip) for the current request, job or script"""
+    if not has_request_context():
+        return None, _source.get() or 'system', None
+    try:
+        identity = get_jwt_identity()
+    except RuntimeError:  # the endpoint does not verify a JWT
+        identity = None
+    return parse_key(identity) if identity else None, request.endpoint, request.remote_addr
+
+
+def _record(action, entity_type, entity_id, changes):
+    actor_id, origin, ip = _actor()
+    return {
+        'occurred_at': datetime.utcnow(), 'actor_id': actor_id, 'source': origin, 'ip': ip,
+        'action': action, 'entity_type': entity_type,
+        'entity_id': None if entity_id is None else str(entity_id), 'changes': changes,
+    }
+
+
+def _diff(obj, action):
+    state = inspect(obj)
+    changes = {}
+    for attr in state.mapper.column_attrs:
+        key = attr.key
+        if key in IGNORED:
+            continue
+        history = state.attrs[key].history
+        if action == 'insert':
+            value = history.added[0] if history.added else None
+            if value is not None:
+                changes[key] = _value(key, value)
+        elif action == 'delete':
+            value = (history.deleted or history.unchanged or [None])[0]
+            if value is not None:
+                changes[key] = _value(key, value)
+        elif history.has_changes():
+            # The set listeners below load the old value, so no deleted entry means it was NULL
+            old = history.deleted[0] if history.deleted else None
+            changes[key] = [_value(key, old), _value(key, history.added[0] if history.added else None)]
+    return changes
+
+
+def _noop(target, value, oldvalue, initiator):
+    return value
+
+
+# Load the replaced value on assignment, including expired and deferred columns,
+# so updates record what the row held rather than None
+for _model in AUDITED:
+    for _attr in inspect(_model).column_attrs:
+        if _attr.key not in IGNORED:
+            event.listen(getattr(_model, _attr.key), 'set', _noop, active_history=True, retval=True)
+
+
+def _primary_key(obj):
+    return inspect(obj).mapper.primary_key_from_instance(obj)[0]
+
+
+def _sql(clause):
+    try:
+        return str(clause.compile(compile_kwargs={'literal_binds': True}))
+    except Exception:  # a type without a literal renderer
+        return str(clause)
+
+
+def _pending(session):
+    return session.info.setdefault('audit_records', [])
+
+
+@event.listens_for(Session, 'after_flush')
+def _capture_flush(session, flush_context):
+    # History is still intact here and new rows already have their keys
+    if DURABILITY == 'off':
+        return
+    records = []
+    for action, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            if type(obj) not in AUDITED:
+                continue
+            if action == 'update' and not session.is_modified(obj, include_collections=False):
+                continue
+            changes = _diff(obj, action)
+            if action == 'update' and not changes:
+                continue
+            records.append(_record(action, obj.__tablename__, _primary_key(obj), changes))
+    if records:
+        _pending(session).extend(records)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _capture_bulk(orm_execute_state):
+    statement = orm_execute_state.statement
+    table = getattr(statement, 'table', None)
+    if DURABILITY == 'off' or not getattr(statement, 'is_dml', False) or table is None:
+        return
+    if table.name not in _audited_tables:
+        return
+    action = 'bulk_insert' if statement.is_insert else 'bulk_update' if statement.is_update else 'bulk_delete'
+    values = getattr(statement, '_values', None) or {}
+    changes = {}
+    for key, value in values.items():
+        key = getattr(key, 'key', key)
+        value = getattr(value, 'value', value)  # bound literals; SQL expressions are shown as SQL
+        changes[key] = _sql(value) if isinstance(value, ClauseElement) else _value(key, value)
+    where = getattr(statement, 'whereclause', None)  # INSERT has none
+    if where is not None:
+        changes['where'] = _sql(where)
+    if isinstance(orm_execute_state.parameters, list):
+        changes['rows'] = len(orm_execute_state.parameters)
+    _pending(orm_execute_state.session).append(_record(action, table.name, None, changes))
+
+
+@event.listens_for(Session, 'before_commit')
+def _write_in_transaction(session):
+    if DURABILITY != 'transaction':
+        return
+    session.flush()
+    records = session.info.pop('audit_records', None)
+    if records:
+        session.connection().execute(insert(AuditLog.__table__), records)
+
+
+@event.listens_for(Session, 'after_commit')
+def _hand_to_buffer(session):
+    # In transaction mode this only sees records captured after our before_commit ran
+    records = session.info.pop('audit_records', None)
+    if records:
+        buffer.add(records, session.get_bind())
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('audit_records', None)
+
+
+# ==================== BUFFERED WRITES ====================
+
+def write(connection, records):
+    """Insert records; COPY when the driver is psycopg 3, a multi-row INSERT otherwise"""
+    if connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg':
+        from psycopg.types.json import Jsonb
+        cursor = connection.connection.dbapi_connection.cursor()
+        with cursor.copy(f'COPY {AuditLog.__tablename__} ({", ".join(COLUMNS)}) FROM STDIN') as copy:
+            for record in records:
+                copy.write_row([Jsonb(record[c]) if c == 'changes' else record[c] for c in COLUMNS])
+    else:
+        connection.execute(insert(AuditLog.__table__), records)
+
+
+class AuditBuffer:
+    """Per-process queue of committed audit records, written in batches by a daemon thread"""
+
+    def __init__(self, max_records=MAX_BUFFERED):
+        self.records = deque()
+        self.max_records = max_records
+        self.dropped = 0
+        self.failures = 0
+        self.engine = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+
+    def add(self, records, engine):
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked child starts empty: its parent still owns what it had buffered
+                self._pid = os.getpid()
+                self.records.clear()
+                threading.Thread(target=self._run, name='audit-writer', daemon=True).start()
+            self.engine = engine
+            self.records.extend(records)
+            overflow = len(self.records) - self.max_records
+            for _ in range(max(overflow, 0)):
+                self.records.popleft()
+            self.dropped += max(overflow, 0)
+            if len(self.records) >= BATCH_SIZE:
+                self._wake.set()
+
+    def flush(self):
+        """Write everything buffered; returns the number of records written"""
+        written = 0
+        while True:
+            with self._lock:
+                batch = [self.records.popleft() for _ in range(min(BATCH_SIZE, len(self.records)))]
+                engine = self.engine
+            if not batch:
+                return written
+            try:
+                with engine.begin() as connection:
+                    write(connection, batch)
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                    if self.failures < MAX_ATTEMPTS:
+                        self.records.extendleft(reversed(batch))  # retried on the next pass
+                    else:
+                        # Stop a batch the database keeps rejecting from blocking the queue
+                        self.failures = 0
+                        self.dropped += len(batch)
+                        logger.error('Dropped %d audit records after %d failed writes',
+                                     len(batch), MAX_ATTEMPTS)
+                raise
+            self.failures = 0
+            written += len(batch)
+
+    def _run(self):
+        while True:
+            self._wake.wait(FLUSH_SECONDS)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Could not write %d buffered audit records', len(self.records))
+
+
+buffer = AuditBuffer()
+
+
+@atexit.register
+def _flush_at_exit():
+    if buffer.records and buffer._pid == os.getpid():
+        try:
+            buffer.flush()
+        except Exception:
+            logger.exception('Lost %d buffered audit records at exit', len(buffer.records))
+
+
+# ==================== QUERIES ====================
+
+def entries(filters=(), before=None, limit=50):
+    """Newest audit entries matching filters, with ids below before"""
+    query = select_fields(AuditLog).where(*filters).order_by(AuditLog.id.desc()).limit(limit)
+    if before is not None:
+        query = query.where(AuditLog.id < before)
+    return serialize_many(db.session.execute(query), AuditLog)
@@ -28,6 +28,7 @@ app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
 
 # Initialize extensions (db is initialized in models.py)
 from models import db, User, Tenant, PropertyManager, Payment, Event, EventDocument, EventRSVP, Room, Booking, ServiceRequest, Message, DirectoryEntry
+from keys import parse_key
 
 db.init_app(app)
 jwt = JWTManager(app)
@@ -44,7 +45,7 @@ def role_required(roles):
         @wraps(fn)
         @jwt_required()
         def wrapper(*args, **kwargs):
-            current_user_id = get_jwt_identity()
+            current_user_id = parse_key(get_jwt_identity())
             user = User.query.get(current_user_id)
             if not user or user.role not in roles:
                 return jsonify({'error': 'Unauthorized access'}), 403
@@ -89,7 +90,7 @@ def register():
     db.session.commit()
     
     # Generate access token
-    access_token = create_access_token(identity=user.id)
+    access_token = create_access_token(identity=str(user.id))
     
     return jsonify({
         'message': 'User registered successfully',
@@ -114,7 +115,7 @@ def login():
     if not user or not check_password_hash(user.password_hash, data['password']):
         return jsonify({'error': 'Invalid email or password'}), 401
     
-    access_token = create_access_token(identity=user.id)
+    access_token = create_access_token(identity=str(user.id))
     
     return jsonify({
         'access_token': access_token,
@@ -129,7 +130,7 @@ def login():
 @jwt_required()
 def get_profile():
     """Get current user profile"""
-    current_user_id = get_jwt_identity()
+    current_user_id = parse_key(get_jwt_identity())
     user = User.query.get(current_user_id)
     
     if not user:
@@ -154,7 +155,7 @@ def get_profile():
 @jwt_required()
 def update_profile():
     """Update user profile"""
-    current_user_id = get_jwt_identity()
+    current_user_id = parse_key(get_jwt_identity())
     user = User.query.get(current_user_id)
     data = request.get_json()
     
@@ -181,7 +182,7 @@ def update_profile():
 @role_required(['tenant'])
 def get_payments():
     """Get payment history for current tenant"""
-    current_user_id = get_jwt_identity()
+    current_user_id = parse_key(get_jwt_identity())
     tenant = Tenant.query.filter_by(user_id=current_user_id).first()
     
     if not tenant:
@@ -203,7 +204,7 @@ def get_payments():
 @role_required(['tenant'])
 def initiate_payment():
     """Initiate a new payment with Stripe"""
-    current_user_id = get_jwt_identity()
+    current_user_id = parse_key(get_jwt_identity())
     tenant = Tenant.query.filter_by(user_id=current_user_id).first()
     data = request.get_json()
     
@@ -303,7 +304,7 @@ def get_events():
 @role_required(['tenant'])
 def create_event():
     """Create a new event"""
-    current_user_id = get_jwt_identity()
+    current_user_id = parse_key(get_jwt_identity())
     tenant = Tenant.query.filter_by(user_id=current_user_id).first()
     data = request.get_json()
     
@@ -0,0 +1,4 @@
+"""
+Benchmark scripts for Corporate Office 101 API
+Run from the repository root, e.g. `python -m benchmarks.bench_serialization`
+"""
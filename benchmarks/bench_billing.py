@@ -0,0 +1,37 @@
+"""
+Month-end billing run time for a building's worth of recurring tenants
+"""
+import sys
+import time
+from datetime import date
+
+from benchmarks.common import app, db
+from billing import next_period, run_billing_cycle
+from models import Payment, Tenant
+
+TENANTS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        db.session.execute(Tenant.__table__.insert(), [
+            dict(business_name=f'Tenant {i}', suite_number=f'S{i}') for i in range(TENANTS)
+        ])
+        tenant_ids = db.session.execute(db.select(Tenant.id)).scalars().all()
+        db.session.execute(Payment.__table__.insert(), [dict(
+            tenant_id=tenant_id, amount='1250.00', due_date=date.today().replace(day=1),
+            status='paid', is_recurring=True
+        ) for tenant_id in tenant_ids])
+        db.session.commit()
+
+        period = next_period()
+        for attempt in ('first run', 're-run'):
+            started = time.perf_counter()
+            summary = run_billing_cycle(period, create_intents=False)
+            print(f'{TENANTS} tenants {attempt:<9} {time.perf_counter() - started:6.3f} s  {summary}')
+        print(f'{db.session.query(Payment).filter_by(billing_period=period).count()} payments in period')
+
+
+if __name__ == '__main__':
+    main()
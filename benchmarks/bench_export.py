@@ -0,0 +1,78 @@
+"""
+Peak memory while streaming the payments export at increasing row counts
+Memory should stay flat: only one cursor batch is alive at a time. Exits
+non-zero if the peak at the largest size grows past FLAT_RATIO times the peak
+at the smallest. The default 10k and 100k rows run in seconds; pass a larger
+row count for the full run, e.g. python -m benchmarks.bench_export 1000000
+"""
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from benchmarks.common import app, db
+from exports import EXPORTS, generate
+from models import Payment, Tenant, User
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+INSERT_BATCH = 50_000
+FLAT_RATIO = 1.5
+
+
+def seed_payments(tenant_id, start, stop):
+    today = date.today()
+    for offset in range(start, stop, INSERT_BATCH):
+        db.session.execute(Payment.__table__.insert(), [dict(
+            tenant_id=tenant_id, amount='1250.00', due_date=today - timedelta(days=i % 3650),
+            status='paid' if i % 4 else 'due', is_recurring=True, stripe_charge_id=f'pi_{i}'
+        ) for i in range(offset, min(offset + INSERT_BATCH, stop))])
+    db.session.commit()
+
+
+def stream(fmt):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = rows = 0
+    for chunk in generate(EXPORTS['payments'], fmt):
+        size += len(chunk)
+        rows += chunk.count(b'\n')
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows, size, elapsed, peak
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', password_hash='x', role='tenant')
+        db.session.add(user)
+        db.session.flush()
+        tenant = Tenant(user_id=user.id, business_name='Bench', suite_number='B1')
+        db.session.add(tenant)
+        db.session.commit()
+
+        seeded = 0
+        target = 10_000
+        peaks = {}
+        while True:
+            target = min(target, ROWS)
+            seed_payments(tenant.id, seeded, target)
+            seeded = target
+            for fmt in ('ndjson', 'csv'):
+                rows, size, elapsed, peak = stream(fmt)
+                peaks.setdefault(fmt, []).append(peak)
+                print(f'{seeded:>9} rows {fmt:<6} {size / 1e6:8.1f} MB out '
+                      f'{elapsed:6.2f} s   peak {peak / 1024:8.0f} KiB')
+            if seeded >= ROWS:
+                break
+            target *= 10
+
+    growth = {fmt: values[-1] / values[0] for fmt, values in peaks.items()}
+    print('peak growth ' + '   '.join(f'{fmt} {ratio:.2f}x' for fmt, ratio in growth.items()))
+    if any(ratio > FLAT_RATIO for ratio in growth.values()):
+        sys.exit(f'Export memory is not flat (limit {FLAT_RATIO}x)')
+
+
+if __name__ == '__main__':
+    main()
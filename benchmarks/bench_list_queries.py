@@ -0,0 +1,72 @@
+"""
+CPU and memory per list request: full ORM hydration vs column-projected rows
+"""
+import sys
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from benchmarks.common import app, db, measure, report
+from models import DirectoryEntry, Event, Payment, Tenant, User
+from serializers import dumps_bytes, select_fields, serialize_many
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+
+def seed(n):
+    db.create_all()
+    user = User(email='bench@example.com', password_hash='x', role='tenant')
+    db.session.add(user)
+    db.session.flush()
+    tenant = Tenant(user_id=user.id, business_name='Bench', suite_number='B1')
+    db.session.add(tenant)
+    db.session.flush()
+    today = date.today()
+    db.session.execute(Payment.__table__.insert(), [dict(
+        tenant_id=tenant.id, amount=Decimal('1250.00'), due_date=today - timedelta(days=i),
+        status='paid', is_recurring=True
+    ) for i in range(n)])
+    db.session.execute(Event.__table__.insert(), [dict(
+        creator_tenant_id=tenant.id, title=f'Event {i}', description='Building social',
+        event_date=today, event_time=time(18, 30), location='Ballroom', created_at=datetime.now()
+    ) for i in range(n)])
+    db.session.execute(DirectoryEntry.__table__.insert(), [dict(
+        suite_number=f'S{i}', business_name='Vacant', map_coordinates={'floor': 1, 'x': i, 'y': i}
+    ) for i in range(n)])
+    db.session.commit()
+    return tenant.id
+
+
+def orm_path(query, model):
+    def run():
+        dumps_bytes(serialize_many(query().all(), model))
+        db.session.expunge_all()
+    return run
+
+
+def projected_path(statement, model):
+    def run():
+        dumps_bytes(serialize_many(db.session.execute(statement()), model))
+    return run
+
+
+def main():
+    with app.app_context():
+        tenant_id = seed(ROWS)
+        print(f'{ROWS} rows per list on {db.engine.url.drivername}')
+        cases = (
+            ('payments', Payment,
+             lambda: Payment.query.filter_by(tenant_id=tenant_id).order_by(Payment.due_date.desc()),
+             lambda: select_fields(Payment).filter_by(tenant_id=tenant_id).order_by(Payment.due_date.desc())),
+            ('events', Event,
+             lambda: Event.query.order_by(Event.event_date.desc(), Event.event_time.desc()),
+             lambda: select_fields(Event).order_by(Event.event_date.desc(), Event.event_time.desc())),
+            ('directory', DirectoryEntry,
+             lambda: DirectoryEntry.query.order_by(DirectoryEntry.suite_number),
+             lambda: select_fields(DirectoryEntry).order_by(DirectoryEntry.suite_number)),
+        )
+        for name, model, query, statement in cases:
+            report(name, measure(orm_path(query, model)), measure(projected_path(statement, model)))
+
+
+if __name__ == '__main__':
+    main()
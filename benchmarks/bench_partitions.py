@@ -0,0 +1,133 @@
+"""
+Monthly partitions versus plain tables for payments and messages
+Needs Postgres: BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_partitions [scale]
+scale 1 seeds four years of history: 2M messages and 240k payments
+"""
+import sys
+import time
+from datetime import date
+
+from sqlalchemy import func, select, text
+from sqlalchemy.schema import AddConstraint, UniqueConstraint
+
+from benchmarks.common import app, db, measure, report
+from models import Message, Payment, Tenant, User
+import partitions
+
+SCALE = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+MESSAGES = int(2_000_000 * SCALE)
+TENANTS = 100
+MONTHS = 48
+FIRST = date(2022, 11, 1)
+TODAY = partitions.add_months(FIRST, MONTHS - 1)
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+    db.session.execute(text("INSERT INTO users (email, password_hash, role) "
+                            "SELECT 'bench' || g || '@example.com', 'x', 'tenant' FROM generate_series(1, :n) g"),
+                       {'n': TENANTS})
+    db.session.execute(text("INSERT INTO tenants (user_id, business_name, suite_number) "
+                            "SELECT id, 'Bench ' || id, 'S' || id FROM users"))
+    # Messages spread evenly over MONTHS; payments are one per tenant per day-of-month slot
+    db.session.execute(text(
+        "INSERT INTO messages (sender_id, recipient_type, content, created_at, is_urgent) "
+        "SELECT 1 + g % :tenants, (ARRAY['all', 'tenant', 'manager'])[1 + g % 3], 'notice ' || g, "
+        "CAST(:first AS timestamp) + (g * CAST(:months AS float) / :n) * interval '30.44 days', g % 50 = 0 "
+        "FROM generate_series(1, :n) g"
+    ), {'tenants': TENANTS, 'first': FIRST, 'months': MONTHS, 'n': MESSAGES})
+    db.session.execute(text(
+        "INSERT INTO payments (tenant_id, amount, due_date, status, is_recurring, billing_period) "
+        "SELECT t.id, 1000 + t.id, CAST(:first AS date) + m * interval '1 month' + d * interval '1 day', "
+        "CASE WHEN m < :months - 1 THEN 'paid' ELSE 'due' END, d = 0, "
+        "CASE WHEN d = 0 THEN CAST(:first AS date) + m * interval '1 month' END "
+        "FROM tenants t, generate_series(0, :months - 1) m, generate_series(0, :per_month - 1) d"
+    ), {'first': FIRST, 'months': MONTHS, 'per_month': max(int(50 * SCALE), 1)})
+    db.session.commit()
+
+
+def partition(model, column):
+    """Rebuild a table as monthly partitions, as migration 0010 does"""
+    table = model.__table__
+    old = f'{table.name}_plain'
+    with db.engine.begin() as connection:
+        connection.execute(text(f'ALTER TABLE {table.name} RENAME TO {old}'))
+        for index in table.indexes:
+            connection.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+        connection.execute(text(f'CREATE TABLE {table.name} (LIKE {old} INCLUDING DEFAULTS INCLUDING GENERATED) '
+                                f'PARTITION BY RANGE ({column})'))
+        partitions.create_partitions(connection, table.name, FIRST, partitions.add_months(TODAY, 6))
+        columns = ', '.join(c.name for c in table.columns if c.computed is None)
+        connection.execute(text(f'INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old}'))
+        connection.execute(text(f'DROP TABLE {old} CASCADE'))
+        connection.execute(text(f'ALTER TABLE {table.name} ADD PRIMARY KEY (id, {column})'))
+        for constraint in table.constraints:
+            if isinstance(constraint, UniqueConstraint):
+                connection.execute(AddConstraint(constraint))
+        for index in table.indexes:
+            index.create(connection)
+        connection.execute(text(f'ANALYZE {table.name}'))
+
+
+def queries():
+    month = partitions.add_months(TODAY, -13)
+    feed = (select(Message.id, Message.content, Message.created_at)
+            .where(Message.recipient_type.in_(['all', 'tenant']), Message.expires_at.is_(None))
+            .order_by(Message.created_at.desc()).limit(100))
+    urgent = (select(Message.id).where(Message.is_urgent.is_(True), Message.recipient_type.in_(['all', 'tenant']),
+                                       Message.created_at > func.cast(TODAY, db.DateTime))
+              .order_by(Message.created_at.desc()).limit(20))
+    month_total = select(func.count(), func.sum(Payment.amount)).where(
+        Payment.due_date >= month, Payment.due_date < partitions.add_months(month, 1), Payment.status == 'paid')
+    history = select(Payment.id, Payment.amount, Payment.due_date).where(Payment.tenant_id == 7).order_by(
+        Payment.due_date.desc())
+    overdue = select(Payment.id).where(Payment.status == 'due', Payment.due_date < TODAY)
+    return {'feed': feed, 'urgent': urgent, 'month total': month_total, 'tenant hist': history, 'overdue': overdue}
+
+
+def run(statements):
+    return {name: measure(lambda s=statement: db.session.execute(s).all()) for name, statement in statements.items()}
+
+
+def retire_oldest(partitioned):
+    """Remove the oldest month of messages: DELETE on a plain table, DROP of a detached partition"""
+    started = time.perf_counter()
+    with db.engine.begin() as connection:
+        if partitioned:
+            name = partitions.partition_name('messages', FIRST)
+            connection.execute(text(f'ALTER TABLE messages DETACH PARTITION {name}'))
+            connection.execute(text(f'DROP TABLE {name}'))
+        else:
+            connection.execute(text('DELETE FROM messages WHERE created_at < :end'),
+                               {'end': partitions.add_months(FIRST, 1)})
+    return time.perf_counter() - started
+
+
+def main():
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            sys.exit('bench_partitions needs Postgres: set BENCH_DATABASE_URL=postgresql://...')
+        seed()
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+        counts = {model.__tablename__: db.session.query(model).count() for model in (Message, Payment, Tenant, User)}
+        print(', '.join(f'{count} {name}' for name, count in counts.items()) + f' over {MONTHS} months')
+        plain = run(queries())
+        db.session.commit()
+        deleted = retire_oldest(partitioned=False)
+
+        seed()
+        partition(Message, 'created_at')
+        partition(Payment, 'due_date')
+        partitioned = run(queries())
+        db.session.commit()
+        dropped = retire_oldest(partitioned=True)
+
+        for name in plain:
+            report(name, plain[name], partitioned[name])
+        print(f'retire 1 month of messages: DELETE {deleted * 1000:8.1f} ms   DETACH + DROP {dropped * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Login throughput against password hash cost, hashing inline versus in the process pool
+Also samples /api/health latency during the burst to show what happens to cheap requests
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import app, db
+from werkzeug.security import generate_password_hash
+
+import passwords
+from models import User
+
+LOGINS = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+THREADS = 4
+METHODS = ['pbkdf2:sha256:100000', 'pbkdf2:sha256:600000', 'scrypt:16384:8:1', 'scrypt:32768:8:1']
+
+
+def burst(client, email):
+    """Run LOGINS logins across THREADS threads while sampling health checks"""
+    def login(_):
+        response = client.post('/api/auth/login', json={'email': email, 'password': 'secret'})
+        assert response.status_code == 200, response.status_code
+
+    health = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        pending = [pool.submit(login, i) for i in range(LOGINS)]
+        while not all(f.done() for f in pending):
+            t = time.perf_counter()
+            client.get('/api/health')
+            health.append(time.perf_counter() - t)
+            time.sleep(0.01)
+        for f in pending:
+            f.result()
+    elapsed = time.perf_counter() - started
+    health.sort()
+    p95 = health[int(len(health) * 0.95)] if health else 0.0
+    return LOGINS / elapsed, p95
+
+
+def main():
+    app.config['RATELIMIT_ENABLED'] = False
+    client = app.test_client()
+    with app.app_context():
+        db.create_all()
+        for i, method in enumerate(METHODS):
+            db.session.add(User(email=f'user{i}@example.com', role='tenant',
+                                password_hash=generate_password_hash('secret', method)))
+        db.session.commit()
+
+    for i, method in enumerate(METHODS):
+        # Configure the stored method so logins do not trigger a rehash
+        passwords.HASH_METHOD = method
+        results = []
+        for pool_size in (0, 2):
+            passwords.POOL_SIZE = pool_size
+            passwords.verify_password(generate_password_hash('x', method), 'x')  # start the pool
+            results.append(burst(client, f'user{i}@example.com'))
+        (r0, h0), (r1, h1) = results
+        print(f'{method:<22} inline {r0:7.1f} logins/s health p95 {h0 * 1000:7.1f} ms   '
+              f'pool {r1:7.1f} logins/s health p95 {h1 * 1000:7.1f} ms')
+    passwords.shutdown()
+
+
+if __name__ == '__main__':
+    main()
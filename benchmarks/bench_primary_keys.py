@@ -0,0 +1,110 @@
+"""
+Insert throughput and index size for integer, UUIDv4 and UUIDv7 primary keys
+Loads ROWS payment-shaped rows per strategy, in id order as the app would, into
+BENCH_DATABASE_URL (a scratch SQLite file by default; use Postgres for numbers
+that match production)
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+
+from sqlalchemy import Column, Date, ForeignKey, MetaData, Numeric, String, Table, create_engine, text
+
+from keys import key_type, uuid7
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+BATCH = 10_000
+TENANTS = 500
+GENERATORS = {'integer': None, 'uuid4': uuid.uuid4, 'uuid7': uuid7}
+
+
+def payments_table(strategy):
+    metadata = MetaData()
+    Table(f'bench_tenants_{strategy}', metadata, Column('id', key_type(strategy), primary_key=True))
+    return metadata, Table(
+        f'bench_payments_{strategy}', metadata,
+        Column('id', key_type(strategy), primary_key=True),
+        Column('tenant_id', key_type(strategy), ForeignKey(f'bench_tenants_{strategy}.id'),
+               nullable=False, index=True),
+        Column('amount', Numeric(10, 2), nullable=False),
+        Column('due_date', Date, nullable=False),
+        Column('status', String(50), nullable=False),
+    )
+
+
+def index_bytes(connection, table):
+    """Size of the primary key index (Postgres) or of the table and its indexes (SQLite)"""
+    if connection.dialect.name == 'postgresql':
+        return connection.execute(text(
+            "SELECT pg_relation_size(indexrelid) FROM pg_index WHERE indrelid = CAST(:t AS regclass) AND indisprimary"
+        ), {'t': table.name}).scalar()
+    try:
+        return connection.execute(text(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name = :t OR name LIKE :auto"
+        ), {'t': table.name, 'auto': f'sqlite_autoindex_{table.name}%'}).scalar()
+    except Exception:
+        # No dbstat in this build: each strategy gets its own file, so count its used pages
+        used = (connection.execute(text('PRAGMA page_count')).scalar()
+                - connection.execute(text('PRAGMA freelist_count')).scalar())
+        return used * connection.execute(text('PRAGMA page_size')).scalar()
+
+
+def load(engine, strategy):
+    metadata, payments = payments_table(strategy)
+    tenants = metadata.tables[f'bench_tenants_{strategy}']
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    generate = GENERATORS[strategy]
+    with engine.begin() as connection:
+        tenant_rows = [{'id': generate()} if generate else {} for _ in range(TENANTS)]
+        if generate:
+            connection.execute(tenants.insert(), tenant_rows)
+            tenant_ids = [row['id'] for row in tenant_rows]
+        else:
+            connection.execute(tenants.insert(), [{'id': i + 1} for i in range(TENANTS)])
+            tenant_ids = list(range(1, TENANTS + 1))
+
+    start_date = date(2020, 1, 1)
+    started = time.perf_counter()
+    for offset in range(0, ROWS, BATCH):
+        rows = []
+        for i in range(offset, min(offset + BATCH, ROWS)):
+            row = {'tenant_id': tenant_ids[i % TENANTS], 'amount': '1250.00',
+                   'due_date': start_date + timedelta(days=i // TENANTS), 'status': 'paid'}
+            if generate:
+                row['id'] = generate()
+            rows.append(row)
+        with engine.begin() as connection:
+            connection.execute(payments.insert(), rows)
+    elapsed = time.perf_counter() - started
+
+    with engine.connect() as connection:
+        size = index_bytes(connection, payments)
+    if engine.dialect.name != 'sqlite':
+        metadata.drop_all(engine)
+    return elapsed, size
+
+
+def main():
+    url = os.getenv('BENCH_DATABASE_URL')
+    print(f'{ROWS} rows per strategy into {url or "scratch SQLite files"}')
+    for strategy in GENERATORS:
+        scratch = None
+        if url:
+            engine = create_engine(url)
+        else:
+            scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+            engine = create_engine(f'sqlite:///{scratch.name}')
+        elapsed, size = load(engine, strategy)
+        engine.dispose()
+        if scratch:
+            os.unlink(scratch.name)
+        print(f'{strategy:<8} {key_type(strategy).compile(dialect=engine.dialect):<9} '
+              f'{ROWS / elapsed:10.0f} rows/s   {elapsed:7.2f} s   index {size / 1024 / 1024:8.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
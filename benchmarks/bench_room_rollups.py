@@ -0,0 +1,42 @@
+"""
+Room rollup backfill: pure Python versus NumPy over a synthetic booking history
+Both paths are fed the same rows and must produce identical rollups
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from rollups import compute_numpy, compute_python
+
+BOOKINGS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+ROOMS = 20
+STATUSES = ('pending', 'approved', 'approved', 'approved', 'rejected', 'cancelled')
+
+
+def history(count):
+    rng = random.Random(42)
+    first = datetime(2021, 1, 1)
+    rows = []
+    for _ in range(count):
+        start = first + timedelta(minutes=rng.randrange(5 * 365 * 24 * 4) * 15)
+        rows.append((rng.randrange(1, ROOMS + 1), start,
+                     start + timedelta(minutes=rng.choice((30, 45, 60, 90, 120, 240, 480))), rng.choice(STATUSES)))
+    return rows
+
+
+def main():
+    rows = history(BOOKINGS)
+    rates = {room: 1500 + room * 250 for room in range(1, ROOMS + 1)}
+    results = {}
+    for name, compute in (('python', compute_python), ('numpy', compute_numpy)):
+        started = time.perf_counter()
+        results[name] = compute(rows, rates)
+        elapsed = time.perf_counter() - started
+        print(f'{name:<7} {BOOKINGS} bookings  {elapsed:7.2f} s  {BOOKINGS / elapsed:10.0f} bookings/s  '
+              f'{len(results[name])} rollups')
+    print('identical' if results['python'] == results['numpy'] else 'MISMATCH')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Search latency: ILIKE substring scans versus the GIN-indexed tsvector search
+Needs Postgres: BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_search [scale]
+scale 1 seeds 20k events, 200k messages and 100k service requests
+"""
+import random
+import sys
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import or_, select, text, union_all
+
+from benchmarks.common import app, db, measure, report
+from models import Event, Message, ServiceRequest, Tenant, User
+import search
+
+SCALE = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+COUNTS = {'events': int(20_000 * SCALE), 'messages': int(200_000 * SCALE), 'service_requests': int(100_000 * SCALE)}
+BATCH = 10_000
+
+BUILDING = ('elevator', 'parking', 'garage', 'lobby', 'badge', 'access', 'hvac', 'heating', 'cooling', 'leak',
+            'plumbing', 'restroom', 'lights', 'outage', 'power', 'fire', 'drill', 'alarm', 'security', 'delivery',
+            'package', 'mailroom', 'cleaning', 'janitorial', 'carpet', 'window', 'conference', 'room', 'booking',
+            'rent', 'invoice', 'lease', 'renewal', 'holiday', 'party', 'networking', 'breakfast', 'yoga', 'wifi',
+            'internet', 'printer', 'kitchen', 'coffee', 'recycling', 'trash', 'bike', 'storage', 'roof', 'noise')
+SYLLABLES = ('ka', 'lo', 'mi', 'ster', 'ven', 'tor', 'ba', 'quin', 'dra', 'sel', 'por', 'nu', 'fe', 'ril', 'gan')
+
+
+def vocabulary(rng, size=5000):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def sentence(rng, filler, words):
+    return ' '.join(rng.choice(BUILDING) if rng.random() < 0.15 else rng.choice(filler) for _ in range(words))
+
+
+def seed():
+    rng = random.Random(48)
+    filler = vocabulary(rng)
+    db.drop_all()
+    db.create_all()
+    user = User(email='bench@example.com', password_hash='x', role='property_manager')
+    db.session.add(user)
+    db.session.flush()
+    tenant = Tenant(user_id=user.id, business_name='Bench', suite_number='B1')
+    db.session.add(tenant)
+    db.session.flush()
+    started = datetime(2022, 1, 1)
+    rows = {
+        Event: lambda i: dict(creator_tenant_id=tenant.id, title=sentence(rng, filler, 4),
+                              description=sentence(rng, filler, 60), event_date=date(2022, 1, 1) + timedelta(days=i % 1500),
+                              event_time=time(12), location=sentence(rng, filler, 2), created_at=started + timedelta(minutes=i)),
+        Message: lambda i: dict(sender_id=user.id, recipient_type=rng.choice(('all', 'tenant', 'manager')),
+                                content=sentence(rng, filler, 40), created_at=started + timedelta(minutes=i)),
+        ServiceRequest: lambda i: dict(tenant_id=tenant.id, type=rng.choice(('maintenance', 'cleaning', 'meeting')),
+                                       description=sentence(rng, filler, 30), status='new',
+                                       created_at=started + timedelta(minutes=i)),
+    }
+    for model, make in rows.items():
+        for first in range(0, COUNTS[model.__tablename__], BATCH):
+            count = min(BATCH, COUNTS[model.__tablename__] - first)
+            db.session.execute(model.__table__.insert(), [make(first + i) for i in range(count)])
+        db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def ilike_path(term):
+    """What the endpoint would do without full-text search: substring scans, newest first"""
+    pattern = f'%{term}%'
+    branches = [
+        select(Event.id, Event.created_at).where(or_(Event.title.ilike(pattern), Event.description.ilike(pattern))),
+        select(Message.id, Message.created_at).where(Message.content.ilike(pattern)),
+        select(ServiceRequest.id, ServiceRequest.created_at).where(ServiceRequest.description.ilike(pattern)),
+    ]
+    merged = union_all(*branches).subquery()
+    statement = select(merged).order_by(merged.c.created_at.desc()).limit(search.PAGE_SIZE)
+    return lambda: db.session.execute(statement).all()
+
+
+def search_path(term, page=1):
+    cursor = None
+    for _ in range(page - 1):
+        cursor = search.search(term, cursor=cursor)[1]
+    return lambda: search.search(term, cursor=cursor)
+
+
+def main():
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            sys.exit('bench_search needs Postgres: set BENCH_DATABASE_URL=postgresql://...')
+        seed()
+        print(', '.join(f'{count} {name}' for name, count in COUNTS.items()) + f' on {db.engine.url.drivername}')
+        for term in ('elevator', 'garage', 'sterkaven'):
+            matches = db.session.execute(text(
+                "SELECT (SELECT count(*) FROM events WHERE search_vector @@ websearch_to_tsquery('english', :q))"
+                " + (SELECT count(*) FROM messages WHERE search_vector @@ websearch_to_tsquery('english', :q))"
+                " + (SELECT count(*) FROM service_requests WHERE search_vector @@ websearch_to_tsquery('english', :q))"
+            ), {'q': term}).scalar()
+            print(f'"{term}": {matches} matching rows')
+            report(term[:12], measure(ilike_path(term)), measure(search_path(term)))
+        report('page 5', measure(ilike_path('garage')), measure(search_path('garage', page=5)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Per-row serialization cost for the events and payments lists
+Compares the hand-built dict + stdlib json path with the compiled serializers
+"""
+import json
+import sys
+import timeit
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from models import Event, Payment
+from serializers import dumps_bytes, orjson, serialize_many
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+REPEAT = 5
+
+
+def make_payments(n):
+    today = date.today()
+    return [Payment(
+        id=i, tenant_id=1, amount=Decimal('1250.00'), due_date=today - timedelta(days=30 * (i % 24)),
+        paid_date=datetime.now() if i % 3 else None, status='paid' if i % 3 else 'due',
+        is_recurring=True
+    ) for i in range(n)]
+
+
+def make_events(n):
+    return [Event(
+        id=i, creator_tenant_id=1, title=f'Event {i}', description='Building social ' * 8,
+        event_date=date.today(), event_time=time(18, 30), location='Ballroom',
+        contact_person='Front Desk', requires_rsvp=bool(i % 2), created_at=datetime.now()
+    ) for i in range(n)]
+
+
+def legacy_payments(payments):
+    return json.dumps([{
+        'id': p.id,
+        'amount': float(p.amount),
+        'due_date': p.due_date.isoformat(),
+        'paid_date': p.paid_date.isoformat() if p.paid_date else None,
+        'status': p.status,
+        'is_recurring': p.is_recurring
+    } for p in payments])
+
+
+def legacy_events(events):
+    return json.dumps([{
+        'id': e.id,
+        'title': e.title,
+        'description': e.description,
+        'event_date': e.event_date.isoformat(),
+        'event_time': e.event_time.isoformat(),
+        'location': e.location,
+        'contact_person': e.contact_person,
+        'requires_rsvp': e.requires_rsvp,
+        'created_at': e.created_at.isoformat()
+    } for e in events])
+
+
+def per_row_us(fn, rows):
+    best = min(timeit.repeat(lambda: fn(rows), number=1, repeat=REPEAT))
+    return best / len(rows) * 1e6
+
+
+def main():
+    print(f'JSON backend: {"orjson" if orjson else "stdlib json"}, {ROWS} rows')
+    for name, rows, legacy, model in (
+        ('payments', make_payments(ROWS), legacy_payments, Payment),
+        ('events', make_events(ROWS), legacy_events, Event),
+    ):
+        before = per_row_us(legacy, rows)
+        after = per_row_us(lambda r: dumps_bytes(serialize_many(r, model)), rows)
+        print(f'{name:<10} legacy {before:7.2f} us/row   compiled {after:7.2f} us/row   '
+              f'speedup {before / after:4.1f}x')
+
+
+if __name__ == '__main__':
+    main()
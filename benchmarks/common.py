@@ -0,0 +1,42 @@
+"""
+Shared setup for benchmarks
+Points the app at BENCH_DATABASE_URL (in-memory SQLite by default) before importing it
+"""
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault('DATABASE_URL', os.getenv('BENCH_DATABASE_URL', 'sqlite://'))
+
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+
+
+@compiles(JSONB, 'sqlite')
+def _jsonb_on_sqlite(element, compiler, **kw):
+    return 'JSON'
+
+
+from app import app, db  # noqa: E402
+
+
+def measure(fn, repeat=5):
+    """Return (best wall seconds, peak traced bytes); timing runs are untraced"""
+    fn()  # warm up compiled statements and caches
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def report(name, before, after):
+    (t0, m0), (t1, m1) = before, after
+    print(f'{name:<12} before {t0 * 1000:8.2f} ms {m0 / 1024:9.0f} KiB   '
+          f'after {t1 * 1000:8.2f} ms {m1 / 1024:9.0f} KiB   '
+          f'cpu {t0 / t1:4.1f}x  mem {m0 / max(m1, 1):4.1f}x')
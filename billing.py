@@ -0,0 +1,221 @@
+"""
+Recurring rent billing for Corporate Office 101
+Generates the next period's Payment rows for every recurring tenant in one
+INSERT ... SELECT, creates the matching Stripe PaymentIntents in parallel and
+sweeps unpaid charges past their due date to 'overdue'
+"""
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import stripe
+from sqlalchemy import exists, func, literal, select, update
+from sqlalchemy.orm import aliased
+
+from dialects import insert_for
+from jobs import task
+from locking import try_advisory_xact_lock
+from models import db, Payment, Tenant
+
+STRIPE_CONCURRENCY = int(os.getenv('BILLING_STRIPE_CONCURRENCY', '8'))
+DUE_DAY = int(os.getenv('BILLING_DUE_DAY', '1'))
+
+
+def next_period(today=None):
+    """First day of the month after today"""
+    today = today or date.today()
+    if today.month == 12:
+        return date(today.year + 1, 1, 1)
+    return date(today.year, today.month + 1, 1)
+
+
+def parse_period(value):
+    """Parse YYYY-MM (or a full date) into the first day of that month"""
+    parts = value.split('-')
+    return date(int(parts[0]), int(parts[1]), 1)
+
+
+def generate_period_payments(period):
+    """Insert one 'due' Payment per recurring tenant for period; returns rows created
+
+    Amounts come from each tenant's latest recurring payment. Tenants that
+    already have a charge for period are skipped whatever its due date: the
+    payments partition key forces due_date into the unique constraint, so
+    (tenant_id, billing_period, due_date) alone would bill twice if
+    BILLING_DUE_DAY changed between runs. The constraint still settles
+    concurrent runs with the same due day.
+    """
+    billed = aliased(Payment)
+    latest = select(
+        Payment.tenant_id,
+        Payment.amount,
+        func.row_number().over(
+            partition_by=Payment.tenant_id,
+            order_by=(Payment.due_date.desc(), Payment.id.desc())
+        ).label('rank')
+    ).where(Payment.is_recurring.is_(True)).subquery()
+
+    due_date = period.replace(day=DUE_DAY)
+    source = select(
+        latest.c.tenant_id,
+        latest.c.amount,
+        literal(due_date, db.Date),
+        literal('due', db.String),
+        literal(True, db.Boolean),
+        literal(period, db.Date),
+    ).where(
+        latest.c.rank == 1,
+        ~exists().where(billed.tenant_id == latest.c.tenant_id, billed.billing_period == period),
+    )
+
+    insert = insert_for(db.engine.dialect.name)
+    stmt = insert(Payment.__table__).from_select(
+        ['tenant_id', 'amount', 'due_date', 'status', 'is_recurring', 'billing_period'], source
+    ).on_conflict_do_nothing(index_elements=['tenant_id', 'billing_period', 'due_date'])
+    result = db.session.execute(stmt)
+    db.session.commit()
+    return result.rowcount
+
+
+def _create_intent(charge):
+    payment_id, tenant_id, amount, business_name, customer_id, period = charge
+    params = {
+        'amount': int(amount * 100),  # Convert to cents
+        'currency': 'usd',
+        'metadata': {
+            'tenant_id': str(tenant_id),
+            'business_name': business_name,
+            'payment_id': str(payment_id),
+            'billing_period': period.isoformat(),
+        },
+        # Retries after a crash return the intent Stripe already created
+        'idempotency_key': f'rent-{tenant_id}-{period.isoformat()}',
+    }
+    if customer_id:
+        params['customer'] = customer_id
+    return payment_id, stripe.PaymentIntent.create(**params).id
+
+
+def create_payment_intents(period, concurrency=STRIPE_CONCURRENCY):
+    """Create PaymentIntents for period payments that don't have one yet
+
+    Returns (created, failed) counts. Failed rows keep a NULL stripe_charge_id
+    and are picked up again by the next run.
+    """
+    charges = db.session.execute(
+        select(Payment.id, Payment.tenant_id, Payment.amount, Tenant.business_name,
+               Tenant.stripe_customer_id, Payment.billing_period)
+        .join(Tenant, Tenant.id == Payment.tenant_id)
+        .where(Payment.billing_period == period, Payment.stripe_charge_id.is_(None))
+    ).all()
+    if not charges:
+        return 0, 0
+
+    updates = []
+    failed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(_create_intent, tuple(charge)) for charge in charges]
+        for future in futures:
+            try:
+                payment_id, intent_id = future.result()
+            except Exception:
+                failed += 1
+                continue
+            updates.append({'id': payment_id, 'stripe_charge_id': intent_id})
+
+    if updates:
+        # ORM bulk UPDATE by primary key: one executemany
+        db.session.execute(update(Payment), updates)
+        db.session.commit()
+    return len(updates), failed
+
+
+def run_billing_cycle(period=None, create_intents=True, concurrency=STRIPE_CONCURRENCY):
+    """Generate period payments and their PaymentIntents; returns a summary dict"""
+    period = period or next_period()
+    summary = {'period': period.isoformat(), 'payments_created': generate_period_payments(period)}
+    if create_intents and stripe.api_key:
+        created, failed = create_payment_intents(period, concurrency)
+        summary.update(intents_created=created, intents_failed=failed)
+    return summary
+
+
+def sweep_overdue(today=None, notify=None):
+    """Flip 'due' payments past their due date to 'overdue' in one UPDATE
+
+    Runs under an advisory lock so concurrent schedulers don't double-notify.
+    notify, if given, is called with the ids of affected tenants that have
+    email notifications enabled. Returns a summary dict, or None when
+    another process holds the lock.
+    """
+    today = today or date.today()
+    if not try_advisory_xact_lock('billing.sweep_overdue'):
+        db.session.rollback()
+        return None
+
+    tenant_ids = set(db.session.execute(
+        update(Payment.__table__)
+        .where(Payment.status == 'due', Payment.due_date < today)
+        .values(status='overdue')
+        .returning(Payment.tenant_id)
+    ).scalars())
+
+    notify_ids = []
+    if tenant_ids:
+        notify_ids = db.session.execute(
+            select(Tenant.id).where(Tenant.id.in_(tenant_ids), Tenant.email_notifications_enabled.is_(True))
+        ).scalars().all()
+        if notify and notify_ids:
+            notify(notify_ids)
+    db.session.commit()
+    return {'tenants_overdue': len(tenant_ids), 'tenants_notified': len(notify_ids)}
+
+
+def apply_stripe_event(event_type, intent_id):
+    """Apply a verified Stripe PaymentIntent event to its Payment row"""
+    values = None
+    if event_type == 'payment_intent.succeeded':
+        values = {'status': 'paid', 'paid_date': datetime.now()}
+    elif event_type == 'payment_intent.payment_failed':
+        values = {'status': 'failed'}
+    if values:
+        db.session.execute(
+            update(Payment.__table__).where(Payment.stripe_charge_id == intent_id).values(**values)
+        )
+        db.session.commit()
+
+
+# ==================== BACKGROUND JOBS ====================
+
+@task('billing.run_cycle')
+def run_billing_cycle_job(period=None):
+    run_billing_cycle(parse_period(period) if period else None)
+
+
+@task('billing.sweep_overdue')
+def sweep_overdue_job():
+    from notifications import notify_overdue
+    sweep_overdue(notify=notify_overdue)
+
+
+@task('payments.apply_stripe_event')
+def apply_stripe_event_job(event_type, intent_id):
+    apply_stripe_event(event_type, intent_id)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate recurring rent payments')
+    parser.add_argument('--period', type=parse_period, help='Billing month as YYYY-MM (default: next month)')
+    parser.add_argument('--skip-intents', action='store_true', help='Do not create Stripe PaymentIntents')
+    parser.add_argument('--concurrency', type=int, default=STRIPE_CONCURRENCY)
+    parser.add_argument('--sweep-overdue', action='store_true', help='Mark past-due payments overdue instead of billing')
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        if args.sweep_overdue:
+            from notifications import notify_overdue
+            print(sweep_overdue(notify=notify_overdue))
+        else:
+            print(run_billing_cycle(args.period, not args.skip_intents, args.concurrency))
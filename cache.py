@@ -0,0 +1,318 @@
+"""
+Response data cache for Corporate Office 101 API
+Two levels: a per-process LRU with TTL (L1) and an optional shared Redis-compatible
+store (L2). Misses are coalesced so one request computes while the others wait,
+and entries are invalidated by tag when the change bus reports their models changed
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import changes
+from serializers import dumps_bytes
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - stdlib fallback
+    import json
+    _loads = json.loads
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - L2 is optional
+    redis = None
+
+_MISSING = object()
+
+# Delete the fill lock only while it still holds our token, so a holder whose
+# lock expired cannot release the next holder's
+_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry expiry"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return _MISSING
+            expires, value = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return _MISSING
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._items[key] = (time.monotonic() + ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class MemoryStore:
+    """In-process stand-in for the shared store, with the subset of the Redis API we use"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        item = self._data.get(key)
+        if item is not None and item[0] is not None and item[0] < now:
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key, time.monotonic())
+            return item[1] if item else None
+
+    def mget(self, keys):
+        with self._lock:
+            now = time.monotonic()
+            return [(item[1] if item else None) for item in (self._live(k, now) for k in keys)]
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            now = time.monotonic()
+            if nx and self._live(key, now) is not None:
+                return None
+            if not isinstance(value, bytes):
+                value = str(value).encode()
+            self._data[key] = (now + ex if ex else None, value)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def delete_if_equal(self, key, value):
+        """Delete key only while it holds value, like _RELEASE_LOCK does in Redis"""
+        with self._lock:
+            item = self._live(key, time.monotonic())
+            if item is None or item[1] != value:
+                return 0
+            del self._data[key]
+            return 1
+
+    def incr(self, key):
+        with self._lock:
+            item = self._live(key, time.monotonic())
+            value = int(item[1]) + 1 if item else 1
+            self._data[key] = (item[0] if item else None, str(value).encode())
+            return value
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TwoLevelCache:
+    """L1 LRU in front of an optional shared L2, with single-flight and tag versions
+
+    Each entry records the version of every tag it depends on when written.
+    Invalidating a tag bumps its version (locally and in L2), so older entries
+    are ignored on read without tracking which keys carry the tag. Other
+    processes see the bump in L2 immediately and in their L1 within l1_ttl.
+    """
+
+    def __init__(self, store=None, prefix='co101:', l1_ttl=5, l1_max_entries=1024,
+                 lock_timeout=10, wait_timeout=5):
+        self.store = store
+        self.prefix = prefix
+        self.l1_ttl = l1_ttl
+        self.l1 = LRUCache(l1_max_entries)
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self._local_tags = {}
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._release_script = None
+
+    # ---- tags ----
+
+    def _tag_versions(self, tags):
+        if not tags:
+            return {}
+        if self.store is None:
+            return {tag: self._local_tags.get(tag, 0) for tag in tags}
+        values = self.store.mget([f'{self.prefix}tag:{tag}' for tag in tags])
+        versions = {tag: int(v) if v else 0 for tag, v in zip(tags, values)}
+        for tag, version in versions.items():
+            if version > self._local_tags.get(tag, 0):
+                self._local_tags[tag] = version
+        return versions
+
+    def invalidate_tags(self, *tags):
+        """Make every entry depending on any of these tags stale"""
+        for tag in tags:
+            if self.store is not None:
+                self._local_tags[tag] = self.store.incr(f'{self.prefix}tag:{tag}')
+            else:
+                self._local_tags[tag] = self._local_tags.get(tag, 0) + 1
+
+    # ---- reads and writes ----
+
+    def get(self, key):
+        """Return the cached value or the module's _MISSING sentinel"""
+        entry = self.l1.get(key)
+        if entry is not _MISSING:
+            versions, value = entry
+            if all(self._local_tags.get(tag, 0) <= v for tag, v in versions.items()):
+                return value
+        if self.store is None:
+            return _MISSING
+        raw = self.store.get(self.prefix + key)
+        if raw is None:
+            return _MISSING
+        data = _loads(raw)
+        versions = data['t']
+        if self._tag_versions(tuple(versions)) != versions:
+            return _MISSING
+        self.l1.set(key, (versions, data['v']), self.l1_ttl)
+        return data['v']
+
+    def set(self, key, value, ttl, tags=(), versions=None):
+        if versions is None:
+            versions = self._tag_versions(tuple(tags))
+        self.l1.set(key, (versions, value), min(ttl, self.l1_ttl))
+        if self.store is not None:
+            self.store.set(self.prefix + key, dumps_bytes({'v': value, 't': versions}), ex=ttl)
+
+    def delete(self, key):
+        self.l1.delete(key)
+        if self.store is not None:
+            self.store.delete(self.prefix + key)
+
+    def get_or_set(self, key, compute, ttl=60, tags=()):
+        """Return the cached value or compute it, coalescing concurrent misses"""
+        value = self.get(key)
+        if value is not _MISSING:
+            return value
+
+        # In-process single flight: threads wait on the first computation
+        with self._inflight_lock:
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                self._inflight[key] = threading.Event()
+        if waiter is not None:
+            waiter.wait(self.wait_timeout)
+            value = self.get(key)
+            if value is not _MISSING:
+                return value
+            return self._compute_shared(key, compute, ttl, tags)
+
+        try:
+            return self._compute_shared(key, compute, ttl, tags)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key).set()
+
+    def _compute_shared(self, key, compute, ttl, tags):
+        # Cross-process single flight: one holder of the L2 lock computes
+        lock_key = f'{self.prefix}lock:{key}'
+        token = uuid.uuid4().hex.encode()
+        locked = self.store is not None and self._acquire(lock_key, token)
+        if self.store is not None and not locked:
+            deadline = time.monotonic() + self.wait_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                value = self.get(key)
+                if value is not _MISSING:
+                    return value
+                # The holder finished without caching or died: take the lock over
+                if self.store.get(lock_key) is None and self._acquire(lock_key, token):
+                    locked = True
+                    break
+            # Past the deadline we compute anyway but leave the holder's lock alone
+        try:
+            # Versions are read before computing so a concurrent invalidation wins
+            versions = self._tag_versions(tuple(tags))
+            value = compute()
+            self.set(key, value, ttl, tags, versions)
+            return value
+        finally:
+            if locked:
+                self._release(lock_key, token)
+
+    def _acquire(self, lock_key, token):
+        return bool(self.store.set(lock_key, token, ex=self.lock_timeout, nx=True))
+
+    def _release(self, lock_key, token):
+        if isinstance(self.store, MemoryStore):
+            self.store.delete_if_equal(lock_key, token)
+            return
+        if self._release_script is None:
+            self._release_script = self.store.register_script(_RELEASE_LOCK)
+        self._release_script(keys=[lock_key], args=[token])
+
+    def clear(self):
+        self.l1.clear()
+        self._local_tags.clear()
+
+
+data_cache = TwoLevelCache()
+
+# Tables whose committed changes invalidate each tag
+TABLE_TAGS = {
+    'events': ('events',),
+    'directory_entries': ('directory',),
+    'users': ('profiles',),
+    'tenants': ('profiles',),
+    'property_managers': ('profiles',),
+    'rooms': ('rooms',),
+}
+
+
+def _invalidate_changes(changes):
+    tags = set()
+    for change in changes:
+        tags.update(TABLE_TAGS.get(change.table, ()))
+    if not tags:
+        return
+    if any(not change.remote for change in changes):
+        data_cache.invalidate_tags(*tags)
+    elif data_cache.store is not None:
+        # The origin already bumped the shared versions; revalidate against L2
+        data_cache.l1.clear()
+    else:
+        data_cache.invalidate_tags(*tags)
+
+
+changes.subscribe(_invalidate_changes, tables=TABLE_TAGS)
+
+
+def init_app(app):
+    """Configure the shared store from CACHE_REDIS_URL ('memory' for the in-process stand-in)"""
+    url = app.config.get('CACHE_REDIS_URL')
+    data_cache.l1_ttl = app.config.get('CACHE_L1_TTL', 5)
+    data_cache.l1.max_entries = app.config.get('CACHE_L1_MAX_ENTRIES', 1024)
+    if url == 'memory':
+        data_cache.store = MemoryStore()
+    elif url:
+        if redis is None:
+            raise RuntimeError('CACHE_REDIS_URL is set but the redis package is not installed')
+        data_cache.store = redis.Redis.from_url(url)
+    return data_cache
@@ -0,0 +1,243 @@
+"""
+iCalendar feeds for Corporate Office 101
+Calendar apps cannot send a JWT, so each user subscribes with a secret feed
+token instead. Feeds are rendered once into RFC 5545 text and kept in the
+shared cache with their ETag until a relevant row changes: any event for the
+events feed, which every subscriber shares, and only that tenant's bookings
+(or a room rename) for a bookings feed. Polls between changes are a cache hit
+and usually a 304
+"""
+import os
+import secrets
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from werkzeug.http import generate_etag
+
+import cache
+import changes
+from models import db, Booking, Event, Room, Tenant, User
+
+PAST_DAYS = int(os.getenv('CALENDAR_PAST_DAYS', '30'))
+FUTURE_DAYS = int(os.getenv('CALENDAR_FUTURE_DAYS', '365'))
+EVENT_MINUTES = int(os.getenv('CALENDAR_EVENT_MINUTES', '60'))  # events have a start time only
+FEED_TTL = 24 * 3600  # the window moves daily, and the cache key with it
+TOKEN_TTL = 300
+PRODID = '-//Corporate Office 101//Tenant Portal//EN'
+UID_DOMAIN = 'corporateoffice101'
+REFRESH_INTERVAL = 'PT15M'
+BOOKING_STATUSES = {'pending': 'TENTATIVE', 'approved': 'CONFIRMED'}
+
+
+# ==================== TOKENS ====================
+
+def new_token():
+    return secrets.token_urlsafe(32)
+
+
+def _load_subscriber(token):
+    row = db.session.execute(
+        select(User.id, User.role, Tenant.id.label('tenant_id'))
+        .outerjoin(Tenant, Tenant.user_id == User.id)
+        .where(User.calendar_token == token)
+    ).first()
+    return {'user_id': row.id, 'role': row.role, 'tenant_id': row.tenant_id} if row else None
+
+
+def subscriber(token):
+    """{'user_id', 'role', 'tenant_id'} for a feed token, or None
+
+    Cached under the profiles tag, so rotating a token (a users update) revokes
+    the old one everywhere on commit.
+    """
+    if not token or len(token) > 64:
+        return None
+    key = 'calendar:token:' + generate_etag(token.encode('utf-8'))
+    return cache.data_cache.get_or_set(key, lambda: _load_subscriber(token), ttl=TOKEN_TTL, tags=('profiles',))
+
+
+# ==================== RENDERING ====================
+
+def _escape(text):
+    return (str(text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    """Split a content line into 75-octet lines; continuations start with a space"""
+    if len(line.encode('utf-8')) <= 75:
+        return line
+    parts = []
+    current, size, limit = [], 0, 75
+    for char in line:
+        width = len(char.encode('utf-8'))
+        if size + width > limit:
+            parts.append(''.join(current))
+            current, size, limit = [], 0, 74
+        current.append(char)
+        size += width
+    parts.append(''.join(current))
+    return '\r\n '.join(parts)
+
+
+def _local(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def _utc(value):
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def _component(properties):
+    lines = ['BEGIN:VEVENT']
+    lines += [_fold(f'{name}:{value}') for name, value in properties if value is not None]
+    lines.append('END:VEVENT')
+    return lines
+
+
+def render(name, components):
+    """A VCALENDAR document from lists of VEVENT lines"""
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        _fold(f'X-WR-CALNAME:{_escape(name)}'),
+        f'REFRESH-INTERVAL;VALUE=DURATION:{REFRESH_INTERVAL}',
+        f'X-PUBLISHED-TTL:{REFRESH_INTERVAL}',
+    ]
+    for component in components:
+        lines += component
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def _window(today):
+    return today - timedelta(days=PAST_DAYS), today + timedelta(days=FUTURE_DAYS)
+
+
+def _render_events(today):
+    first, last = _window(today)
+    rows = db.session.execute(
+        select(Event.id, Event.title, Event.description, Event.event_date, Event.event_time,
+               Event.location, Event.contact_person, Event.created_at)
+        .where(Event.event_date >= first, Event.event_date <= last)
+        .order_by(Event.event_date, Event.event_time, Event.id)
+    ).all()
+    components = []
+    for row in rows:
+        # Event times are building local time, so they are written as floating times
+        start = datetime.combine(row.event_date, row.event_time)
+        description = row.description or ''
+        if row.contact_person:
+            description = f'{description}\n\nContact: {row.contact_person}'.strip()
+        components.append(_component([
+            ('UID', f'event-{row.id}@{UID_DOMAIN}'),
+            ('DTSTAMP', _utc(row.created_at or start)),
+            ('DTSTART', _local(start)),
+            ('DTEND', _local(start + timedelta(minutes=EVENT_MINUTES))),
+            ('SUMMARY', _escape(row.title)),
+            ('LOCATION', _escape(row.location)),
+            ('DESCRIPTION', _escape(description) or None),
+        ]))
+    return render('Corporate Office 101 Events', components)
+
+
+def _render_bookings(tenant_id, today):
+    first, last = _window(today)
+    rows = db.session.execute(
+        select(Booking.id, Booking.start_time, Booking.end_time, Booking.purpose, Booking.num_attendees,
+               Booking.status, Booking.created_at, Room.name.label('room'))
+        .join(Room, Room.id == Booking.room_id)
+        .where(Booking.tenant_id == tenant_id, Booking.status.in_(BOOKING_STATUSES),
+               Booking.start_time >= datetime.combine(first, datetime.min.time()),
+               Booking.start_time < datetime.combine(last + timedelta(days=1), datetime.min.time()))
+        .order_by(Booking.start_time, Booking.id)
+    ).all()
+    components = []
+    for row in rows:
+        components.append(_component([
+            ('UID', f'booking-{row.id}@{UID_DOMAIN}'),
+            ('DTSTAMP', _utc(row.created_at or row.start_time)),
+            ('DTSTART', _utc(row.start_time)),
+            ('DTEND', _utc(row.end_time)),
+            ('SUMMARY', _escape(f'{row.room} booking')),
+            ('LOCATION', _escape(row.room)),
+            ('DESCRIPTION', _escape(f'{row.purpose}\n\nAttendees: {row.num_attendees}')),
+            ('STATUS', BOOKING_STATUSES[row.status]),
+        ]))
+    return render('Corporate Office 101 Room Bookings', components)
+
+
+def _entry(text):
+    return {'etag': generate_etag(text.encode('utf-8')), 'body': text}
+
+
+def events_feed(today=None):
+    """{'etag', 'body'} of the building events feed, shared by every subscriber"""
+    today = today or datetime.utcnow().date()
+    return cache.data_cache.get_or_set(
+        f'calendar:events:{today.isoformat()}', lambda: _entry(_render_events(today)),
+        ttl=FEED_TTL, tags=('events',)
+    )
+
+
+def bookings_feed(tenant_id, today=None):
+    """{'etag', 'body'} of one tenant's room bookings feed"""
+    today = today or datetime.utcnow().date()
+    return cache.data_cache.get_or_set(
+        f'calendar:bookings:{tenant_id}:{today.isoformat()}', lambda: _entry(_render_bookings(tenant_id, today)),
+        ttl=FEED_TTL, tags=('rooms', 'bookings', f'bookings:{tenant_id}')
+    )
+
+
+# ==================== INVALIDATION ====================
+
+# Bookings are not in cache.TABLE_TAGS, which would drop every tenant's feed on
+# any booking change. Flushes record the tenants they touch instead; bulk
+# statements cannot say which tenants they touched and drop them all
+
+def _booking_tenants(session):
+    return session.info.setdefault('calendar_tenants', set())
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_tenants(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Booking):
+            history = db.inspect(obj).attrs.tenant_id.history
+            _booking_tenants(session).update(
+                tenant_id for tenant_id in (obj.tenant_id, *history.deleted) if tenant_id is not None
+            )
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_bulk(orm_execute_state):
+    statement = orm_execute_state.statement
+    if getattr(statement, 'is_dml', False) and getattr(getattr(statement, 'table', None), 'name', None) == 'bookings':
+        _booking_tenants(orm_execute_state.session).add(None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_feeds(session):
+    tenants = session.info.pop('calendar_tenants', None)
+    if tenants:
+        tags = ['bookings'] if None in tenants else [f'bookings:{tenant_id}' for tenant_id in tenants]
+        cache.data_cache.invalidate_tags(*tags)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('calendar_tenants', None)
+
+
+def _remote_bookings(change_list):
+    # Without a shared store, other processes' tag bumps never reach this one;
+    # the change bus reports only booking ids, so drop every bookings feed
+    if cache.data_cache.store is None and any(change.remote for change in change_list):
+        cache.data_cache.invalidate_tags('bookings')
+
+
+changes.subscribe(_remote_bookings, tables=('bookings',))
@@ -0,0 +1,227 @@
+"""
+Model change capture for Corporate Office 101
+Session hooks turn flushes and bulk statements into Change records, deliver them
+to in-process subscribers after commit, and optionally fan them out to other
+workers and nodes with Postgres NOTIFY
+"""
+import logging
+import os
+import select as _select
+import socket
+import threading
+from collections import namedtuple
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+
+from serializers import dumps_bytes
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - stdlib fallback
+    import json
+    _loads = json.loads
+
+CHANNEL = 'model_changes'
+NOTIFY_PAYLOAD_LIMIT = 7500  # Postgres caps NOTIFY payloads at 8000 bytes
+
+# op is 'insert', 'update' or 'delete'; pk is None for bulk statements
+# that touched an unknown set of rows; columns lists the changed columns
+Change = namedtuple('Change', ['table', 'op', 'pk', 'columns', 'remote'])
+
+logger = logging.getLogger(__name__)
+
+_subscribers = []
+# Tables some subscriber wants, or None when one wants every table; others are not captured
+_state = {'notify': False, 'listener_pid': None, 'tables': frozenset()}
+
+
+def subscribe(callback, tables=None):
+    """Call callback(changes) after each commit touching any of tables (all when None)"""
+    tables = frozenset(tables) if tables else None
+    _subscribers.append((callback, tables))
+    watched = _state['tables']
+    _state['tables'] = None if watched is None or tables is None else watched | tables
+    return callback
+
+
+def _watched(table):
+    return _state['tables'] is None or table in _state['tables']
+
+
+def publish(changes):
+    """Deliver changes to in-process subscribers; subscriber errors never break a commit"""
+    for callback, tables in list(_subscribers):
+        relevant = changes if tables is None else [c for c in changes if c.table in tables]
+        if relevant:
+            try:
+                callback(relevant)
+            except Exception:
+                logger.exception('Change subscriber %r failed', callback)
+
+
+# ==================== CAPTURE ====================
+
+def _pending(session):
+    return session.info.setdefault('pending_changes', [])
+
+
+def record(session, table, op, pk, columns=None):
+    """Add a change for a row written by a Core statement, which is otherwise captured without its pk"""
+    if _watched(table):
+        _pending(session).append(Change(table, op, pk, columns, False))
+
+
+def _origin():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _primary_key(obj):
+    identity = inspect(obj).mapper.primary_key_from_instance(obj)
+    return identity[0] if len(identity) == 1 else list(identity)
+
+
+def _changed_columns(obj):
+    state = inspect(obj)
+    return [attr.key for attr in state.mapper.column_attrs
+            if state.attrs[attr.key].history.has_changes()]
+
+
+@event.listens_for(Session, 'after_flush')
+def _capture_flush(session, flush_context):
+    pending = _pending(session)
+    for obj in session.new:
+        if _watched(obj.__tablename__):
+            pending.append(Change(obj.__tablename__, 'insert', _primary_key(obj), None, False))
+    for obj in session.dirty:
+        if _watched(obj.__tablename__) and session.is_modified(obj, include_collections=False):
+            pending.append(Change(obj.__tablename__, 'update', _primary_key(obj), _changed_columns(obj), False))
+    for obj in session.deleted:
+        if _watched(obj.__tablename__):
+            pending.append(Change(obj.__tablename__, 'delete', _primary_key(obj), None, False))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _capture_bulk(orm_execute_state):
+    statement = orm_execute_state.statement
+    if not getattr(statement, 'is_dml', False):
+        return
+    table = getattr(statement, 'table', None)
+    if table is None or not _watched(table.name):
+        return
+    op = 'insert' if statement.is_insert else 'update' if statement.is_update else 'delete'
+    columns = None
+    if op == 'update':
+        values = getattr(statement, '_values', None) or {}
+        columns = [getattr(key, 'key', key) for key in values] or None
+    _pending(orm_execute_state.session).append(Change(table.name, op, None, columns, False))
+
+
+@event.listens_for(Session, 'before_commit')
+def _notify_before_commit(session):
+    if not _state['notify']:
+        return
+    # Flush now so every change is captured; NOTIFY is transactional and
+    # is only delivered if this commit succeeds
+    session.flush()
+    changes = session.info.get('pending_changes')
+    if not changes or session.get_bind().dialect.name != 'postgresql':
+        return
+    connection = session.connection()
+    for payload in _payloads(changes):
+        connection.execute(text('SELECT pg_notify(:channel, :payload)'),
+                           {'channel': CHANNEL, 'payload': payload})
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_after_commit(session):
+    changes = session.info.pop('pending_changes', None)
+    if changes:
+        publish(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('pending_changes', None)
+
+
+# ==================== CROSS-PROCESS FAN-OUT ====================
+
+def _payloads(changes):
+    """Encode changes into NOTIFY-sized JSON payloads"""
+    batch = []
+    size = 0
+    for change in changes:
+        item = [change.table, change.op, change.pk, change.columns]
+        encoded = len(dumps_bytes(item))
+        if batch and size + encoded > NOTIFY_PAYLOAD_LIMIT:
+            yield dumps_bytes({'o': _origin(), 'c': batch}).decode('utf-8')
+            batch, size = [], 0
+        batch.append(item)
+        size += encoded + 1
+    if batch:
+        yield dumps_bytes({'o': _origin(), 'c': batch}).decode('utf-8')
+
+
+def _listen(engine, stop):
+    """LISTEN loop on a dedicated connection; reconnects on failure"""
+    while not stop.is_set():
+        try:
+            raw = engine.raw_connection()
+            try:
+                dbapi = raw.driver_connection
+                dbapi.autocommit = True
+                with dbapi.cursor() as cursor:
+                    cursor.execute(f'LISTEN {CHANNEL}')
+                while not stop.is_set():
+                    if _select.select([dbapi], [], [], 5) == ([], [], []):
+                        continue
+                    dbapi.poll()
+                    while dbapi.notifies:
+                        payload = dbapi.notifies.pop(0).payload
+                        try:
+                            _receive(payload)
+                        except Exception:
+                            logger.exception('Could not handle change notification %.200s', payload)
+            finally:
+                raw.invalidate()  # never return a LISTENing connection to the pool
+        except Exception:
+            logger.exception('Change listener failed; reconnecting in 5 seconds')
+            stop.wait(5)
+
+
+def _receive(payload):
+    data = _loads(payload)
+    if data.get('o') == _origin():
+        return  # already published in this process
+    publish([Change(table, op, pk, columns, True) for table, op, pk, columns in data['c']])
+
+
+def init_app(app):
+    """Enable NOTIFY fan-out when CHANGES_NOTIFY is set
+
+    The listener thread is started lazily in each worker process, so it
+    survives gunicorn's fork whether or not the app is preloaded.
+    """
+    if not app.config.get('CHANGES_NOTIFY'):
+        return
+    with app.app_context():
+        from models import db
+        engine = db.engine
+    if engine.dialect.name != 'postgresql':
+        return
+    _state['notify'] = True
+
+    @app.before_request
+    def _ensure_listener():
+        if _state['listener_pid'] != os.getpid():
+            _state['listener_pid'] = os.getpid()
+            start_listener(engine)
+
+
+def start_listener(engine):
+    """Start the LISTEN thread for this process; returns its stop event"""
+    stop = threading.Event()
+    threading.Thread(target=_listen, args=(engine, stop), name='model-changes-listener', daemon=True).start()
+    return stop
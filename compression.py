@@ -0,0 +1,162 @@
+"""
+Response compression for Corporate Office 101 API
+Negotiates brotli/gzip per request, streams large bodies through an incremental
+compressor and caches compressed copies of ETagged bodies
+"""
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - gzip only
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/pdf', 'text/calendar', 'text/csv',
+                          'application/x-ndjson'}
+CHUNK_SIZE = 64 * 1024
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding):
+    """Pick the best supported encoding from an Accept-Encoding header, or None"""
+    if not accept_encoding:
+        return None
+    offered = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+    best = None
+    for encoding in supported_encodings():
+        quality = offered.get(encoding, offered.get('*', 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def compressor(encoding, level=None):
+    """Return an incremental compressor exposing compress()/flush()"""
+    if encoding == 'br':
+        return _BrotliCompressor(level if level is not None else 5)
+    return zlib.compressobj(level if level is not None else 6, zlib.DEFLATED, 31)
+
+
+class _BrotliCompressor:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def compress(data, encoding, level=None):
+    """Compress a whole body, feeding it to the compressor in chunks"""
+    engine = compressor(encoding, level)
+    view = memoryview(data)
+    parts = [engine.compress(view[i:i + CHUNK_SIZE]) for i in range(0, len(view), CHUNK_SIZE)]
+    parts.append(engine.flush())
+    return b''.join(parts)
+
+
+def compress_stream(chunks, encoding, level=None):
+    """Compress an iterable of byte chunks lazily"""
+    engine = compressor(encoding, level)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        out = engine.compress(chunk)
+        if out:
+            yield out
+    yield engine.flush()
+
+
+class CompressedBodyCache:
+    """Bounded LRU of compressed bodies keyed by (ETag, encoding)"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, etag, encoding, data, level=None):
+        key = (etag, encoding)
+        with self._lock:
+            body = self._items.get(key)
+            if body is not None:
+                self._items.move_to_end(key)
+                return body
+        # Cacheable bodies are compressed once, so spend more CPU on ratio
+        body = compress(data, encoding, level if level is not None else (11 if encoding == 'br' else 9))
+        with self._lock:
+            if key not in self._items and len(body) <= self.max_bytes:
+                self._items[key] = body
+                self._size += len(body)
+                while self._size > self.max_bytes:
+                    _, evicted = self._items.popitem(last=False)
+                    self._size -= len(evicted)
+        return body
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
+body_cache = CompressedBodyCache()
+
+
+def init_app(app):
+    """Install the compression after_request hook"""
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESS_LEVEL', None)
+    app.config.setdefault('COMPRESS_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+    body_cache.max_bytes = app.config['COMPRESS_CACHE_MAX_BYTES']
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200 or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES or request.method == 'HEAD'):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        level = app.config['COMPRESS_LEVEL']
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding, level)
+            response.headers.pop('Content-Length', None)
+            response.direct_passthrough = False
+        else:
+            data = response.get_data()
+            if len(data) < app.config['COMPRESS_MIN_SIZE']:
+                return response
+            etag, weak = response.get_etag()
+            if etag and not weak:
+                body = body_cache.get_or_compress(etag, encoding, data)
+            else:
+                body = compress(data, encoding, level)
+            response.set_data(body)
+            if etag:
+                # The encoded body is no longer byte-identical to the tagged one
+                response.set_etag(etag, weak=True)
+
+        response.headers['Content-Encoding'] = encoding
+        return response
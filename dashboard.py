@@ -0,0 +1,249 @@
+"""
+Manager dashboard summaries for Corporate Office 101
+The dashboard's counts live in dashboard_summary, one row per (metric, bucket),
+so reading them never scans the source tables. Flushes adjust the rows in the
+same transaction as the change, using attribute history for the old values;
+bulk statements recompute the metrics they touched before commit, and a
+periodic job recomputes everything to correct any drift. Flushes hold a shared
+advisory lock per metric they adjust and recomputes an exclusive one, so a
+recompute never overwrites a delta it did not count
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import event, func, literal, literal_column, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from dialects import insert_for
+from jobs import task
+from locking import advisory_xact_lock
+from models import db, Booking, DashboardSummary, DirectoryEntry, Payment, ServiceRequest
+
+VACANT = 'Vacant'
+OUTSTANDING_STATUSES = ('due', 'overdue', 'failed')
+OPEN_REQUEST_STATUSES = ('new', 'in_progress')
+
+
+# ==================== METRICS ====================
+
+# Each classifier maps a row's values to the (metric, bucket, amount) it
+# counts towards, or None when the row is not counted
+
+def _payment(status, amount):
+    if status in OUTSTANDING_STATUSES:
+        # Unflushed amounts may still be the str or int the caller assigned
+        return 'outstanding_rent', status, Decimal(str(amount or 0))
+
+
+def _directory_entry(business_name):
+    if business_name == VACANT:
+        return 'vacant_suites', '', 0
+
+
+def _service_request(status, urgency):
+    if status in OPEN_REQUEST_STATUSES:
+        return 'open_service_requests', urgency or 'unspecified', 0
+
+
+def _booking(status):
+    if status == 'pending':
+        return 'pending_bookings', '', 0
+
+
+# model: (metric, attributes the classifier reads, classifier)
+TRACKED = {
+    Payment: ('outstanding_rent', ('status', 'amount'), _payment),
+    DirectoryEntry: ('vacant_suites', ('business_name',), _directory_entry),
+    ServiceRequest: ('open_service_requests', ('status', 'urgency'), _service_request),
+    Booking: ('pending_bookings', ('status',), _booking),
+}
+METRICS = {model.__tablename__: metric for model, (metric, _, _) in TRACKED.items()}
+
+# Inlined rather than bound: Postgres only matches the GROUP BY expression to the
+# selected one when both are identical text, and each bind gets its own placeholder
+_URGENCY = func.coalesce(ServiceRequest.urgency, literal_column("'unspecified'"))
+
+# Full aggregates per metric: rows of (bucket, count, amount)
+QUERIES = {
+    'outstanding_rent': lambda: select(
+        Payment.status, func.count(), func.coalesce(func.sum(Payment.amount), 0)
+    ).where(Payment.status.in_(OUTSTANDING_STATUSES)).group_by(Payment.status),
+    'vacant_suites': lambda: select(
+        literal(''), func.count(), literal(0)
+    ).where(DirectoryEntry.business_name == VACANT),
+    'open_service_requests': lambda: select(
+        _URGENCY, func.count(), literal(0)
+    ).where(ServiceRequest.status.in_(OPEN_REQUEST_STATUSES)).group_by(_URGENCY),
+    'pending_bookings': lambda: select(
+        literal(''), func.count(), literal(0)
+    ).where(Booking.status == 'pending'),
+}
+
+
+def _noop(target, value, oldvalue, initiator):
+    return value
+
+
+# Load the replaced value on assignment so flush hooks always see the old bucket
+for _model, (_, _attributes, _) in TRACKED.items():
+    for _name in _attributes:
+        event.listen(getattr(_model, _name), 'set', _noop, active_history=True, retval=True)
+
+
+# ==================== INCREMENTAL MAINTENANCE ====================
+
+def _add(deltas, bucket, sign):
+    if bucket is not None:
+        metric, key, amount = bucket
+        count_delta, amount_delta = deltas.get((metric, key), (0, 0))
+        deltas[(metric, key)] = (count_delta + sign, amount_delta + sign * amount)
+
+
+def _values(obj, attributes, old=False):
+    if not old:
+        return [getattr(obj, name) for name in attributes]
+    values = []
+    for name in attributes:
+        history = db.inspect(obj).attrs[name].history
+        values.append(history.deleted[0] if history.deleted else getattr(obj, name))
+    return values
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_deltas(session, flush_context, instances):
+    deltas = {}
+    for obj in session.new:
+        if type(obj) in TRACKED:
+            _, attributes, classify = TRACKED[type(obj)]
+            _add(deltas, classify(*_values(obj, attributes)), 1)
+    for obj in session.deleted:
+        if type(obj) in TRACKED:
+            _, attributes, classify = TRACKED[type(obj)]
+            _add(deltas, classify(*_values(obj, attributes, old=True)), -1)
+    for obj in session.dirty:
+        if type(obj) in TRACKED and session.is_modified(obj, include_collections=False):
+            _, attributes, classify = TRACKED[type(obj)]
+            _add(deltas, classify(*_values(obj, attributes, old=True)), -1)
+            _add(deltas, classify(*_values(obj, attributes)), 1)
+    session.info['dashboard_deltas'] = {k: v for k, v in deltas.items() if v != (0, 0)}
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_deltas(session, flush_context):
+    deltas = session.info.pop('dashboard_deltas', None)
+    if not deltas:
+        return
+    table = DashboardSummary.__table__
+    now = datetime.utcnow()
+    for metric in sorted({metric for metric, _ in deltas}):
+        advisory_xact_lock(f'dashboard:{metric}', session, shared=True)
+    # Sorted so concurrent transactions lock summary rows in the same order
+    rows = [{'metric': metric, 'bucket': bucket, 'count': count, 'amount': amount, 'updated_at': now}
+            for (metric, bucket), (count, amount) in sorted(deltas.items())]
+    connection = session.connection()
+    stmt = insert_for(connection.dialect.name)(table).values(rows)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['metric', 'bucket'],
+        set_={'count': table.c.count + stmt.excluded.count,
+              'amount': table.c.amount + stmt.excluded.amount,
+              'updated_at': stmt.excluded.updated_at},
+    ))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_bulk(orm_execute_state):
+    statement = orm_execute_state.statement
+    table = getattr(statement, 'table', None)
+    if getattr(statement, 'is_dml', False) and table is not None and table.name in METRICS:
+        orm_execute_state.session.info.setdefault('dashboard_stale', set()).add(METRICS[table.name])
+
+
+@event.listens_for(Session, 'before_commit')
+def _recompute_stale(session):
+    stale = session.info.pop('dashboard_stale', None)
+    if stale:
+        _recompute(session, sorted(stale))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('dashboard_deltas', None)
+    session.info.pop('dashboard_stale', None)
+
+
+# ==================== FULL RECOMPUTE ====================
+
+def _recompute(session, metrics):
+    """Overwrite the rows of metrics with fresh aggregates; returns how many rows changed
+
+    The exclusive advisory lock on each metric waits for transactions that
+    already applied a delta to commit, so they are counted, and holds back new
+    deltas until this transaction commits, so they land on the fresh values.
+    Buckets that disappeared are zeroed rather than deleted.
+    """
+    table = DashboardSummary.__table__
+    metrics = sorted(metrics)
+    for metric in metrics:
+        advisory_xact_lock(f'dashboard:{metric}', session)
+    current = {
+        (row.metric, row.bucket): (row.count, row.amount)
+        for row in session.execute(
+            select(table).where(table.c.metric.in_(metrics))
+        )
+        if row.count or row.amount
+    }
+    fresh = {}
+    for metric in metrics:
+        for bucket, count, amount in session.execute(QUERIES[metric]()):
+            if count or amount:
+                fresh[(metric, bucket)] = (count, amount)
+    corrected = sum(1 for key in set(current) | set(fresh) if current.get(key) != fresh.get(key))
+    if corrected:
+        now = datetime.utcnow()
+        gone = sorted(set(current) - set(fresh))
+        if gone:
+            session.execute(
+                update(table).where(tuple_(table.c.metric, table.c.bucket).in_(gone))
+                .values(count=0, amount=0, updated_at=now)
+            )
+        if fresh:
+            stmt = insert_for(session.get_bind().dialect.name)(table).values([
+                {'metric': metric, 'bucket': bucket, 'count': count, 'amount': amount, 'updated_at': now}
+                for (metric, bucket), (count, amount) in sorted(fresh.items())
+            ])
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=['metric', 'bucket'],
+                set_={'count': stmt.excluded.count, 'amount': stmt.excluded.amount,
+                      'updated_at': stmt.excluded.updated_at},
+            ))
+    return corrected
+
+
+def summary():
+    """The dashboard payload, read from dashboard_summary"""
+    rows = db.session.execute(select(DashboardSummary)).scalars().all()
+    result = {
+        'vacant_suites': 0,
+        'outstanding_rent': {},
+        'open_service_requests': {},
+        'pending_bookings': 0,
+        'updated_at': max((row.updated_at for row in rows), default=None),
+    }
+    for row in rows:
+        if not row.count:
+            continue
+        if row.metric == 'outstanding_rent':
+            result['outstanding_rent'][row.bucket] = {'count': row.count, 'total': row.amount}
+        elif row.metric == 'open_service_requests':
+            result['open_service_requests'][row.bucket] = row.count
+        else:
+            result[row.metric] = row.count
+    return result
+
+
+@task('dashboard.recompute')
+def recompute(metrics=None):
+    """Rebuild dashboard_summary from the source tables"""
+    corrected = _recompute(db.session, list(metrics or QUERIES))
+    db.session.commit()
+    return {'corrected': corrected}
@@ -31,9 +31,10 @@ echo "🗄️ Running database migrations..."
 python << 'EOF'
 try:
     from app import app, db
+    from init_db import migrate_database
     with app.app_context():
-        db.create_all()
-        print("✓ Database tables created/updated successfully!")
+        migrate_database()
+        print("✓ Database migrations applied successfully!")
         
         # Verify tables
         from sqlalchemy import inspect
@@ -0,0 +1,13 @@
+"""
+Dialect helpers for Corporate Office 101
+Production runs on Postgres and development on SQLite; both support
+INSERT ... ON CONFLICT, but through their own insert constructs
+"""
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def insert_for(dialect_name):
+    """The insert construct with on_conflict_do_* for the named dialect"""
+    if dialect_name == 'sqlite':
+        return sqlite.insert
+    return postgresql.insert
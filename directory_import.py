@@ -0,0 +1,176 @@
+"""
+Bulk directory import for Corporate Office 101
+Reads suites from CSV or JSON, diffs them against directory_entries by
+suite_number and writes only new and changed rows with one upsert, in a single
+transaction that also stamps delta sync versions and tombstones. The commit
+publishes a change on the bus, which bumps the 'directory' cache tag so cached
+directory responses refresh
+
+CSV columns: suite_number, business_name, and either map_coordinates (JSON)
+or floor, x, y
+"""
+import argparse
+import csv
+import io
+import json
+import os
+
+from sqlalchemy import delete, select
+
+import sync
+from dialects import insert_for
+from models import db, DirectoryEntry
+
+# The office directory PDF lists suite 203 twice: the occupied floor 3 suite
+# and a vacant one on floor 4. The seed keeps only the floor 3 tenant until
+# the floor 4 number is confirmed
+SEED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'directory.json')
+FIELDS = ('business_name', 'map_coordinates')
+BATCH_SIZE = 1000
+
+
+class DirectoryImportError(ValueError):
+    """Raised for input that cannot be imported; the message is safe to show to managers"""
+
+
+def _number(value):
+    value = value.strip()
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def parse_csv(text):
+    rows = []
+    for line, record in enumerate(csv.DictReader(io.StringIO(text)), start=2):
+        row = {'suite_number': record.get('suite_number'), 'business_name': record.get('business_name')}
+        try:
+            if record.get('map_coordinates'):
+                row['map_coordinates'] = json.loads(record['map_coordinates'])
+            elif record.get('floor'):
+                row['map_coordinates'] = {k: _number(record[k]) for k in ('floor', 'x', 'y') if record.get(k)}
+        except ValueError:
+            raise DirectoryImportError(f'Line {line}: invalid map coordinates')
+        rows.append(row)
+    return rows
+
+
+def parse_json(text):
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise DirectoryImportError(f'Invalid JSON: {e}')
+    if isinstance(data, dict):
+        data = data.get('entries')
+    if not isinstance(data, list):
+        raise DirectoryImportError('Expected a list of entries or {"entries": [...]}')
+    return data
+
+
+def parse(text, fmt):
+    return parse_csv(text) if fmt == 'csv' else parse_json(text)
+
+
+def normalize(rows):
+    """Validate rows and key them by suite_number
+
+    A suite listed twice is rejected rather than letting one entry silently
+    replace the other.
+    """
+    entries = {}
+    first_seen = {}
+    duplicates = []
+    for i, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            raise DirectoryImportError(f'Entry {i}: expected an object')
+        suite = str(row.get('suite_number') or '').strip()
+        name = str(row.get('business_name') or '').strip()
+        if not suite or not name:
+            raise DirectoryImportError(f'Entry {i}: suite_number and business_name are required')
+        if len(suite) > 50 or len(name) > 255:
+            raise DirectoryImportError(f'Entry {i}: suite_number or business_name too long')
+        if suite in entries:
+            duplicates.append(f'{suite} (entries {first_seen[suite]} and {i})')
+            continue
+        first_seen[suite] = i
+        entries[suite] = {'suite_number': suite, 'business_name': name,
+                          'map_coordinates': row.get('map_coordinates')}
+    if duplicates:
+        raise DirectoryImportError(f'Duplicate suite numbers: {", ".join(duplicates)}')
+    return entries
+
+
+def import_entries(rows, prune=False, dry_run=False):
+    """Apply rows to the directory; returns a change summary
+
+    With prune, suites missing from the import are deleted. With dry_run the
+    summary is computed but nothing is written. Raises DirectoryImportError if
+    a suite number appears more than once.
+    """
+    entries = normalize(rows)
+    existing = {
+        suite: {'business_name': name, 'map_coordinates': coords}
+        for suite, name, coords in db.session.execute(
+            select(DirectoryEntry.suite_number, DirectoryEntry.business_name, DirectoryEntry.map_coordinates)
+        )
+    }
+
+    inserted, updated = [], []
+    for suite, entry in entries.items():
+        current = existing.get(suite)
+        if current is None:
+            inserted.append(suite)
+        else:
+            changed = [f for f in FIELDS if current[f] != entry[f]]
+            if changed:
+                updated.append({'suite_number': suite, 'fields': changed})
+    deleted = sorted(set(existing) - set(entries)) if prune else []
+
+    if not dry_run and (inserted or updated or deleted):
+        suites = inserted + [u['suite_number'] for u in updated]
+        # Bulk statements skip the ORM flush, so reserve delta sync versions here
+        version = sync.allocate(db.session.connection(), len(suites) + len(deleted))
+        upserts = [dict(entries[s], change_version=version + i) for i, s in enumerate(suites)]
+        insert = insert_for(db.engine.dialect.name)
+        for start in range(0, len(upserts), BATCH_SIZE):
+            stmt = insert(DirectoryEntry.__table__).values(upserts[start:start + BATCH_SIZE])
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['suite_number'],
+                set_={f: stmt.excluded[f] for f in FIELDS + ('change_version',)},
+            ))
+        if deleted:
+            removed = db.session.execute(
+                delete(DirectoryEntry.__table__).where(DirectoryEntry.suite_number.in_(deleted))
+                .returning(DirectoryEntry.id)
+            ).scalars().all()
+            sync.tombstones(db.session.connection(), DirectoryEntry.__tablename__, removed, version + len(suites))
+        db.session.commit()
+
+    return {
+        'inserted': len(inserted),
+        'updated': len(updated),
+        'deleted': len(deleted),
+        'unchanged': len(entries) - len(inserted) - len(updated),
+        'dry_run': dry_run,
+        'changes': {'inserted': inserted, 'updated': updated, 'deleted': deleted},
+    }
+
+
+def import_file(path, prune=False, dry_run=False):
+    fmt = 'csv' if path.lower().endswith('.csv') else 'json'
+    with open(path, encoding='utf-8-sig') as f:
+        return import_entries(parse(f.read(), fmt), prune=prune, dry_run=dry_run)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import building directory entries from CSV or JSON')
+    parser.add_argument('path', nargs='?', default=SEED_PATH)
+    parser.add_argument('--prune', action='store_true', help='Delete suites not present in the file')
+    parser.add_argument('--dry-run', action='store_true', help='Report changes without writing them')
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        summary = import_file(args.path, prune=args.prune, dry_run=args.dry_run)
+        print(json.dumps({k: v for k, v in summary.items() if k != 'changes'}))
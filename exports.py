@@ -0,0 +1,118 @@
+"""
+Manager data exports for Corporate Office 101 API
+Streams NDJSON or CSV from a server-side cursor so memory stays flat at any row count
+"""
+import csv
+import io
+from datetime import date, datetime, time, timedelta
+
+from models import db, Payment, Booking, ServiceRequest
+from serializers import ModelSerializer, dumps_bytes
+
+BATCH_SIZE = 2000
+# Spreadsheets evaluate cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class Export:
+    """Export definition: model, date column used for range filters, and fields
+
+    Amounts are written as exact decimal strings, unlike the API's JSON numbers.
+    """
+
+    def __init__(self, model, date_column, fields):
+        self.model = model
+        self.date_column = date_column
+        self.serializer = ModelSerializer(model, fields, exact_decimals=True)
+        columns = model.__table__.columns
+        self.text_columns = frozenset(i for i, name in enumerate(fields) if isinstance(columns[name].type, db.String))
+
+    @property
+    def fields(self):
+        return self.serializer.fields
+
+    def statement(self, start=None, end=None, status=None):
+        stmt = self.serializer.select()
+        datetime_column = not isinstance(self.date_column.type, db.Date)
+        if start:
+            stmt = stmt.where(self.date_column >= (datetime.combine(start, time.min) if datetime_column else start))
+        if end:
+            # End date is inclusive for both DATE and TIMESTAMP columns
+            stmt = stmt.where(self.date_column < (datetime.combine(end, time.min) if datetime_column else end) + timedelta(days=1))
+        if status:
+            stmt = stmt.where(self.model.status.in_(status))
+        return stmt.order_by(self.date_column, self.model.id)
+
+
+EXPORTS = {
+    'payments': Export(Payment, Payment.due_date, [
+        'id', 'tenant_id', 'amount', 'due_date', 'paid_date', 'status', 'is_recurring',
+        'payment_method_type', 'stripe_charge_id'
+    ]),
+    'bookings': Export(Booking, Booking.start_time, [
+        'id', 'room_id', 'tenant_id', 'start_time', 'end_time', 'purpose', 'num_attendees',
+        'status', 'manager_approval_id', 'created_at', 'approved_at', 'stripe_payment_intent_id'
+    ]),
+    'service_requests': Export(ServiceRequest, ServiceRequest.created_at, [
+        'id', 'tenant_id', 'type', 'description', 'urgency', 'photo_url', 'status',
+        'assigned_to_id', 'created_at', 'updated_at'
+    ]),
+}
+
+
+def parse_date(value):
+    """Parse an optional YYYY-MM-DD query value; raises ValueError when malformed"""
+    return date.fromisoformat(value) if value else None
+
+
+def iter_batches(stmt, batch_size=BATCH_SIZE):
+    """Yield lists of rows using a server-side cursor"""
+    result = db.session.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+    try:
+        for partition in result.partitions():
+            yield partition
+    finally:
+        result.close()
+
+
+def ndjson_chunks(export, batches):
+    encode = export.serializer.encode
+    for rows in batches:
+        yield b''.join(dumps_bytes(encode(row)) + b'\n' for row in rows)
+
+
+def csv_cell(value):
+    """Quote a text value a spreadsheet would otherwise run as a formula"""
+    if value and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(export, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export.fields)
+    encode = export.serializer.encode
+    text_columns = export.text_columns
+    for rows in batches:
+        writer.writerows([
+            '' if v is None else csv_cell(v) if i in text_columns else v
+            for i, v in enumerate(encode(row).values())
+        ] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def generate(export, fmt, start=None, end=None, status=None, batch_size=BATCH_SIZE):
+    """Byte-chunk generator for an export in the given format"""
+    batches = iter_batches(export.statement(start, end, status), batch_size)
+    if fmt == 'csv':
+        return csv_chunks(export, batches)
+    return ndjson_chunks(export, batches)
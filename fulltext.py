@@ -0,0 +1,42 @@
+"""
+Full-text search columns for Corporate Office 101 models
+search_vector() declares a stored generated tsvector over some of a model's
+text columns, each with a weight from A (most important) to D, so Postgres
+keeps it in step with every write and a GIN index can serve @@ matches. On
+SQLite, which has no tsvector, the column holds the concatenated text instead
+and search.py falls back to substring matching
+"""
+from sqlalchemy import Column, Computed, Text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+
+CONFIG = 'english'
+
+
+class SearchDocument(ColumnElement):
+    """Generation expression of a search_vector column"""
+    inherit_cache = False
+    type = TSVECTOR()
+
+    def __init__(self, weighted):
+        self.weighted = weighted  # [(column name, weight)]
+
+
+@compiles(SearchDocument)
+def _tsvector(element, compiler, **kw):
+    return ' || '.join(
+        f"setweight(to_tsvector('{CONFIG}', coalesce({name}, '')), '{weight}')"
+        for name, weight in element.weighted
+    )
+
+
+@compiles(SearchDocument, 'sqlite')
+def _plain_text(element, compiler, **kw):
+    return " || ' ' || ".join(f"coalesce({name}, '')" for name, _ in element.weighted)
+
+
+def search_column(*weighted):
+    """The search_vector Column for ('title', 'A'), ('description', 'B'), ..."""
+    return Column('search_vector', TSVECTOR().with_variant(Text(), 'sqlite'),
+                  Computed(SearchDocument(list(weighted)), persisted=True))
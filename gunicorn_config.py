@@ -1,13 +1,22 @@
 # Gunicorn configuration file
 import multiprocessing
+import os
 
 # Server socket
 bind = "0.0.0.0:8000"
 backlog = 2048
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = 'sync'
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', '4'))  # I/O-bound requests keep flowing while password hashes run in the pool
+# Workers inherit these and split the cores between their password hash pools:
+# each gets max(CPU // workers, 1) processes (PASSWORD_HASH_WORKERS overrides), so
+# workers * that many hash processes in total, i.e. one per core while
+# workers <= CPU. Up to threads - 1 logins hash or wait per worker
+# (PASSWORD_HASH_MAX_PENDING overrides); others get a 503 after PASSWORD_HASH_WAIT_SECONDS.
+os.environ['WEB_CONCURRENCY'] = str(workers)
+os.environ['WEB_THREADS'] = str(threads)
 worker_connections = 1000
 timeout = 30
 keepalive = 2
@@ -32,3 +41,13 @@ tmp_upload_dir = None
 # SSL
 keyfile = None
 certfile = None
+
+
+# Server hooks
+def worker_exit(server, worker):
+    """Write audit records still buffered in the exiting worker"""
+    import audit
+    try:
+        audit.buffer.flush()
+    except Exception:
+        server.log.exception('Could not write buffered audit records')
@@ -0,0 +1,324 @@
+"""
+Postgres-backed background jobs for Corporate Office 101
+Jobs are rows in the jobs table, claimed with FOR UPDATE SKIP LOCKED so any
+number of worker processes and nodes can share one queue without Redis
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select, update
+
+import audit
+from dialects import insert_for
+from models import db, Job
+
+LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '600'))
+RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', '7'))
+RETRY_BASE = 15
+RETRY_MAX = 3600
+PURGE_BATCH = 10000
+
+logger = logging.getLogger(__name__)
+
+_tasks = {}
+
+
+def task(name):
+    """Register a function as a job handler; it is called with the job payload as kwargs"""
+    def decorator(fn):
+        _tasks[name] = fn
+        return fn
+    return decorator
+
+
+def registered_tasks():
+    return dict(_tasks)
+
+
+def enqueue(name, payload=None, run_at=None, priority=0, max_attempts=5, dedupe_key=None):
+    """Queue a job in the current transaction; the caller commits
+
+    A dedupe_key makes enqueueing idempotent: a second job with the same key
+    is silently dropped. Returns the new job id, or None when deduplicated.
+    """
+    insert = insert_for(db.engine.dialect.name)
+    stmt = insert(Job.__table__).values(
+        name=name, payload=payload or {}, status='queued', priority=priority, attempts=0,
+        max_attempts=max_attempts, dedupe_key=dedupe_key, run_at=run_at or datetime.utcnow(),
+        created_at=datetime.utcnow()
+    ).returning(Job.id)
+    if dedupe_key:
+        stmt = stmt.on_conflict_do_nothing(index_elements=['dedupe_key'])
+    return db.session.execute(stmt).scalar()
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, in seconds"""
+    return min(RETRY_MAX, RETRY_BASE * (2 ** max(attempts - 1, 0))) * random.uniform(0.8, 1.2)
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+# ==================== CRON SCHEDULES ====================
+
+def _parse_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        expr, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if expr == '*':
+            start, stop = low, high
+        elif '-' in expr:
+            start, stop = (int(v) for v in expr.split('-'))
+        else:
+            start = int(expr)
+            stop = high if step > 1 else start
+        if start < low or stop > high:
+            raise ValueError(f'Cron value out of range in {field!r}')
+        values.update(range(start, stop + 1, step))
+    return values
+
+
+class Cron:
+    """Five-field cron expression (minute hour day month weekday), UTC"""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'Expected 5 cron fields: {expression!r}')
+        self.expression = expression
+        self.minutes = _parse_field(fields[0], 0, 59)
+        self.hours = _parse_field(fields[1], 0, 23)
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12)
+        # Cron weekdays are 0-6 from Sunday; accept 7 as Sunday too
+        self.weekdays = {d % 7 for d in _parse_field(fields[4], 0, 7)}
+
+    def matches(self, moment):
+        return (moment.minute in self.minutes and moment.hour in self.hours
+                and moment.day in self.days and moment.month in self.months
+                and (moment.isoweekday() % 7) in self.weekdays)
+
+
+class Schedule:
+    """A job enqueued whenever its cron expression matches"""
+
+    def __init__(self, name, cron, payload=None, priority=0):
+        self.name = name
+        self.cron = Cron(cron)
+        self.payload = payload or {}
+        self.priority = priority
+
+
+def enqueue_due_schedules(schedules, now=None):
+    """Enqueue one job per schedule matching this minute
+
+    The dedupe key contains the minute slot, so every scheduler process on
+    every node can call this and each slot still runs exactly once.
+    """
+    slot = (now or datetime.utcnow()).replace(second=0, microsecond=0)
+    queued = 0
+    for schedule in schedules:
+        if schedule.cron.matches(slot):
+            key = f'cron:{schedule.name}@{slot.isoformat()}'
+            if enqueue(schedule.name, schedule.payload, run_at=slot, priority=schedule.priority,
+                       dedupe_key=key) is not None:
+                queued += 1
+    db.session.commit()
+    return queued
+
+
+# ==================== WORKER ====================
+
+def claim(owner, lease_seconds=LEASE_SECONDS):
+    """Lease the next runnable job, or return None"""
+    now = datetime.utcnow()
+    job = db.session.execute(
+        select(Job.id, Job.name, Job.payload, Job.attempts, Job.max_attempts)
+        .where(db.or_(
+            db.and_(Job.status == 'queued', Job.run_at <= now),
+            # Jobs whose worker died are reclaimed once their lease expires
+            db.and_(Job.status == 'running', Job.locked_until < now),
+        ))
+        .order_by(Job.priority.desc(), Job.run_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).first()
+    if job is not None:
+        db.session.execute(
+            update(Job.__table__).where(Job.id == job.id).values(
+                status='running', attempts=job.attempts + 1, locked_by=owner, started_at=now,
+                locked_until=now + timedelta(seconds=lease_seconds)
+            )
+        )
+    db.session.commit()
+    return job
+
+
+class Heartbeat:
+    """Extends a running job's lease from a background thread until stopped
+
+    Uses its own connection so the handler's transaction is left alone. If the
+    lease was lost (another worker reclaimed the job) lost is set and renewal stops.
+    """
+
+    def __init__(self, engine, job_id, owner, lease_seconds=LEASE_SECONDS):
+        self.engine = engine
+        self.job_id = job_id
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'job-heartbeat-{job_id}', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        interval = max(self.lease_seconds / 3, 1)
+        while not self._stop.wait(interval):
+            try:
+                with self.engine.begin() as connection:
+                    renewed = connection.execute(
+                        update(Job.__table__)
+                        .where(Job.id == self.job_id, Job.locked_by == self.owner, Job.status == 'running')
+                        .values(locked_until=datetime.utcnow() + timedelta(seconds=self.lease_seconds))
+                    ).rowcount
+            except Exception:
+                logger.exception('Could not renew the lease on job %s', self.job_id)
+                continue
+            if not renewed:
+                self.lost = True
+                logger.warning('Job %s lost its lease to another worker', self.job_id)
+                return
+
+
+def run_job(job, owner=None, lease_seconds=LEASE_SECONDS):
+    """Execute a claimed job and record the outcome; returns True on success
+
+    The lease is renewed while the handler runs. The outcome is only written
+    while owner still holds the job, so a worker whose lease lapsed cannot
+    overwrite the result of the worker that reclaimed it.
+    """
+    owner = owner or worker_id()
+    fn = _tasks.get(job.name)
+    attempts = job.attempts + 1
+    held = db.and_(Job.id == job.id, Job.locked_by == owner, Job.status == 'running')
+    try:
+        if fn is None:
+            raise LookupError(f'No task registered as {job.name!r}')
+        with Heartbeat(db.engine, job.id, owner, lease_seconds), audit.source(f'job:{job.name}'):
+            fn(**(job.payload or {}))
+    except Exception:
+        db.session.rollback()
+        final = attempts >= job.max_attempts
+        db.session.execute(
+            update(Job.__table__).where(held).values(
+                status='failed' if final else 'queued',
+                run_at=datetime.utcnow() + timedelta(seconds=retry_delay(attempts)),
+                finished_at=datetime.utcnow() if final else None,
+                locked_until=None, locked_by=None,
+                last_error=traceback.format_exc()[-4000:],
+            )
+        )
+        db.session.commit()
+        return False
+
+    db.session.execute(
+        update(Job.__table__).where(held).values(
+            status='done', finished_at=datetime.utcnow(), locked_until=None, last_error=None
+        )
+    )
+    db.session.commit()
+    return True
+
+
+def work(poll_interval=1.0, stop=None, owner=None):
+    """Claim and run jobs until stop() is true"""
+    owner = owner or worker_id()
+    while not (stop and stop()):
+        job = claim(owner)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        run_job(job, owner)
+
+
+@task('jobs.purge')
+def purge(days=RETENTION_DAYS):
+    """Delete done and failed jobs that finished more than days ago, in batches
+
+    Their dedupe keys go with them; cron keys name a past minute slot, so
+    nothing can be enqueued twice because of it.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    while True:
+        batch = select(Job.id).where(
+            Job.status.in_(['done', 'failed']), func.coalesce(Job.finished_at, Job.created_at) < cutoff
+        ).limit(PURGE_BATCH)
+        deleted = db.session.execute(delete(Job).where(Job.id.in_(batch))).rowcount
+        db.session.commit()
+        if deleted < PURGE_BATCH:
+            return
+
+
+# ==================== VISIBILITY ====================
+
+def queue_stats(window_minutes=60):
+    """Queue depth per task and status plus recent latency, for monitoring"""
+    now = datetime.utcnow()
+    since = now - timedelta(minutes=window_minutes)
+
+    depth = {}
+    for name, status, count in db.session.execute(
+        select(Job.name, Job.status, func.count())
+        .where(Job.status.in_(['queued', 'running']))
+        .group_by(Job.name, Job.status)
+    ):
+        depth.setdefault(name, {})[status] = count
+
+    oldest_ready = db.session.execute(
+        select(func.min(Job.run_at)).where(Job.status == 'queued', Job.run_at <= now)
+    ).scalar()
+
+    finished = db.session.execute(
+        select(Job.name, Job.run_at, Job.started_at, Job.finished_at)
+        .where(Job.status == 'done', Job.finished_at >= since)
+    ).all()
+    latency = {}
+    for name, run_at, started_at, finished_at in finished:
+        entry = latency.setdefault(name, {'count': 0, 'wait': 0.0, 'run': 0.0})
+        entry['count'] += 1
+        entry['wait'] += max((started_at - run_at).total_seconds(), 0.0)
+        entry['run'] += (finished_at - started_at).total_seconds()
+
+    failed = db.session.execute(
+        select(func.count()).select_from(Job).where(Job.status == 'failed', Job.created_at >= since)
+    ).scalar()
+
+    return {
+        'depth': depth,
+        'oldest_ready_age_seconds': (now - oldest_ready).total_seconds() if oldest_ready else 0,
+        'failed_last_window': failed,
+        'latency': {
+            name: {
+                'completed': e['count'],
+                'avg_wait_seconds': round(e['wait'] / e['count'], 3),
+                'avg_run_seconds': round(e['run'] / e['count'], 3),
+            } for name, e in latency.items()
+        },
+        'window_minutes': window_minutes,
+    }
@@ -0,0 +1,66 @@
+"""
+Primary key strategy for Corporate Office 101 models
+DB_KEY_STRATEGY picks the key type for every table when the schema is created:
+'integer' (sequence, the default), 'uuid4' (random) or 'uuid7' (time-ordered,
+generated in Python). Changing it for an existing database needs a data migration
+"""
+import os
+import threading
+import time
+import uuid
+
+from sqlalchemy import Column, ForeignKey, Integer, Uuid
+
+STRATEGIES = ('integer', 'uuid4', 'uuid7')
+STRATEGY = os.getenv('DB_KEY_STRATEGY', 'integer')
+if STRATEGY not in STRATEGIES:
+    raise ValueError(f'DB_KEY_STRATEGY must be one of {", ".join(STRATEGIES)}')
+
+_state = {'ms': 0, 'seq': 0}
+_lock = threading.Lock()
+
+
+def uuid7():
+    """RFC 9562 version 7 UUID: 48-bit Unix milliseconds, 12-bit sequence, 62 random bits
+
+    The sequence keeps ids generated in the same millisecond by this process in
+    order, so consecutive inserts land on the right-most B-tree leaf.
+    """
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _state['ms']:
+            # Start low in the sequence space so a burst has room to count up
+            seq = int.from_bytes(os.urandom(2), 'big') & 0x3FF
+        else:
+            ms = _state['ms']
+            seq = _state['seq'] + 1
+            if seq > 0xFFF:
+                ms += 1
+                seq = 0
+        _state['ms'], _state['seq'] = ms, seq
+    rand = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    return uuid.UUID(int=(ms << 80) | (0x7 << 76) | (seq << 64) | (0b10 << 62) | rand)
+
+
+_DEFAULTS = {'integer': None, 'uuid4': uuid.uuid4, 'uuid7': uuid7}
+
+
+def key_type(strategy=None):
+    """Column type for primary and foreign keys"""
+    return Integer() if (strategy or STRATEGY) == 'integer' else Uuid(as_uuid=True)
+
+
+def primary_key(strategy=None):
+    strategy = strategy or STRATEGY
+    return Column(key_type(strategy), primary_key=True, default=_DEFAULTS[strategy])
+
+
+def foreign_key(target, strategy=None, **kwargs):
+    return Column(key_type(strategy), ForeignKey(target), **kwargs)
+
+
+def parse_key(value):
+    """Convert a key from a JWT subject, URL or payload back to the column's Python type"""
+    if STRATEGY == 'integer':
+        return int(value)
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
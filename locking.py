@@ -0,0 +1,39 @@
+"""
+Cross-process locks for scheduled work
+Uses Postgres advisory locks so only one gunicorn worker or node runs a job at a time
+"""
+import zlib
+
+from sqlalchemy import text
+
+from models import db
+
+
+def lock_key(name):
+    """Stable signed 64-bit advisory lock key for a lock name"""
+    return zlib.crc32(name.encode('utf-8')) - (1 << 31)
+
+
+def try_advisory_xact_lock(name):
+    """Try to take a transaction-scoped advisory lock; False if another session holds it
+
+    The lock is released when the current transaction commits or rolls back.
+    Databases without advisory locks (SQLite in development) always succeed.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return True
+    return bool(db.session.execute(
+        text('SELECT pg_try_advisory_xact_lock(:key)'), {'key': lock_key(name)}
+    ).scalar())
+
+
+def advisory_xact_lock(name, session=None, shared=False):
+    """Wait for a transaction-scoped advisory lock; a no-op off Postgres
+
+    Shared holders only exclude the exclusive holder, not each other.
+    """
+    session = session or db.session
+    if session.get_bind().dialect.name != 'postgresql':
+        return
+    function = 'pg_advisory_xact_lock_shared' if shared else 'pg_advisory_xact_lock'
+    session.execute(text(f'SELECT {function}(:key)'), {'key': lock_key(name)})
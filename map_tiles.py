@@ -0,0 +1,199 @@
+"""
+Floor map tiles for Corporate Office 101
+Rasterizes each floor page of the office map into a pyramid of 256px tiles
+(WebP, or PNG when Pillow has no WebP support) under MAP_TILE_DIR/<floor>/<z>/<x>/<y>.
+manifest.json records a hash of every floor's source page, so a run only
+re-tiles pages whose content changed. Pixels at the deepest zoom level use the
+same coordinates as map_coordinates x/y in the directory
+
+Run after the map changes: python map_tiles.py [--force]
+"""
+import argparse
+import hashlib
+import io
+import json
+import math
+import os
+import shutil
+import tempfile
+import zipfile
+
+try:
+    from PIL import Image, features
+except ImportError:  # pragma: no cover - serving tiles does not need Pillow
+    Image = None
+
+try:
+    import pypdfium2
+except ImportError:  # pragma: no cover - page image bundles need no PDF renderer
+    pypdfium2 = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MAP_PDF_PATH = os.getenv('MAP_PDF_PATH', os.path.join(ROOT, 'docs', 'OfficeDirectory_and_Map.pdf'))
+TILE_DIR = os.getenv('MAP_TILE_DIR', os.path.join(ROOT, 'data', 'map_tiles'))
+TILE_SIZE = 256
+PDF_SCALE = float(os.getenv('MAP_PDF_SCALE', '2'))  # 144 dpi when rendering a real PDF
+MIMETYPES = {'webp': 'image/webp', 'png': 'image/png'}
+
+
+def parse_floor_pages(value):
+    """'1:1,2:2' -> {1: 1, 2: 2}: floor number to 1-based page number"""
+    pages = {}
+    for item in value.split(','):
+        floor, _, page = item.partition(':')
+        pages[int(floor)] = int(page or floor)
+    return pages
+
+
+# Pages 1-5 are floors 1-5; page 6 is the printed directory and is not tiled
+FLOOR_PAGES = parse_floor_pages(os.getenv('MAP_FLOOR_PAGES', '1:1,2:2,3:3,4:4,5:5'))
+
+
+# ==================== GENERATION ====================
+
+def tile_format():
+    return 'webp' if features.check('webp') else 'png'
+
+
+def load_pages(path):
+    """{page number: (digest, open)} for every page of the map document
+
+    Accepts a PDF, or a page image bundle (a zip with manifest.json and one
+    image per page, which is how the current map is exported). Bundle pages
+    are hashed from their image bytes without decoding; PDF pages have to be
+    rendered to be hashed.
+    """
+    settings = f'{TILE_SIZE}:{tile_format()}:{PDF_SCALE}'.encode()
+    pages = {}
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as bundle:
+            for page in json.loads(bundle.read('manifest.json'))['pages']:
+                data = bundle.read(page['image']['path'])
+                digest = hashlib.sha256(settings + data).hexdigest()
+                pages[page['page_number']] = (digest, lambda data=data: Image.open(io.BytesIO(data)))
+        return pages
+    if pypdfium2 is None:
+        raise RuntimeError('pypdfium2 is required to render PDF maps')
+    document = pypdfium2.PdfDocument(path)
+    try:
+        for number, page in enumerate(document, start=1):
+            image = page.render(scale=PDF_SCALE).to_pil()
+            digest = hashlib.sha256(settings + repr(image.size).encode() + image.tobytes()).hexdigest()
+            pages[number] = (digest, lambda image=image: image)
+    finally:
+        document.close()
+    return pages
+
+
+def build_pyramid(image, dest, fmt):
+    """Write z/x/y tiles for image into dest; returns (width, height, max_zoom)"""
+    image = image.convert('RGB')
+    width, height = image.size
+    max_zoom = max(0, math.ceil(math.log2(max(width, height) / TILE_SIZE)))
+    level = image
+    for z in range(max_zoom, -1, -1):
+        if z < max_zoom:
+            level = level.reduce(2)
+        for x in range(math.ceil(level.width / TILE_SIZE)):
+            os.makedirs(os.path.join(dest, str(z), str(x)), exist_ok=True)
+            for y in range(math.ceil(level.height / TILE_SIZE)):
+                box = (x * TILE_SIZE, y * TILE_SIZE,
+                       min((x + 1) * TILE_SIZE, level.width), min((y + 1) * TILE_SIZE, level.height))
+                # Edge tiles are padded to full size so map viewers never stretch them
+                tile = Image.new('RGB', (TILE_SIZE, TILE_SIZE), 'white')
+                tile.paste(level.crop(box), (0, 0))
+                with open(os.path.join(dest, str(z), str(x), f'{y}.{fmt}'), 'wb') as f:
+                    if fmt == 'webp':
+                        tile.save(f, 'WEBP', quality=85, method=4)
+                    else:
+                        tile.save(f, 'PNG', optimize=True)
+    return width, height, max_zoom
+
+
+def _write_manifest(data):
+    fd, tmp = tempfile.mkstemp(dir=TILE_DIR, suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(TILE_DIR, 'manifest.json'))
+
+
+def generate(path=MAP_PDF_PATH, force=False):
+    """Re-tile floors whose page changed; returns {'generated': [...], 'unchanged': [...]}"""
+    if Image is None:
+        raise RuntimeError('Pillow is required to generate map tiles')
+    os.makedirs(TILE_DIR, exist_ok=True)
+    fmt = tile_format()
+    previous = read_manifest() or {}
+    floors = dict(previous.get('floors', {})) if previous.get('format') == fmt else {}
+    pages = load_pages(path)
+
+    summary = {'generated': [], 'unchanged': []}
+    for floor, page in sorted(FLOOR_PAGES.items()):
+        if page not in pages:
+            raise RuntimeError(f'Floor {floor} maps to page {page}, but the map has {len(pages)} pages')
+        digest, open_page = pages[page]
+        current = floors.get(str(floor))
+        target = os.path.join(TILE_DIR, str(floor))
+        if not force and current and current['digest'] == digest and os.path.isdir(target):
+            summary['unchanged'].append(floor)
+            continue
+        # Build beside the live pyramid and swap it in, so readers never see a partial floor
+        staging = tempfile.mkdtemp(dir=TILE_DIR, prefix=f'.{floor}-')
+        width, height, max_zoom = build_pyramid(open_page(), staging, fmt)
+        retired = None
+        if os.path.isdir(target):
+            retired = tempfile.mkdtemp(dir=TILE_DIR, prefix=f'.{floor}-old-')
+            os.rename(target, os.path.join(retired, 'tiles'))
+        os.rename(staging, target)
+        if retired:
+            shutil.rmtree(retired)
+        floors[str(floor)] = {'page': page, 'digest': digest, 'version': digest[:16],
+                              'width': width, 'height': height, 'max_zoom': max_zoom}
+        summary['generated'].append(floor)
+
+    for floor in set(floors) - {str(f) for f in FLOOR_PAGES}:
+        shutil.rmtree(os.path.join(TILE_DIR, floor), ignore_errors=True)
+        del floors[floor]
+    _write_manifest({'format': fmt, 'tile_size': TILE_SIZE, 'floors': floors})
+    return summary
+
+
+# ==================== SERVING ====================
+
+_manifest = {'mtime': None, 'data': None}
+
+
+def read_manifest():
+    """The tile manifest, reloaded only when the generator has rewritten it"""
+    path = os.path.join(TILE_DIR, 'manifest.json')
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if _manifest['mtime'] != mtime:
+        with open(path) as f:
+            _manifest.update(mtime=mtime, data=json.load(f))
+    return _manifest['data']
+
+
+def tile(floor, z, x, y):
+    """(path, version, mimetype) of a tile, or None when it does not exist"""
+    data = read_manifest()
+    info = data and data['floors'].get(str(floor))
+    if not info or not 0 <= z <= info['max_zoom']:
+        return None
+    scale = 2 ** (info['max_zoom'] - z)
+    columns = math.ceil(math.ceil(info['width'] / scale) / TILE_SIZE)
+    rows = math.ceil(math.ceil(info['height'] / scale) / TILE_SIZE)
+    if not (0 <= x < columns and 0 <= y < rows):
+        return None
+    path = os.path.join(TILE_DIR, str(floor), str(z), str(x), f'{y}.{data["format"]}')
+    return path, info['version'], MIMETYPES[data['format']]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate floor map tiles from the office map')
+    parser.add_argument('path', nargs='?', default=MAP_PDF_PATH)
+    parser.add_argument('--force', action='store_true', help='Re-tile every floor even if unchanged')
+    args = parser.parse_args()
+    print(json.dumps(generate(args.path, force=args.force)))
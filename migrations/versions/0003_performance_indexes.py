@@ -0,0 +1,40 @@
+"""performance indexes, built without locking writes
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 22:40:03.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# event_rsvps(event_id) is already served by the unique_event_rsvp
+# (event_id, tenant_id) index, so it is not duplicated here
+INDEXES = [
+    ('ix_payments_tenant_due', 'payments', ['tenant_id', 'due_date'], {}),
+    ('ix_payments_due_unpaid', 'payments', ['due_date'], {
+        'postgresql_where': sa.text("status = 'due'"), 'sqlite_where': sa.text("status = 'due'"),
+    }),
+    ('ix_bookings_room_start', 'bookings', ['room_id', 'start_time'], {}),
+    ('ix_messages_recipient_created', 'messages', ['recipient_type', 'created_at'], {}),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction. If a build is
+    # interrupted Postgres leaves an INVALID index; drop it and re-run upgrade.
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True, **options)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,75 @@
+"""delta sync versions and tombstones
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 23:05:12.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+SYNCED_TABLES = ['events', 'directory_entries', 'messages', 'bookings', 'service_requests']
+
+
+def upgrade():
+    op.create_table('sync_counter',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('purged_version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('sync_tombstones',
+    sa.Column('version', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('row_id', sa.String(length=36), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('version')
+    )
+    with op.batch_alter_table('sync_tombstones', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sync_tombstones_deleted_at'), ['deleted_at'], unique=False)
+
+    for table in SYNCED_TABLES:
+        op.add_column(table, sa.Column('change_version', sa.BigInteger(), nullable=True))
+
+    # Number existing rows so a client syncing from 0 receives them
+    connection = op.get_bind()
+    base = 0
+    for table in SYNCED_TABLES:
+        connection.execute(sa.text(
+            f'UPDATE {table} SET change_version = numbered.n + :base '
+            f'FROM (SELECT id, row_number() OVER (ORDER BY id) AS n FROM {table}) AS numbered '
+            f'WHERE {table}.id = numbered.id'
+        ), {'base': base})
+        base += connection.execute(sa.text(f'SELECT COUNT(*) FROM {table}')).scalar()
+    connection.execute(sa.text(
+        'INSERT INTO sync_counter (id, version, purged_version) VALUES (1, :version, 0)'
+    ), {'version': base})
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; see 0003
+    with op.get_context().autocommit_block():
+        for table in SYNCED_TABLES:
+            op.create_index(f'ix_{table}_change_version', table, ['change_version'],
+                            if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in reversed(SYNCED_TABLES):
+            op.drop_index(f'ix_{table}_change_version', table_name=table, if_exists=True,
+                          postgresql_concurrently=True)
+
+    for table in reversed(SYNCED_TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('change_version')
+
+    with op.batch_alter_table('sync_tombstones', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sync_tombstones_deleted_at'))
+
+    op.drop_table('sync_tombstones')
+    op.drop_table('sync_counter')
@@ -0,0 +1,45 @@
+"""manager dashboard summary table
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 23:41:27.915306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# Initial contents; dashboard.recompute() keeps them correct from here on
+BACKFILL = [
+    "SELECT 'outstanding_rent', status, COUNT(*), COALESCE(SUM(amount), 0) FROM payments "
+    "WHERE status IN ('due', 'overdue', 'failed') GROUP BY status",
+    "SELECT 'vacant_suites', '', COUNT(*), 0 FROM directory_entries WHERE business_name = 'Vacant' HAVING COUNT(*) > 0",
+    "SELECT 'open_service_requests', COALESCE(urgency, 'unspecified'), COUNT(*), 0 FROM service_requests "
+    "WHERE status IN ('new', 'in_progress') GROUP BY COALESCE(urgency, 'unspecified')",
+    "SELECT 'pending_bookings', '', COUNT(*), 0 FROM bookings WHERE status = 'pending' HAVING COUNT(*) > 0",
+]
+
+
+def upgrade():
+    op.create_table('dashboard_summary',
+    sa.Column('metric', sa.String(length=50), nullable=False),
+    sa.Column('bucket', sa.String(length=50), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('metric', 'bucket')
+    )
+    for query in BACKFILL:
+        op.execute(
+            'INSERT INTO dashboard_summary (metric, bucket, count, amount, updated_at) '
+            f'SELECT * FROM ({query}) AS totals, (SELECT CURRENT_TIMESTAMP) AS now'
+        )
+
+
+def downgrade():
+    op.drop_table('dashboard_summary')
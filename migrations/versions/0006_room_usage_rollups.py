@@ -0,0 +1,42 @@
+"""room utilization and revenue rollups
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 00:12:44.530918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from keys import key_type
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled from booking history by init_db.migrate_database (rollups.rebuild)
+    op.create_table('room_usage_rollups',
+    sa.Column('room_id', key_type(), nullable=False),
+    sa.Column('grain', sa.String(length=5), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('requested', sa.Integer(), nullable=False),
+    sa.Column('approved', sa.Integer(), nullable=False),
+    sa.Column('rejected', sa.Integer(), nullable=False),
+    sa.Column('booked_seconds', sa.BigInteger(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['room_id'], ['rooms.id'], ),
+    sa.PrimaryKeyConstraint('room_id', 'grain', 'bucket_start')
+    )
+    with op.batch_alter_table('room_usage_rollups', schema=None) as batch_op:
+        batch_op.create_index('ix_room_usage_rollups_grain_bucket', ['grain', 'bucket_start'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('room_usage_rollups', schema=None) as batch_op:
+        batch_op.drop_index('ix_room_usage_rollups_grain_bucket')
+
+    op.drop_table('room_usage_rollups')
@@ -0,0 +1,37 @@
+"""calendar feed tokens and tenant booking index
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 00:41:08.206134
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Tokens are issued on first use by GET /api/calendar/feeds
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('calendar_token', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_users_calendar_token'), ['calendar_token'], unique=True)
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; see 0003
+    with op.get_context().autocommit_block():
+        op.create_index('ix_bookings_tenant_start', 'bookings', ['tenant_id', 'start_time'],
+                        if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_bookings_tenant_start', table_name='bookings', if_exists=True,
+                      postgresql_concurrently=True)
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_calendar_token'))
+        batch_op.drop_column('calendar_token')
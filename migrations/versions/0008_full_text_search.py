@@ -0,0 +1,48 @@
+"""full-text search vectors for events, messages and service requests
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 01:27:53.671420
+
+"""
+from alembic import op
+
+from fulltext import search_column
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+# Must match the search_vector definitions in models.py
+SEARCH_COLUMNS = [
+    ('events', [('title', 'A'), ('description', 'B'), ('location', 'C')]),
+    ('messages', [('content', 'A')]),
+    ('service_requests', [('type', 'A'), ('description', 'B')]),
+]
+
+
+def upgrade():
+    # Adding a stored generated column rewrites the table under an exclusive
+    # lock, so run this in a quiet period on large databases
+    for table, weighted in SEARCH_COLUMNS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(search_column(*weighted))
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; see 0003
+    with op.get_context().autocommit_block():
+        for table, _ in SEARCH_COLUMNS:
+            op.create_index(f'ix_{table}_search_vector', table, ['search_vector'], postgresql_using='gin',
+                            if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table, _ in reversed(SEARCH_COLUMNS):
+            op.drop_index(f'ix_{table}_search_vector', table_name=table, if_exists=True,
+                          postgresql_concurrently=True)
+
+    for table, _ in reversed(SEARCH_COLUMNS):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('search_vector')
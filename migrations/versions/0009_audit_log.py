@@ -0,0 +1,46 @@
+"""audit log
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 02:04:31.118752
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from keys import key_type
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('audit_log',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('occurred_at', sa.DateTime(), nullable=False),
+    sa.Column('actor_id', key_type(), nullable=True),
+    sa.Column('source', sa.String(length=100), nullable=True),
+    sa.Column('ip', sa.String(length=45), nullable=True),
+    sa.Column('action', sa.String(length=20), nullable=False),
+    sa.Column('entity_type', sa.String(length=64), nullable=False),
+    sa.Column('entity_id', sa.String(length=36), nullable=True),
+    sa.Column('changes', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('audit_log', schema=None) as batch_op:
+        batch_op.create_index('ix_audit_log_actor', ['actor_id', 'id'], unique=False)
+        batch_op.create_index('ix_audit_log_entity', ['entity_type', 'entity_id', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_audit_log_occurred_at'), ['occurred_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('audit_log', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_audit_log_occurred_at'))
+        batch_op.drop_index('ix_audit_log_entity')
+        batch_op.drop_index('ix_audit_log_actor')
+
+    op.drop_table('audit_log')
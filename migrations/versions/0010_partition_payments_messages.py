@@ -0,0 +1,150 @@
+"""partition payments by due_date and messages by created_at month
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 03:12:40.271936
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from fulltext import search_column
+import partitions
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+# Must match models.py. Unique keys of a partitioned table have to include the
+# partition key; (stripe_charge_id) and (tenant_id, billing_period) are the old ones
+TABLES = {
+    'payments': {
+        'column': 'due_date',
+        'unique': [
+            ('unique_payment_charge', ['stripe_charge_id', 'due_date']),
+            ('unique_tenant_billing_period', ['tenant_id', 'billing_period', 'due_date']),
+        ],
+        'old_unique': [
+            ('payments_stripe_charge_id_key', ['stripe_charge_id']),
+            ('unique_tenant_billing_period', ['tenant_id', 'billing_period']),
+        ],
+        'foreign_keys': [('payments_tenant_id_fkey', 'tenants', ['tenant_id'])],
+        'indexes': [
+            ('ix_payments_due_date', ['due_date'], {}),
+            ('ix_payments_status', ['status'], {}),
+            ('ix_payments_tenant_due', ['tenant_id', 'due_date'], {}),
+            ('ix_payments_due_unpaid', ['due_date'], {'postgresql_where': sa.text("status = 'due'")}),
+        ],
+    },
+    'messages': {
+        'column': 'created_at',
+        'unique': [],
+        'old_unique': [],
+        'foreign_keys': [('messages_sender_id_fkey', 'users', ['sender_id'])],
+        'indexes': [
+            ('ix_messages_created_at', ['created_at'], {}),
+            ('ix_messages_change_version', ['change_version'], {}),
+            ('ix_messages_recipient_created', ['recipient_type', 'created_at'], {}),
+            ('ix_messages_search_vector', ['search_vector'], {'postgresql_using': 'gin'}),
+        ],
+    },
+}
+
+
+def _columns(table):
+    # Generated columns (search_vector) are recomputed by the copy, not copied
+    return ', '.join(op.get_bind().execute(sa.text(
+        'SELECT column_name FROM information_schema.columns '
+        "WHERE table_schema = current_schema() AND table_name = :table AND is_generated = 'NEVER' "
+        'ORDER BY ordinal_position'
+    ), {'table': table}).scalars())
+
+
+def _rebuild(table, partition_by, primary_key, unique):
+    """Copy table into a new table with the same columns, then add keys and indexes
+
+    Indexes are built after the copy, on the partitioned parent (which cannot
+    build them CONCURRENTLY). The whole table is locked until the migration
+    commits, so run it in a maintenance window on large databases.
+    """
+    bind = op.get_bind()
+    spec = TABLES[table]
+    column = spec['column']
+    old = f'{table}_before_0010'
+    op.rename_table(table, old)
+    # The id sequence would be dropped with the old table; the new table's default keeps using it
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': old}).scalar()
+    if sequence:
+        op.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+    op.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING GENERATED){partition_by}')
+    if partition_by:
+        first, last = bind.execute(sa.text(f'SELECT min({column}), max({column}) FROM {old}')).one()
+        current = partitions.month_start(datetime.utcnow().date())
+        ahead = partitions.add_months(current, partitions.MONTHS_AHEAD)
+        partitions.create_partitions(
+            bind, table, min(partitions.month_start(first), current) if first else current,
+            max(partitions.month_start(last), ahead) if last else ahead,
+        )
+    columns = _columns(old)
+    op.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {old}')
+    op.drop_table(old)
+    if sequence:
+        op.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+
+    op.create_primary_key(f'{table}_pkey', table, primary_key)
+    for name, columns in unique:
+        op.create_unique_constraint(name, table, columns)
+    for name, referent, columns in spec['foreign_keys']:
+        op.create_foreign_key(name, table, referent, columns, ['id'])
+    for name, columns, options in spec['indexes']:
+        op.create_index(name, table, columns, unique=False, **options)
+
+
+def _set_created_at_nullable(nullable):
+    # SQLite recreates the table, and a generated column cannot be copied into the new one
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.drop_column('search_vector')
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=nullable)
+        batch_op.add_column(search_column(('content', 'A')))
+
+
+def upgrade():
+    op.get_bind().execute(sa.text('UPDATE messages SET created_at = :now WHERE created_at IS NULL'),
+                          {'now': datetime.utcnow()})
+    if op.get_bind().dialect.name != 'postgresql':
+        # SQLite is not partitioned; only the keys change to match Postgres. The
+        # stripe_charge_id constraint is unnamed in databases made by create_all
+        unique = {tuple(constraint['column_names']): constraint['name']
+                  for constraint in sa.inspect(op.get_bind()).get_unique_constraints('payments')}
+        charge = unique.get(('stripe_charge_id',)) or 'uq_payments_stripe_charge_id'
+        with op.batch_alter_table('payments', schema=None,
+                                  naming_convention={'uq': 'uq_%(table_name)s_%(column_0_name)s'}) as batch_op:
+            batch_op.drop_constraint(charge, type_='unique')
+            batch_op.drop_constraint('unique_tenant_billing_period', type_='unique')
+            for name, columns in TABLES['payments']['unique']:
+                batch_op.create_unique_constraint(name, columns)
+        _set_created_at_nullable(False)
+        return
+
+    for table, spec in TABLES.items():
+        _rebuild(table, f" PARTITION BY RANGE ({spec['column']})", ['id', spec['column']], spec['unique'])
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        _set_created_at_nullable(True)
+        with op.batch_alter_table('payments', schema=None) as batch_op:
+            for name, _ in reversed(TABLES['payments']['unique']):
+                batch_op.drop_constraint(name, type_='unique')
+            batch_op.create_unique_constraint('unique_tenant_billing_period', ['tenant_id', 'billing_period'])
+            batch_op.create_unique_constraint('payments_stripe_charge_id_key', ['stripe_charge_id'])
+        return
+
+    # Partitions already detached by partitions.archive are left as they are
+    for table, spec in reversed(TABLES.items()):
+        _rebuild(table, '', ['id'], spec['old_unique'])
+    op.alter_column('messages', 'created_at', nullable=True)
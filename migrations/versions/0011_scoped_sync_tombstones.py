@@ -0,0 +1,40 @@
+"""scope columns on sync tombstones
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 04:02:16.530841
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from keys import key_type
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sync_tombstones', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('tenant_id', key_type(), nullable=True))
+        batch_op.add_column(sa.Column('recipient_type', sa.String(length=50), nullable=True))
+
+    # Existing tombstones have no scope, so no client may be sent them. Purging
+    # them makes clients that synced before now start again from 0 (a 410)
+    # instead of keeping rows whose deletion they would never hear about
+    connection = op.get_bind()
+    newest = connection.execute(sa.text('SELECT MAX(version) FROM sync_tombstones')).scalar()
+    if newest is not None:
+        connection.execute(sa.text('DELETE FROM sync_tombstones'))
+        connection.execute(sa.text(
+            'UPDATE sync_counter SET purged_version = :newest WHERE id = 1 AND purged_version < :newest'
+        ), {'newest': newest})
+
+
+def downgrade():
+    with op.batch_alter_table('sync_tombstones', schema=None) as batch_op:
+        batch_op.drop_column('recipient_type')
+        batch_op.drop_column('tenant_id')
@@ -4,6 +4,10 @@ Database models for Corporate Office 101 Tenant Portal
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import deferred
+
+from keys import primary_key, foreign_key, key_type
+from fulltext import search_column
 
 db = SQLAlchemy()
 
@@ -11,10 +15,11 @@ class User(db.Model):
     """User authentication table"""
     __tablename__ = 'users'
     
-    id = db.Column(db.Integer, primary_key=True)
+    id = primary_key()
     email = db.Column(db.String(255), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(50), nullable=False)  # 'tenant' or 'property_manager'
+    calendar_token = db.Column(db.String(64), unique=True, index=True)  # secret in .ics feed URLs
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -27,8 +32,8 @@ class Tenant(db.Model):
     """Tenant details table"""
     __tablename__ = 'tenants'
     
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=True)
+    id = primary_key()
+    user_id = foreign_key('users.id', unique=True, nullable=True)
     business_name = db.Column(db.String(255), nullable=False)
     suite_number = db.Column(db.String(50), nullable=False, unique=True)
     contact_info = db.Column(JSONB, default={})
@@ -47,8 +52,8 @@ class PropertyManager(db.Model):
     """Property manager details table"""
     __tablename__ = 'property_managers'
     
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=False)
+    id = primary_key()
+    user_id = foreign_key('users.id', unique=True, nullable=False)
     name = db.Column(db.String(255), nullable=False)
     email = db.Column(db.String(255), unique=True, nullable=False)
     
@@ -57,26 +62,46 @@ class PropertyManager(db.Model):
     assigned_requests = db.relationship('ServiceRequest', backref='assigned_to', lazy=True)
 
 class Payment(db.Model):
-    """Payment transactions table"""
+    """Payment transactions table
+
+    On Postgres the table is partitioned by due_date month (see partitions.py),
+    so its primary key there is (id, due_date) and unique keys include due_date.
+    """
     __tablename__ = 'payments'
     
-    id = db.Column(db.Integer, primary_key=True)
-    tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=False)
+    id = primary_key()
+    tenant_id = foreign_key('tenants.id', nullable=False)
     amount = db.Column(db.Numeric(10, 2), nullable=False)
     due_date = db.Column(db.Date, nullable=False, index=True)
     paid_date = db.Column(db.DateTime)
     status = db.Column(db.String(50), nullable=False, index=True)  # 'due', 'paid', 'overdue', 'failed'
-    stripe_charge_id = db.Column(db.String(255), unique=True)
+    stripe_charge_id = db.Column(db.String(255))
     is_recurring = db.Column(db.Boolean, default=False)
     payment_method_type = db.Column(db.String(50))
+    billing_period = db.Column(db.Date)  # first day of the billed month, recurring charges only
+    
+    __table_args__ = (
+        # due_date is here only because it is the partition key. It follows from billing_period
+        # while BILLING_DUE_DAY is unchanged; billing.generate_period_payments also checks
+        # (tenant_id, billing_period) itself so a changed due day cannot bill a period twice
+        db.UniqueConstraint('stripe_charge_id', 'due_date', name='unique_payment_charge'),
+        db.UniqueConstraint('tenant_id', 'billing_period', 'due_date', name='unique_tenant_billing_period'),
+        # Partial index for the overdue sweeper: only unpaid rows are indexed
+        db.Index('ix_payments_due_unpaid', 'due_date',
+                 postgresql_where=db.text("status = 'due'"), sqlite_where=db.text("status = 'due'")),
+        db.Index('ix_payments_tenant_due', 'tenant_id', 'due_date'),
+    )
 
 class Event(db.Model):
     """Events table"""
     __tablename__ = 'events'
-    __table_args__ = {'quote': True} 
+    __table_args__ = (
+        db.Index('ix_events_search_vector', 'search_vector', postgresql_using='gin'),
+        {'quote': True},
+    )
     
-    id = db.Column(db.Integer, primary_key=True)
-    creator_tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=False)
+    id = primary_key()
+    creator_tenant_id = foreign_key('tenants.id', nullable=False)
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
     event_date = db.Column(db.Date, nullable=False, index=True)
@@ -85,6 +110,8 @@ class Event(db.Model):
     contact_person = db.Column(db.String(255))
     requires_rsvp = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    change_version = db.Column(db.BigInteger, index=True)  # delta sync version, see sync.py
+    search_vector = deferred(search_column(('title', 'A'), ('description', 'B'), ('location', 'C')))  # see fulltext.py
     
     # Relationships
     documents = db.relationship('EventDocument', backref='event', lazy=True, cascade='all, delete-orphan')
@@ -94,8 +121,8 @@ class EventDocument(db.Model):
     """Event documents table"""
     __tablename__ = 'event_documents'
     
-    id = db.Column(db.Integer, primary_key=True)
-    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False)
+    id = primary_key()
+    event_id = foreign_key('events.id', nullable=False)
     file_url = db.Column(db.String(512), nullable=False)
     file_name = db.Column(db.String(255), nullable=False)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -104,9 +131,9 @@ class EventRSVP(db.Model):
     """Event RSVPs table"""
     __tablename__ = 'event_rsvps'
     
-    id = db.Column(db.Integer, primary_key=True)
-    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False)
-    tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=False)
+    id = primary_key()
+    event_id = foreign_key('events.id', nullable=False)
+    tenant_id = foreign_key('tenants.id', nullable=False)
     status = db.Column(db.String(50), nullable=False)  # 'attending', 'not_attending', 'maybe'
     rsvped_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -116,7 +143,7 @@ class Room(db.Model):
     """Bookable rooms table"""
     __tablename__ = 'rooms'
     
-    id = db.Column(db.Integer, primary_key=True)
+    id = primary_key()
     name = db.Column(db.String(255), unique=True, nullable=False)
     hourly_rate = db.Column(db.Numeric(10, 2), nullable=False)
     
@@ -127,53 +154,207 @@ class Booking(db.Model):
     """Room bookings table"""
     __tablename__ = 'bookings'
     
-    id = db.Column(db.Integer, primary_key=True)
-    room_id = db.Column(db.Integer, db.ForeignKey('rooms.id'), nullable=False)
-    tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=False)
+    id = primary_key()
+    room_id = foreign_key('rooms.id', nullable=False)
+    tenant_id = foreign_key('tenants.id', nullable=False)
     start_time = db.Column(db.DateTime, nullable=False, index=True)
     end_time = db.Column(db.DateTime, nullable=False)
     purpose = db.Column(db.Text, nullable=False)
     num_attendees = db.Column(db.Integer, nullable=False)
     status = db.Column(db.String(50), nullable=False, index=True)  # 'pending', 'approved', 'rejected', 'cancelled'
-    manager_approval_id = db.Column(db.Integer, db.ForeignKey('property_managers.id'))
+    manager_approval_id = foreign_key('property_managers.id')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     approved_at = db.Column(db.DateTime)
     stripe_payment_intent_id = db.Column(db.String(255), unique=True)
+    change_version = db.Column(db.BigInteger, index=True)  # delta sync version, see sync.py
+    
+    __table_args__ = (
+        db.Index('ix_bookings_room_start', 'room_id', 'start_time'),
+        db.Index('ix_bookings_tenant_start', 'tenant_id', 'start_time'),
+    )
 
 class ServiceRequest(db.Model):
     """Service requests table"""
     __tablename__ = 'service_requests'
     
-    id = db.Column(db.Integer, primary_key=True)
-    tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=False)
+    id = primary_key()
+    tenant_id = foreign_key('tenants.id', nullable=False)
     type = db.Column(db.String(50), nullable=False)  # 'maintenance', 'cleaning', 'meeting'
     description = db.Column(db.Text, nullable=False)
     urgency = db.Column(db.String(50))  # 'low', 'medium', 'high'
     photo_url = db.Column(db.String(512))
     status = db.Column(db.String(50), nullable=False, index=True)  # 'new', 'in_progress', 'resolved', 'closed'
-    assigned_to_id = db.Column(db.Integer, db.ForeignKey('property_managers.id'))
+    assigned_to_id = foreign_key('property_managers.id')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_version = db.Column(db.BigInteger, index=True)  # delta sync version, see sync.py
+    search_vector = deferred(search_column(('type', 'A'), ('description', 'B')))  # see fulltext.py
+    
+    __table_args__ = (db.Index('ix_service_requests_search_vector', 'search_vector', postgresql_using='gin'),)
 
 class Message(db.Model):
-    """Message board table"""
+    """Message board table
+
+    Partitioned by created_at month on Postgres (see partitions.py); the primary
+    key there is (id, created_at).
+    """
     __tablename__ = 'messages'
     
-    id = db.Column(db.Integer, primary_key=True)
-    sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    id = primary_key()
+    sender_id = foreign_key('users.id', nullable=False)
     recipient_type = db.Column(db.String(50), nullable=False)  # 'all', 'tenant', 'manager'
     content = db.Column(db.Text, nullable=False)
     is_urgent = db.Column(db.Boolean, default=False)
     is_important = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
     expires_at = db.Column(db.DateTime)
+    change_version = db.Column(db.BigInteger, index=True)  # delta sync version, see sync.py
+    search_vector = deferred(search_column(('content', 'A')))  # see fulltext.py
+    
+    __table_args__ = (
+        db.Index('ix_messages_recipient_created', 'recipient_type', 'created_at'),
+        db.Index('ix_messages_search_vector', 'search_vector', postgresql_using='gin'),
+    )
 
 class DirectoryEntry(db.Model):
     """Building directory table"""
     __tablename__ = 'directory_entries'
     
-    id = db.Column(db.Integer, primary_key=True)
+    id = primary_key()
     suite_number = db.Column(db.String(50), unique=True, nullable=False)
     business_name = db.Column(db.String(255), nullable=False)
-    tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), unique=True)
+    tenant_id = foreign_key('tenants.id', unique=True)
     map_coordinates = db.Column(JSONB)
+    change_version = db.Column(db.BigInteger, index=True)  # delta sync version, see sync.py
+
+class Notification(db.Model):
+    """Outbound notification outbox table"""
+    __tablename__ = 'notification_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)  # queue table: sequence keys whatever DB_KEY_STRATEGY is
+    user_id = foreign_key('users.id', nullable=False, index=True)
+    channel = db.Column(db.String(20), nullable=False)  # 'email', 'push'
+    address = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    is_urgent = db.Column(db.Boolean, default=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'sending', 'sent', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    
+    __table_args__ = (
+        db.Index('ix_notification_outbox_ready', 'available_at',
+                 postgresql_where=db.text("status IN ('pending', 'sending')")),
+    )
+
+class Job(db.Model):
+    """Background job queue table"""
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)  # queue table: sequence keys whatever DB_KEY_STRATEGY is
+    name = db.Column(db.String(100), nullable=False, index=True)
+    payload = db.Column(JSONB, default={})
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'done', 'failed'
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    dedupe_key = db.Column(db.String(255), unique=True)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime)
+    locked_by = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    
+    __table_args__ = (
+        db.Index('ix_jobs_ready', 'priority', 'run_at',
+                 postgresql_where=db.text("status IN ('queued', 'running')")),
+    )
+
+class RateLimitBucket(db.Model):
+    """Shared token buckets for rate limiting"""
+    __tablename__ = 'rate_limit_buckets'
+    
+    key = db.Column(db.String(255), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    granted = db.Column(db.Integer, nullable=False, default=0)  # tokens handed out by the last take
+    updated_at = db.Column(db.Float, nullable=False)  # epoch seconds
+
+class RevokedToken(db.Model):
+    """Revoked JWT ids and token families, kept until the tokens expire"""
+    __tablename__ = 'revoked_tokens'
+    
+    jti = db.Column(db.String(36), primary_key=True)  # token jti, or family id for whole-login revocation
+    kind = db.Column(db.String(20), nullable=False)  # 'access', 'refresh', 'family'
+    user_id = foreign_key('users.id', index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class SyncCounter(db.Model):
+    """Single-row change counter for delta sync; see sync.py"""
+    __tablename__ = 'sync_counter'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)  # last version handed out
+    purged_version = db.Column(db.BigInteger, nullable=False, default=0)  # tombstones up to here are gone
+
+class SyncTombstone(db.Model):
+    """Deleted (or no longer visible) synced rows, kept so clients can drop them from local storage"""
+    __tablename__ = 'sync_tombstones'
+    
+    version = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    table_name = db.Column(db.String(64), nullable=False)
+    row_id = db.Column(db.String(36), nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    # Who could see the row before it went, see sync.SCOPES; no foreign key, the tenant may be gone too
+    tenant_id = db.Column(key_type())
+    recipient_type = db.Column(db.String(50))
+
+class DashboardSummary(db.Model):
+    """Building-wide counts for the manager dashboard; see dashboard.py"""
+    __tablename__ = 'dashboard_summary'
+    
+    metric = db.Column(db.String(50), primary_key=True)  # 'vacant_suites', 'outstanding_rent', ...
+    bucket = db.Column(db.String(50), primary_key=True, default='')  # status or urgency, '' when ungrouped
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+    amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class RoomUsageRollup(db.Model):
+    """Per-room booking totals by hour, day and month; see rollups.py"""
+    __tablename__ = 'room_usage_rollups'
+    
+    room_id = foreign_key('rooms.id', primary_key=True)
+    grain = db.Column(db.String(5), primary_key=True)  # 'hour', 'day', 'month'
+    bucket_start = db.Column(db.DateTime, primary_key=True)  # UTC
+    requested = db.Column(db.Integer, nullable=False, default=0)  # bookings starting in the bucket
+    approved = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+    booked_seconds = db.Column(db.BigInteger, nullable=False, default=0)  # approved time inside the bucket
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    __table_args__ = (db.Index('ix_room_usage_rollups_grain_bucket', 'grain', 'bucket_start'),)
+
+class AuditLog(db.Model):
+    """Who changed what, with old and new column values; written by audit.py"""
+    __tablename__ = 'audit_log'
+    
+    # Append-only: sequence keys whatever DB_KEY_STRATEGY is (SQLite only autoincrements INTEGER keys)
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    occurred_at = db.Column(db.DateTime, nullable=False, index=True)
+    actor_id = db.Column(key_type())  # no foreign key: entries outlive deleted users
+    source = db.Column(db.String(100))  # endpoint name, 'job:<task>' or 'system'
+    ip = db.Column(db.String(45))
+    action = db.Column(db.String(20), nullable=False)  # 'insert', 'update', 'delete' or 'bulk_*'
+    entity_type = db.Column(db.String(64), nullable=False)  # table name
+    entity_id = db.Column(db.String(36))  # None for bulk statements
+    changes = db.Column(JSONB, nullable=False, default={})
+    
+    __table_args__ = (
+        db.Index('ix_audit_log_entity', 'entity_type', 'entity_id', 'id'),
+        db.Index('ix_audit_log_actor', 'actor_id', 'id'),
+    )
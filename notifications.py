@@ -0,0 +1,360 @@
+"""
+Outbound notifications for Corporate Office 101
+Request handlers only write rows to the notification_outbox table; a separate
+worker drains it in batches, coalesces per recipient, rate-limits per provider
+and retries failures with exponential backoff
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from sqlalchemy import delete, func, insert, literal, or_, select, update
+
+from jobs import task
+from models import db, User, Tenant, Notification
+
+COALESCE_WINDOW = int(os.getenv('NOTIFICATION_COALESCE_SECONDS', '60'))
+BATCH_SIZE = int(os.getenv('NOTIFICATION_BATCH_SIZE', '200'))
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = int(os.getenv('NOTIFICATION_MAX_ATTEMPTS', '6'))
+BACKOFF_BASE = 30
+BACKOFF_MAX = 3600
+RETENTION_DAYS = int(os.getenv('NOTIFICATION_RETENTION_DAYS', '30'))
+PURGE_BATCH = 10000
+
+ROLE_FOR_RECIPIENT_TYPE = {'tenant': 'tenant', 'manager': 'property_manager'}
+
+logger = logging.getLogger(__name__)
+_warned_console = False
+
+
+# ==================== ENQUEUE ====================
+
+def _available_at(urgent):
+    """Urgent items go out immediately; others wait so they can be coalesced"""
+    now = datetime.utcnow()
+    return now if urgent else now + timedelta(seconds=COALESCE_WINDOW)
+
+
+def _recipients(subject, body, urgent, channel):
+    """SELECT producing one outbox row per opted-in user"""
+    address = User.email if channel == 'email' else db.cast(User.id, db.String)
+    return (
+        select(
+            User.id, literal(channel), address, literal(subject), literal(body),
+            literal(urgent), literal('pending'), literal(0),
+            literal(_available_at(urgent), db.DateTime), literal(datetime.utcnow(), db.DateTime),
+        )
+        .outerjoin(Tenant, Tenant.user_id == User.id)
+        # Managers have no tenant row; tenants must have notifications enabled
+        .where(or_(Tenant.id.is_(None), Tenant.email_notifications_enabled.is_(True)))
+    )
+
+
+def enqueue(user_ids, subject, body, urgent=False, channel='email'):
+    """Queue one notification per user in a single INSERT ... SELECT
+
+    Joins the current session's transaction; the caller commits.
+    """
+    return _insert_from(_recipients(subject, body, urgent, channel).where(User.id.in_(user_ids)))
+
+
+def enqueue_broadcast(subject, body, recipient_type='all', urgent=False, channel='email'):
+    """Queue a notification for every opted-in user a Message is addressed to"""
+    users = _recipients(subject, body, urgent, channel)
+    role = ROLE_FOR_RECIPIENT_TYPE.get(recipient_type)
+    if role:
+        users = users.where(User.role == role)
+    return _insert_from(users)
+
+
+def _insert_from(users):
+    result = db.session.execute(insert(Notification.__table__).from_select(
+        ['user_id', 'channel', 'address', 'subject', 'body', 'is_urgent', 'status',
+         'attempts', 'available_at', 'created_at'],
+        users
+    ))
+    return result.rowcount
+
+
+def notify_overdue(tenant_ids):
+    """Sweeper callback: queue overdue-rent reminders for the given tenants"""
+    user_ids = select(Tenant.user_id).where(Tenant.id.in_(tenant_ids), Tenant.user_id.isnot(None))
+    return enqueue(
+        user_ids,
+        'Rent payment overdue',
+        'You have a rent payment past its due date. Please pay from the tenant portal.',
+    )
+
+
+# ==================== PROVIDERS ====================
+
+class TokenBucket:
+    """Blocking token bucket: rate tokens per second, up to capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class MemoryProvider:
+    """Stand-in provider that records deliveries; for development and tests"""
+
+    def __init__(self, rate=1000):
+        self.limiter = TokenBucket(rate)
+        self.sent = []
+        self.fail_addresses = set()
+
+    def send(self, address, subject, body):
+        if address in self.fail_addresses:
+            raise RuntimeError(f'Delivery to {address} failed')
+        self.sent.append((address, subject, body))
+
+
+class ConsoleProvider(MemoryProvider):
+    """Stand-in provider that prints deliveries"""
+
+    def send(self, address, subject, body):
+        print(f'[notification] to={address} subject={subject!r}')
+
+
+class SMTPProvider:
+    """Email via SMTP, reusing one connection across a batch"""
+
+    def __init__(self, host, port=587, username=None, password=None, use_tls=True,
+                 sender='no-reply@corporateoffice101.com', rate=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.sender = sender
+        self.limiter = TokenBucket(rate)
+        self._connection = None
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.use_tls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        return connection
+
+    def send(self, address, subject, body):
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = address
+        message['Subject'] = subject
+        message.set_content(body)
+        try:
+            if self._connection is None:
+                self._connection = self._connect()
+            self._connection.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self._connection = self._connect()
+            self._connection.send_message(message)
+
+
+class WebhookPushProvider:
+    """Push via an HTTP relay that accepts {user_id, title, body} JSON"""
+
+    def __init__(self, url, rate=50):
+        self.url = url
+        self.limiter = TokenBucket(rate)
+
+    def send(self, address, subject, body):
+        payload = json.dumps({'user_id': address, 'title': subject, 'body': body}).encode('utf-8')
+        req = urllib.request.Request(self.url, data=payload, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            resp.read()
+
+
+def providers_from_env():
+    """Build the channel -> provider map from environment configuration
+
+    Email goes over SMTP whenever SMTP_HOST is set. NOTIFICATION_BACKEND=console
+    or =memory forces the stand-in providers, e.g. for development and tests.
+    """
+    global _warned_console
+    backend = os.getenv('NOTIFICATION_BACKEND')
+    if backend == 'memory':
+        return {'email': MemoryProvider(), 'push': MemoryProvider()}
+    if backend == 'console' or not os.getenv('SMTP_HOST'):
+        if backend != 'console' and not _warned_console:
+            _warned_console = True
+            logger.warning('SMTP_HOST is not set: notification emails are printed, not sent')
+        providers = {'email': ConsoleProvider()}
+    else:
+        providers = {'email': SMTPProvider(
+            os.getenv('SMTP_HOST'),
+            port=int(os.getenv('SMTP_PORT', '587')),
+            username=os.getenv('SMTP_USERNAME'),
+            password=os.getenv('SMTP_PASSWORD'),
+            use_tls=os.getenv('SMTP_USE_TLS', 'true').lower() == 'true',
+            sender=os.getenv('NOTIFICATION_FROM', 'no-reply@corporateoffice101.com'),
+            rate=float(os.getenv('NOTIFICATION_EMAIL_RATE', '10')),
+        )}
+    push_url = os.getenv('PUSH_WEBHOOK_URL')
+    providers['push'] = (WebhookPushProvider(push_url, rate=float(os.getenv('NOTIFICATION_PUSH_RATE', '50')))
+                         if push_url else ConsoleProvider())
+    return providers
+
+
+# ==================== DISPATCH ====================
+
+def backoff_delay(attempts):
+    """Exponential backoff with jitter, in seconds"""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def coalesce(items):
+    """Merge several notifications for one recipient into a single message"""
+    if len(items) == 1:
+        return items[0].subject, items[0].body
+    urgent = any(item.is_urgent for item in items)
+    subject = f'{"URGENT: " if urgent else ""}{len(items)} new notifications'
+    body = '\n\n'.join(f'{item.subject}\n{item.body}' for item in items)
+    return subject, body
+
+
+class Dispatcher:
+    """Drains the outbox: claim a batch, send grouped by recipient, record results"""
+
+    def __init__(self, providers, batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS):
+        self.providers = providers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+
+    def claim(self):
+        """Lease up to batch_size ready rows; expired leases are reclaimed"""
+        now = datetime.utcnow()
+        rows = db.session.execute(
+            select(Notification.id, Notification.channel, Notification.address, Notification.subject,
+                   Notification.body, Notification.is_urgent, Notification.attempts)
+            .where(Notification.status.in_(['pending', 'sending']), Notification.available_at <= now)
+            .order_by(Notification.is_urgent.desc(), Notification.available_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if rows:
+            db.session.execute(
+                update(Notification.__table__)
+                .where(Notification.id.in_([row.id for row in rows]))
+                .values(status='sending', available_at=now + timedelta(seconds=LEASE_SECONDS))
+            )
+        db.session.commit()
+        return rows
+
+    def drain_once(self):
+        """Process one batch; returns (sent, failed) notification counts"""
+        rows = self.claim()
+        groups = {}
+        for row in rows:
+            groups.setdefault((row.channel, row.address), []).append(row)
+
+        sent_ids = []
+        failures = []
+        for (channel, address), items in groups.items():
+            provider = self.providers.get(channel)
+            try:
+                if provider is None:
+                    raise RuntimeError(f'No provider for channel {channel}')
+                subject, body = coalesce(items)
+                provider.limiter.acquire()
+                provider.send(address, subject, body)
+            except Exception as e:
+                failures.append((items, str(e)))
+            else:
+                sent_ids.extend(item.id for item in items)
+
+        now = datetime.utcnow()
+        if sent_ids:
+            db.session.execute(
+                update(Notification.__table__).where(Notification.id.in_(sent_ids))
+                .values(status='sent', sent_at=now)
+            )
+        for items, error in failures:
+            attempts = max(item.attempts for item in items) + 1
+            db.session.execute(
+                update(Notification.__table__).where(Notification.id.in_([item.id for item in items]))
+                .values(
+                    status='failed' if attempts >= self.max_attempts else 'pending',
+                    attempts=attempts,
+                    available_at=now + timedelta(seconds=backoff_delay(attempts)),
+                    last_error=error[:1000],
+                )
+            )
+        db.session.commit()
+        return len(sent_ids), sum(len(items) for items, _ in failures)
+
+    def run(self, poll_interval=2.0, stop=None):
+        """Drain until stop() is true, sleeping when the outbox is idle"""
+        while not (stop and stop()):
+            sent, failed = self.drain_once()
+            if not sent and not failed:
+                time.sleep(poll_interval)
+
+
+@task('notifications.drain')
+def drain_job(max_seconds=50):
+    """Drain the outbox until it is empty or the time budget is spent"""
+    dispatcher = Dispatcher(providers_from_env())
+    deadline = time.monotonic() + max_seconds
+    while time.monotonic() < deadline:
+        sent, failed = dispatcher.drain_once()
+        if not sent and not failed:
+            break
+
+
+@task('notifications.purge')
+def purge(days=RETENTION_DAYS):
+    """Delete sent and failed outbox rows older than days, in batches"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    while True:
+        batch = select(Notification.id).where(
+            Notification.status.in_(['sent', 'failed']),
+            func.coalesce(Notification.sent_at, Notification.created_at) < cutoff,
+        ).limit(PURGE_BATCH)
+        deleted = db.session.execute(delete(Notification).where(Notification.id.in_(batch))).rowcount
+        db.session.commit()
+        if deleted < PURGE_BATCH:
+            return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Notification outbox worker')
+    parser.add_argument('--once', action='store_true', help='Drain a single batch and exit')
+    parser.add_argument('--poll-interval', type=float, default=2.0)
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        dispatcher = Dispatcher(providers_from_env())
+        if args.once:
+            print(dispatcher.drain_once())
+        else:
+            dispatcher.run(args.poll_interval)
@@ -0,0 +1,218 @@
+"""
+Monthly range partitions for Corporate Office 101
+On Postgres, payments are partitioned by due_date and messages by created_at
+(migration 0010), one partition per month named <table>_pYYYY_MM. Queries are
+unchanged: a condition on the partition key prunes partitions, and ORDER BY
+created_at DESC LIMIT n reads the newest partition first and stops.
+
+There is deliberately no DEFAULT partition, since one would turn those ordered
+scans into a merge over every partition. Instead ensure_partitions keeps
+PARTITION_MONTHS_AHEAD months ready, and a row outside every partition fails to
+insert. archive detaches partitions older than their retention, writes each one
+to ARCHIVE_DIR (or an Azure Blob Storage container) as gzipped CSV, then drops
+it. Restore an archive with COPY <table> FROM ... (FORMAT csv, HEADER) after
+recreating its partition. SQLite tables are not partitioned
+"""
+import gzip
+import logging
+import os
+import re
+import tempfile
+from collections import namedtuple
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+from jobs import task
+from models import db, Message, Payment
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', '6'))
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(ROOT, 'data', 'archive'))
+ARCHIVE_CONTAINER = os.getenv('ARCHIVE_BLOB_CONTAINER')  # upload here instead of keeping files locally
+LOCK_TIMEOUT = os.getenv('PARTITION_LOCK_TIMEOUT', '5s')
+
+# keep: rows that hold a partition back from archival while any of them exist
+Partitioned = namedtuple('Partitioned', ['table', 'column', 'retain_months', 'keep'])
+
+PARTITIONED = {
+    Payment.__tablename__: Partitioned(
+        Payment.__tablename__, Payment.due_date.name, int(os.getenv('ARCHIVE_PAYMENTS_AFTER_MONTHS', '36')),
+        "status IN ('due', 'overdue', 'failed')",
+    ),
+    Message.__tablename__: Partitioned(
+        Message.__tablename__, Message.created_at.name, int(os.getenv('ARCHIVE_MESSAGES_AFTER_MONTHS', '12')),
+        "expires_at > (now() AT TIME ZONE 'utc')",
+    ),
+}
+
+_NAME = re.compile(r'^(?P<table>\w+)_p(?P<year>\d{4})_(?P<month>\d{2})$')
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y_%m}'
+
+
+def is_partition(name):
+    """True for names that partition tables use; migrations/env.py hides them from autogenerate"""
+    match = _NAME.match(name)
+    return match is not None and match.group('table') in PARTITIONED
+
+
+def _month(name):
+    match = _NAME.match(name)
+    return date(int(match.group('year')), int(match.group('month')), 1)
+
+
+def attached(connection, table):
+    """{partition name: first day of its month} for partitions currently attached to table"""
+    rows = connection.execute(text(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = CAST(:table AS regclass)'
+    ), {'table': table}).scalars()
+    return {name: _month(name) for name in rows if _NAME.match(name)}
+
+
+def detached(connection, table):
+    """Partition tables that archive detached but has not exported and dropped yet"""
+    rows = connection.execute(text(
+        "SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition "
+        'AND relnamespace = CAST(current_schema() AS regnamespace) AND relname LIKE :pattern'
+    ), {'pattern': f'{table}\\_p%'}).scalars()
+    return sorted(name for name in rows if _NAME.match(name))
+
+
+def create_partitions(connection, table, first, last):
+    """Create the monthly partitions of table from first through last; returns the new names"""
+    existing = attached(connection, table)
+    created = []
+    month = month_start(first)
+    while month <= last:
+        name = partition_name(table, month)
+        if name not in existing:
+            connection.execute(text(
+                f"CREATE TABLE {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def ensure_partitions(connection, months_ahead=MONTHS_AHEAD, today=None):
+    """Create any missing partitions from this month to months_ahead months from now"""
+    if connection.dialect.name != 'postgresql':
+        return []
+    current = month_start(today or datetime.utcnow().date())
+    created = []
+    for spec in PARTITIONED.values():
+        created.extend(create_partitions(connection, spec.table, current, add_months(current, months_ahead)))
+    return created
+
+
+# ==================== ARCHIVAL ====================
+
+def export(connection, name):
+    """Write a detached partition as gzipped CSV; returns (location, rows written)
+
+    The file is written under a temporary name and renamed once complete, so a
+    crash never leaves a truncated archive that looks finished.
+    """
+    table = _NAME.match(name).group('table')
+    directory = os.path.join(ARCHIVE_DIR, table)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{name}.csv.gz')
+    statement = f'COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)'
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(filename=f'{name}.csv', mode='wb', fileobj=raw) as out:
+            cursor = connection.connection.dbapi_connection.cursor()
+            if connection.dialect.driver == 'psycopg':
+                with cursor.copy(statement) as copy:
+                    for chunk in copy:
+                        out.write(chunk)
+            else:
+                cursor.copy_expert(statement, out)
+            rows = cursor.rowcount
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    if not ARCHIVE_CONTAINER:
+        return path, rows
+    from azure.storage.blob import ContainerClient
+    container = ContainerClient.from_connection_string(
+        os.environ['AZURE_STORAGE_CONNECTION_STRING'], ARCHIVE_CONTAINER
+    )
+    blob = f'{table}/{name}.csv.gz'
+    with open(path, 'rb') as data:
+        container.upload_blob(blob, data, overwrite=True)
+    os.unlink(path)
+    return f'{container.url}/{blob}', rows
+
+
+def _archivable(connection, spec, today):
+    cutoff = add_months(month_start(today), -spec.retain_months)
+    names = []
+    for name, month in sorted(attached(connection, spec.table).items(), key=lambda item: item[1]):
+        if add_months(month, 1) > cutoff:
+            break
+        if connection.execute(text(f'SELECT EXISTS (SELECT 1 FROM {name} WHERE {spec.keep})')).scalar():
+            logger.warning('Not archiving %s: it still has rows matching %s', name, spec.keep)
+            continue
+        names.append(name)
+    return names
+
+
+def archive(engine, today=None):
+    """Detach, export and drop partitions past retention; returns [(name, location, rows)]
+
+    Each step commits on its own. A partition detached by an earlier run whose
+    export failed is still a plain table, and is exported and dropped here.
+    """
+    if engine.dialect.name != 'postgresql':
+        return []
+    today = today or datetime.utcnow().date()
+    archived = []
+    for spec in PARTITIONED.values():
+        with engine.connect() as connection:
+            names = _archivable(connection, spec, today)
+            connection.commit()
+            for name in names:
+                with connection.begin():
+                    # DETACH takes an exclusive lock on the parent: give up rather than queue behind readers
+                    connection.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+                    connection.execute(text(f'ALTER TABLE {spec.table} DETACH PARTITION {name}'))
+            for name in detached(connection, spec.table):
+                expected = connection.execute(text(f'SELECT count(*) FROM {name}')).scalar()
+                location, rows = export(connection, name)
+                connection.commit()
+                if rows != expected:
+                    raise RuntimeError(f'{name}: exported {rows} rows, expected {expected}; not dropped')
+                with connection.begin():
+                    connection.execute(text(f'DROP TABLE {name}'))
+                logger.info('Archived %s (%d rows) to %s', name, rows, location)
+                archived.append((name, location, rows))
+    return archived
+
+
+@task('partitions.ensure')
+def ensure_job(months_ahead=MONTHS_AHEAD):
+    with db.engine.begin() as connection:
+        ensure_partitions(connection, months_ahead)
+
+
+@task('partitions.archive')
+def archive_job():
+    archive(db.engine)
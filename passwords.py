@@ -0,0 +1,88 @@
+"""
+Password hashing for Corporate Office 101
+Hashes are computed in a small process pool so a login burst cannot pin every
+request thread, and stored hashes made with older parameters are upgraded on
+the next successful login
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Werkzeug method string: 'scrypt:32768:8:1', 'pbkdf2:sha256:600000', ...
+HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+# Every gunicorn worker has its own pool, so by default the cores are split
+# between WEB_CONCURRENCY workers (at least one process each); 0 hashes on the
+# calling thread (development, scripts)
+WEB_WORKERS = max(int(os.getenv('WEB_CONCURRENCY', '1')), 1)
+POOL_SIZE = int(os.getenv('PASSWORD_HASH_WORKERS', str(max((os.cpu_count() or 1) // WEB_WORKERS, 1))))
+# Requests per worker allowed to hash or wait for the pool before new ones are
+# turned away: all but one of the worker's WEB_THREADS request threads, so a
+# login burst always leaves a thread for other requests
+WEB_THREADS = max(int(os.getenv('WEB_THREADS', '1')), 1)
+MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', str(max(WEB_THREADS - 1, 1))))
+WAIT_SECONDS = float(os.getenv('PASSWORD_HASH_WAIT_SECONDS', '10'))
+
+
+class HashPoolBusy(Exception):
+    """Raised when too many hashes are already queued"""
+
+
+_state = {'pool': None, 'pid': None}
+_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(MAX_PENDING)
+
+
+def _pool():
+    # One pool per process: gunicorn forks workers after import
+    with _lock:
+        if _state['pid'] != os.getpid():
+            _state['pool'] = ProcessPoolExecutor(POOL_SIZE, mp_context=multiprocessing.get_context('spawn'))
+            _state['pid'] = os.getpid()
+        return _state['pool']
+
+
+def _run(fn, *args):
+    if POOL_SIZE <= 0:
+        return fn(*args)
+    if not _pending.acquire(timeout=WAIT_SECONDS):
+        raise HashPoolBusy()
+    try:
+        try:
+            return _pool().submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A hashing process died (OOM killer, ...); start a fresh pool once
+            shutdown()
+            return _pool().submit(fn, *args).result()
+    finally:
+        _pending.release()
+
+
+def hash_password(password, method=None):
+    return _run(generate_password_hash, password, method or HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method):
+    # Werkzeug fills in defaults ('scrypt' -> 'scrypt:32768:8:1'); hash once to learn them
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def needs_rehash(password_hash, method=None):
+    """True when the stored hash was made with different parameters than configured"""
+    return password_hash.split('$', 1)[0] != _method_prefix(method or HASH_METHOD)
+
+
+def shutdown():
+    with _lock:
+        if _state['pool'] is not None and _state['pid'] == os.getpid():
+            _state['pool'].shutdown(wait=False)
+        _state['pool'] = _state['pid'] = None
@@ -0,0 +1,220 @@
+"""
+Rate limiting for Corporate Office 101 API
+Token buckets keyed by JWT identity or client IP, stored in Redis or the database
+so limits hold across gunicorn workers. Each worker leases tokens in small
+batches, so clients under their limit rarely touch the shared store, and
+remembers a denial until the next token is due, so clients over it never do.
+
+Limits below 1 / LEASE_FRACTION per period (login's 10/minute) lease one token
+at a time: a bigger lease would strand tokens whenever the client's next
+request lands on another worker. Each of those requests costs a shared-store
+update, which is why production should set RATELIMIT_REDIS_URL; the database
+store is the fallback for deployments without Redis
+"""
+import math
+import re
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import case, delete
+
+from dialects import insert_for
+from jobs import task
+from models import db, RateLimitBucket
+
+LEASE_FRACTION = 0.1
+LEASE_SECONDS = 1.0
+MAX_LEASES = 10000
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+# A bucket refills completely within one period of its limit, so one idle for
+# longer than the longest period is full and deleting it changes nothing
+IDLE_SECONDS = max(PERIODS.values())
+
+_REDIS_TAKE = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 't', 'u')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+local granted = 0
+if tokens >= wanted then granted = wanted elseif tokens >= 1 then granted = 1 end
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'u', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {granted, tostring(tokens)}
+"""
+
+
+def parse_limit(limit):
+    """Parse '10/minute' or '100 per hour' into (rate per second, capacity)"""
+    match = re.fullmatch(r'\s*(\d+)\s*(?:/|per)\s*(second|minute|hour|day)s?\s*', limit)
+    if not match:
+        raise ValueError(f'Invalid rate limit {limit!r}')
+    count = int(match.group(1))
+    return count / PERIODS[match.group(2)], count
+
+
+# ==================== STORES ====================
+
+class MemoryBucketStore:
+    """Per-process buckets; for development and single-worker deployments"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity, wanted):
+        """Atomically take up to wanted tokens; returns (granted, tokens left)"""
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(now - updated, 0) * rate)
+            granted = wanted if tokens >= wanted else (1 if tokens >= 1 else 0)
+            self._buckets[key] = (tokens - granted, now)
+            return granted, tokens - granted
+
+
+class RedisBucketStore:
+    """Buckets in Redis, updated by a Lua script so each take is atomic"""
+
+    def __init__(self, client, prefix='co101:rl:'):
+        self.prefix = prefix
+        self._script = client.register_script(_REDIS_TAKE)
+
+    def take(self, key, rate, capacity, wanted):
+        granted, tokens = self._script(keys=[self.prefix + key], args=[rate, capacity, wanted, time.time()])
+        return int(granted), float(tokens)
+
+
+class DatabaseBucketStore:
+    """Buckets in the rate_limit_buckets table, one upsert per take"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._insert = insert_for(engine.dialect.name)
+
+    def take(self, key, rate, capacity, wanted):
+        now = time.time()
+        table = RateLimitBucket.__table__
+        refill = table.c.tokens + (now - table.c.updated_at) * rate
+        tokens = case((refill > capacity, capacity), else_=refill)
+        granted = case((tokens >= wanted, wanted), (tokens >= 1, 1), else_=0)
+        first = min(wanted, capacity)
+        stmt = self._insert(table).values(
+            key=key, tokens=capacity - first, granted=first, updated_at=now
+        )
+        # SET expressions all read the pre-update row, so tokens and granted agree
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['key'],
+            set_={'tokens': tokens - granted, 'granted': granted, 'updated_at': now},
+        ).returning(table.c.granted, table.c.tokens)
+        with self.engine.begin() as connection:
+            granted, tokens = connection.execute(stmt).one()
+        return granted, tokens
+
+
+@task('ratelimit.purge')
+def purge_idle(idle_seconds=IDLE_SECONDS):
+    """Delete database buckets untouched for idle_seconds; Redis keys expire by themselves"""
+    db.session.execute(
+        delete(RateLimitBucket).where(RateLimitBucket.updated_at < time.time() - idle_seconds)
+    )
+    db.session.commit()
+
+
+# ==================== LIMITER ====================
+
+class RateLimiter:
+    """Token-bucket limiter with per-worker token leases in front of a shared store"""
+
+    def __init__(self, store=None):
+        self.store = store or MemoryBucketStore()
+        self._leases = {}
+        self._denied = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, rate, capacity):
+        """Consume one token; returns (allowed, retry_after seconds)"""
+        now = time.monotonic()
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease and lease[0] > 0 and lease[1] > now:
+                lease[0] -= 1
+                return True, 0
+            # Refill is deterministic, so no worker can get a token before this
+            until = self._denied.get(key)
+            if until is not None and until > now:
+                return False, max(1, math.ceil(until - now))
+        wanted = max(1, int(capacity * LEASE_FRACTION))
+        granted, tokens = self.store.take(key, rate, capacity, wanted)
+        if granted:
+            if granted > 1:
+                with self._lock:
+                    if len(self._leases) >= MAX_LEASES:
+                        self._leases = {k: v for k, v in self._leases.items() if v[1] > now}
+                    self._leases[key] = [granted - 1, now + LEASE_SECONDS]
+            return True, 0
+        retry_after = (1 - tokens) / rate
+        with self._lock:
+            if len(self._denied) >= MAX_LEASES:
+                self._denied = {k: v for k, v in self._denied.items() if v > now}
+            self._denied[key] = now + retry_after
+        return False, max(1, math.ceil(retry_after))
+
+    def limit(self, limit, scope, key='ip'):
+        """Route decorator; key is 'ip', 'identity' (JWT, falling back to IP) or a callable
+
+        RATE_LIMITS[scope] in the app config overrides the default limit.
+        """
+        default = parse_limit(limit)
+
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not current_app.config.get('RATELIMIT_ENABLED', True):
+                    return fn(*args, **kwargs)
+                override = current_app.config.get('RATE_LIMITS', {}).get(scope)
+                rate, capacity = parse_limit(override) if override else default
+                allowed, retry_after = self.hit(f'{scope}:{_client_key(key)}', rate, capacity)
+                if not allowed:
+                    response = jsonify({'error': 'Too many requests', 'retry_after': retry_after})
+                    response.status_code = 429
+                    response.headers['Retry-After'] = str(retry_after)
+                    return response
+                return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+def _client_key(key):
+    if callable(key):
+        return key()
+    if key == 'identity':
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+        if identity is not None:
+            return f'user:{identity}'
+    return f'ip:{request.remote_addr}'
+
+
+limiter = RateLimiter()
+
+
+def init_app(app):
+    """Pick the bucket store from RATELIMIT_STORAGE: 'redis', 'database' or 'memory'"""
+    storage = app.config.get('RATELIMIT_STORAGE', 'memory')
+    if storage == 'redis':
+        import redis
+        limiter.store = RedisBucketStore(redis.Redis.from_url(app.config['RATELIMIT_REDIS_URL']))
+    elif storage == 'database':
+        with app.app_context():
+            limiter.store = DatabaseBucketStore(db.engine)
+    else:
+        limiter.store = MemoryBucketStore()
+    return limiter
@@ -0,0 +1,171 @@
+"""
+JWT revocation for Corporate Office 101
+Each worker keeps a Bloom filter of revoked token ids, refreshed from the
+revoked_tokens table every few seconds and updated immediately through the
+change bus. Tokens that miss the filter are accepted with no query; only
+filter hits (real revocations or false positives) are checked in the database
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, select
+
+import changes
+from dialects import insert_for
+from keys import parse_key
+from jobs import task
+from models import db, RevokedToken
+
+SYNC_SECONDS = float(os.getenv('REVOCATION_SYNC_SECONDS', '30'))
+REBUILD_SECONDS = float(os.getenv('REVOCATION_REBUILD_SECONDS', '3600'))
+FALSE_POSITIVE_RATE = 0.001
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing"""
+
+    def __init__(self, capacity=10000, error_rate=FALSE_POSITIVE_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+
+class RevocationList:
+    """Per-process view of revoked_tokens: Bloom filter first, exact query on hits"""
+
+    def __init__(self):
+        self.filter = BloomFilter()
+        self.synced_at = 0.0
+        self.built_at = 0.0
+        self.high_water = None
+        self._lock = threading.Lock()
+
+    def add(self, jti):
+        with self._lock:
+            self.filter.add(jti)
+
+    def sync(self, force=False):
+        """Rebuild the filter hourly (dropping expired ids), otherwise fetch recent revocations"""
+        now = time.monotonic()
+        if not force and now - self.synced_at < SYNC_SECONDS:
+            return
+        self.synced_at = now
+        live = RevokedToken.expires_at > datetime.utcnow()
+        if force or now - self.built_at >= REBUILD_SECONDS or self.high_water is None:
+            count = db.session.execute(select(db.func.count()).select_from(RevokedToken).where(live)).scalar()
+            fresh = BloomFilter(capacity=max(count * 2, 10000))
+            rows = db.session.execute(select(RevokedToken.jti, RevokedToken.revoked_at).where(live)).all()
+            for jti, _ in rows:
+                fresh.add(jti)
+            with self._lock:
+                self.filter = fresh
+                self.built_at = now
+                self.high_water = max((r.revoked_at for r in rows), default=datetime.utcnow())
+            return
+        # Overlap by a sync interval so rows committed out of order are not missed
+        since = self.high_water - timedelta(seconds=SYNC_SECONDS)
+        rows = db.session.execute(
+            select(RevokedToken.jti, RevokedToken.revoked_at).where(live, RevokedToken.revoked_at >= since)
+        ).all()
+        with self._lock:
+            for jti, revoked_at in rows:
+                self.filter.add(jti)
+                self.high_water = max(self.high_water, revoked_at)
+
+    def is_revoked(self, *ids):
+        """True if any of ids (jti, family) is revoked"""
+        self.sync()
+        candidates = [i for i in ids if i and i in self.filter]
+        if not candidates:
+            return False
+        return db.session.execute(
+            select(RevokedToken.jti).where(RevokedToken.jti.in_(candidates)).limit(1)
+        ).first() is not None
+
+
+revocations = RevocationList()
+
+
+def _from_changes(changed):
+    for change in changed:
+        if change.op == 'insert' and change.pk is not None:
+            revocations.add(change.pk)
+
+
+changes.subscribe(_from_changes, tables=['revoked_tokens'])
+
+
+def new_family():
+    return str(uuid.uuid4())
+
+
+def revoke(jti, kind, user_id, expires_at):
+    """Record a revocation in the current transaction; the caller commits
+
+    Returns False when jti was already revoked, including by a concurrent
+    transaction: the insert waits for it and then does nothing.
+    """
+    stmt = insert_for(db.engine.dialect.name)(RevokedToken.__table__).values(
+        jti=jti, kind=kind, user_id=user_id, expires_at=expires_at, revoked_at=datetime.utcnow()
+    ).on_conflict_do_nothing(index_elements=['jti']).returning(RevokedToken.jti)
+    if db.session.execute(stmt).scalar() is None:
+        return False
+    changes.record(db.session, RevokedToken.__tablename__, 'insert', jti)
+    return True
+
+
+def revoke_token(payload, family=False):
+    """Revoke a decoded token, or with family=True every token from the same login
+
+    Returns False if it was already revoked.
+    """
+    expires_at = datetime.utcfromtimestamp(payload['exp'])
+    user_id = parse_key(payload['sub'])
+    if family and payload.get('fam'):
+        # A family outlives any single token in it: keep it until its refresh tokens expire
+        expires_at = datetime.utcnow() + current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+        return revoke(payload['fam'], 'family', user_id, expires_at)
+    return revoke(payload['jti'], payload['type'], user_id, expires_at)
+
+
+def init_app(jwt):
+    """Install the blocklist check on a JWTManager"""
+
+    @jwt.token_in_blocklist_loader
+    def _is_revoked(jwt_header, jwt_payload):
+        if not revocations.is_revoked(jwt_payload['jti'], jwt_payload.get('fam')):
+            return False
+        if jwt_payload['type'] == 'refresh' and jwt_payload.get('fam'):
+            # A rotated refresh token was replayed: it may be stolen, so end the whole login
+            revoke_token(jwt_payload, family=True)
+            db.session.commit()
+        return True
+
+
+@task('auth.purge_revocations')
+def purge_expired():
+    """Delete revocations for tokens that have expired anyway"""
+    db.session.execute(delete(RevokedToken).where(RevokedToken.expires_at <= datetime.utcnow()))
+    db.session.commit()
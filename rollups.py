@@ -0,0 +1,347 @@
+"""
+Room utilization and revenue rollups for Corporate Office 101
+room_usage_rollups keeps per-room totals by hour, day and month: bookings
+requested, approved and rejected (counted in the bucket where they start) and
+approved time and revenue (split across the hours a booking covers). Flushes
+apply the difference a booking's change makes in the same transaction, so
+reports over any range read rollup rows instead of bookings. rebuild()
+recomputes everything from bookings, with NumPy when it is installed
+
+Booked time is kept in whole seconds and revenue in cents per hour piece, so
+the incremental, pure Python and NumPy paths produce identical totals.
+Revenue is priced at each room's current hourly_rate: changing a rate
+recomputes that room's rollups in the same transaction, so removing a
+booking's old contribution always subtracts what was added
+"""
+import argparse
+import calendar
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import delete, event, select
+from sqlalchemy.orm import Session
+
+from dialects import insert_for
+from jobs import task
+from models import db, Booking, Room, RoomUsageRollup
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - pure Python fallback
+    np = None
+
+GRAINS = ('hour', 'day', 'month')
+TRACKED_ATTRIBUTES = ('room_id', 'start_time', 'end_time', 'status')
+MAX_HOURLY_RANGE = timedelta(days=31)
+BATCH_SIZE = 5000
+EPOCH = datetime(1970, 1, 1)
+SECOND = timedelta(seconds=1)
+
+# requested, approved, rejected, booked seconds, revenue cents
+_FIELDS = 5
+
+
+def truncate(value, grain):
+    """Start of the grain bucket containing value"""
+    if grain == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    if grain == 'day':
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def bucket_seconds(bucket_start, grain):
+    if grain == 'hour':
+        return 3600
+    if grain == 'day':
+        return 86400
+    return calendar.monthrange(bucket_start.year, bucket_start.month)[1] * 86400
+
+
+def _cents(seconds, rate_cents):
+    """Revenue for seconds at rate_cents per hour, rounded half up to a cent"""
+    return (2 * seconds * rate_cents + 3600) // 7200
+
+
+def _rate_cents(hourly_rate):
+    return int((Decimal(str(hourly_rate or 0)) * 100).to_integral_value())
+
+
+def _add(totals, key, values):
+    current = totals.get(key)
+    if current is None:
+        totals[key] = list(values)
+    else:
+        for i in range(_FIELDS):
+            current[i] += values[i]
+
+
+# ==================== COMPUTATION ====================
+
+def contributions(room_id, start, end, status, rate_cents, totals=None, sign=1):
+    """Add one booking's rollup values (times sign) to totals, keyed by (room_id, grain, bucket_start)"""
+    totals = {} if totals is None else totals
+    if room_id is None or start is None:
+        return totals
+    start = start.replace(microsecond=0)
+    counts = (sign, sign if status == 'approved' else 0, sign if status == 'rejected' else 0, 0, 0)
+    for grain in GRAINS:
+        _add(totals, (room_id, grain, truncate(start, grain)), counts)
+    if status != 'approved' or end is None:
+        return totals
+    end = end.replace(microsecond=0)
+    if end <= start:
+        # No booked time, as in compute_numpy
+        return totals
+    hour = truncate(start, 'hour')
+    while hour < end:
+        following = hour + timedelta(hours=1)
+        seconds = int((min(end, following) - max(start, hour)).total_seconds())
+        piece = (0, 0, 0, sign * seconds, sign * _cents(seconds, rate_cents))
+        for grain in GRAINS:
+            _add(totals, (room_id, grain, truncate(hour, grain)), piece)
+        hour = following
+    return totals
+
+
+def compute_python(bookings, rates):
+    """Rollups for (room_id, start_time, end_time, status) rows; rates maps room_id to cents"""
+    totals = {}
+    for room_id, start, end, status in bookings:
+        contributions(room_id, start, end, status, rates.get(room_id, 0), totals)
+    return totals
+
+
+def _floor(seconds, grain):
+    if grain == 'hour':
+        return seconds // 3600 * 3600
+    if grain == 'day':
+        return seconds // 86400 * 86400
+    return seconds.astype('datetime64[s]').astype('datetime64[M]').astype('datetime64[s]').astype(np.int64)
+
+
+def compute_numpy(bookings, rates):
+    """Vectorized compute_python: the per-hour split and grouping are array operations"""
+    totals = {}
+    if not bookings:
+        return totals
+    rooms = sorted({row[0] for row in bookings}, key=str)
+    index = {room: i for i, room in enumerate(rooms)}
+    room_index = np.fromiter((index[row[0]] for row in bookings), dtype=np.int64, count=len(bookings))
+    # Epoch seconds; numpy's own datetime conversion is several times slower than this
+    start = np.fromiter(((row[1] - EPOCH) // SECOND for row in bookings), dtype=np.int64, count=len(bookings))
+    end = np.fromiter((((row[2] or row[1]) - EPOCH) // SECOND for row in bookings), dtype=np.int64,
+                      count=len(bookings))
+    status = np.array([row[3] or '' for row in bookings])
+    approved = status == 'approved'
+    rate = np.array([rates.get(room, 0) for room in rooms], dtype=np.int64)[room_index]
+
+    # One element per (approved booking, hour it touches); end is exclusive
+    mask = approved & (end > start)
+    s, e = start[mask], end[mask]
+    pieces = (e - 1) // 3600 - s // 3600 + 1
+    owner = np.repeat(np.arange(len(s)), pieces)
+    offset = np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    hour = s[owner] // 3600 * 3600 + offset * 3600
+    seconds = np.minimum(e[owner], hour + 3600) - np.maximum(s[owner], hour)
+    cents = (2 * seconds * rate[mask][owner] + 3600) // 7200
+
+    # Counts are keyed by each booking's start, time and revenue by each hour piece
+    rows_room = np.concatenate((room_index, room_index[mask][owner]))
+    zeros, no_pieces = np.zeros(len(hour), dtype=np.int64), np.zeros(len(bookings), dtype=np.int64)
+    columns = (
+        np.concatenate((np.ones(len(bookings), dtype=np.int64), zeros)),
+        np.concatenate((approved.astype(np.int64), zeros)),
+        np.concatenate(((status == 'rejected').astype(np.int64), zeros)),
+        np.concatenate((no_pieces, seconds)),
+        np.concatenate((no_pieces, cents)),
+    )
+    for grain in GRAINS:
+        keys = rows_room * (1 << 34) + np.concatenate((_floor(start, grain), _floor(hour, grain)))
+        unique, inverse = np.unique(keys, return_inverse=True)
+        sums = [np.rint(np.bincount(inverse, weights=column, minlength=len(unique))).astype(np.int64).tolist()
+                for column in columns]
+        room_ids = [rooms[i] for i in (unique >> 34).tolist()]
+        buckets = (unique & ((1 << 34) - 1)).astype('datetime64[s]').tolist()
+        totals.update(zip(zip(room_ids, [grain] * len(unique), buckets), map(list, zip(*sums))))
+    return totals
+
+
+def _rows(totals):
+    return [
+        {'room_id': room_id, 'grain': grain, 'bucket_start': bucket, 'requested': requested,
+         'approved': approved, 'rejected': rejected, 'booked_seconds': seconds,
+         'revenue': Decimal(cents).scaleb(-2)}
+        for (room_id, grain, bucket), (requested, approved, rejected, seconds, cents)
+        in sorted(totals.items(), key=lambda item: (str(item[0][0]), item[0][1], item[0][2]))
+        if any((requested, approved, rejected, seconds, cents))
+    ]
+
+
+# ==================== INCREMENTAL MAINTENANCE ====================
+
+def _noop(target, value, oldvalue, initiator):
+    return value
+
+
+# Load the replaced value on assignment so the flush hook can subtract the old contribution
+for _name in TRACKED_ATTRIBUTES:
+    event.listen(getattr(Booking, _name), 'set', _noop, active_history=True, retval=True)
+
+
+def _changed(obj):
+    state = db.inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in TRACKED_ATTRIBUTES)
+
+
+def _old_values(obj):
+    state = db.inspect(obj)
+    values = []
+    for name in TRACKED_ATTRIBUTES:
+        history = state.attrs[name].history
+        values.append(history.deleted[0] if history.deleted else getattr(obj, name))
+    return tuple(values)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_bookings(session, flush_context, instances):
+    # Old values are read before the flush, new ones after it (new rooms have ids by then)
+    old = [_old_values(obj) for obj in session.deleted if isinstance(obj, Booking)]
+    old += [_old_values(obj) for obj in session.dirty if isinstance(obj, Booking) and _changed(obj)]
+    new = [obj for obj in session.new if isinstance(obj, Booking)]
+    new += [obj for obj in session.dirty if isinstance(obj, Booking) and _changed(obj)]
+    session.info['rollup_bookings'] = (old, new)
+    repriced = {obj.id for obj in session.dirty
+                if isinstance(obj, Room) and db.inspect(obj).attrs.hourly_rate.history.has_changes()}
+    if repriced:
+        session.info['rollup_rooms'] = repriced
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_bookings(session, flush_context):
+    old, new = session.info.pop('rollup_bookings', ((), ()))
+    repriced = session.info.pop('rollup_rooms', set())
+    if not old and not new and not repriced:
+        return
+    connection = session.connection()
+    if repriced:
+        _replace(connection.execute, _compute(connection.execute, repriced), repriced)
+    new = [tuple(getattr(obj, name) for name in TRACKED_ATTRIBUTES) for obj in new]
+    # Repriced rooms were just recomputed from the flushed bookings
+    old = [row for row in old if row[0] not in repriced]
+    new = [row for row in new if row[0] not in repriced]
+    if not old and not new:
+        return
+    room_ids = {row[0] for row in old + new if row[0] is not None}
+    rates = {room_id: _rate_cents(rate) for room_id, rate in connection.execute(
+        select(Room.id, Room.hourly_rate).where(Room.id.in_(room_ids))
+    )}
+    totals = {}
+    for room_id, start, end, status in old:
+        contributions(room_id, start, end, status, rates.get(room_id, 0), totals, sign=-1)
+    for room_id, start, end, status in new:
+        contributions(room_id, start, end, status, rates.get(room_id, 0), totals)
+    rows = _rows(totals)
+    if not rows:
+        return
+    table = RoomUsageRollup.__table__
+    stmt = insert_for(connection.dialect.name)(table).values(rows)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['room_id', 'grain', 'bucket_start'],
+        set_={name: table.c[name] + stmt.excluded[name]
+              for name in ('requested', 'approved', 'rejected', 'booked_seconds', 'revenue')},
+    ))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('rollup_bookings', None)
+    session.info.pop('rollup_rooms', None)
+
+
+# ==================== REBUILD AND REPORTS ====================
+
+def _compute(execute, room_ids=None, use_numpy=None):
+    """Rollup rows for every booking, or only those of room_ids"""
+    use_numpy = np is not None if use_numpy is None else use_numpy
+    rates = select(Room.id, Room.hourly_rate)
+    bookings = select(Booking.room_id, Booking.start_time, Booking.end_time, Booking.status)
+    if room_ids is not None:
+        rates = rates.where(Room.id.in_(room_ids))
+        bookings = bookings.where(Booking.room_id.in_(room_ids))
+    rates = {room_id: _rate_cents(rate) for room_id, rate in execute(rates)}
+    return _rows((compute_numpy if use_numpy else compute_python)(execute(bookings).all(), rates))
+
+
+def _replace(execute, rows, room_ids=None):
+    """Swap the rollups of room_ids (all rooms when None) for rows"""
+    stmt = delete(RoomUsageRollup.__table__)
+    if room_ids is not None:
+        stmt = stmt.where(RoomUsageRollup.room_id.in_(room_ids))
+    execute(stmt)
+    for start in range(0, len(rows), BATCH_SIZE):
+        execute(RoomUsageRollup.__table__.insert(), rows[start:start + BATCH_SIZE])
+
+
+def rebuild(use_numpy=None):
+    """Recompute every rollup from bookings; returns the number of rollup rows"""
+    rows = _compute(db.session.execute, use_numpy=use_numpy)
+    _replace(db.session.execute, rows)
+    db.session.commit()
+    return len(rows)
+
+
+@task('rollups.rebuild')
+def rebuild_job():
+    return {'rows': rebuild()}
+
+
+def report(start, end, grain, room_ids=None):
+    """Per-room buckets and totals for [start, end) at grain, read only from rollups"""
+    start = truncate(start, grain)
+    query = (
+        select(RoomUsageRollup, Room.name)
+        .join(Room, Room.id == RoomUsageRollup.room_id)
+        .where(RoomUsageRollup.grain == grain,
+               RoomUsageRollup.bucket_start >= start,
+               RoomUsageRollup.bucket_start < end)
+        .order_by(Room.name, RoomUsageRollup.bucket_start)
+    )
+    if room_ids:
+        query = query.where(RoomUsageRollup.room_id.in_(room_ids))
+
+    rooms = {}
+    for rollup, name in db.session.execute(query):
+        room = rooms.setdefault(rollup.room_id, {'room_id': rollup.room_id, 'name': name, 'buckets': [],
+                                                 'sums': [0, 0, 0, 0, Decimal('0.00')]})
+        values = (rollup.requested, rollup.approved, rollup.rejected, rollup.booked_seconds, rollup.revenue)
+        room['buckets'].append(
+            dict(start=rollup.bucket_start, **_metrics(*values, bucket_seconds(rollup.bucket_start, grain)))
+        )
+        room['sums'] = [total + value for total, value in zip(room['sums'], values)]
+    for room in rooms.values():
+        room['totals'] = _metrics(*room.pop('sums'), (end - start).total_seconds())
+    return list(rooms.values())
+
+
+def _metrics(requested, approved, rejected, seconds, revenue, length_seconds):
+    decided = approved + rejected
+    return {
+        'requested': requested,
+        'approved': approved,
+        'rejected': rejected,
+        'approval_rate': round(approved / decided, 4) if decided else None,
+        'booked_hours': round(seconds / 3600, 2),
+        'utilization': round(seconds / length_seconds, 4),
+        'revenue': revenue,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild room utilization and revenue rollups from bookings')
+    parser.add_argument('--python', action='store_true', help='Use the pure Python path instead of NumPy')
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        print(f'{rebuild(use_numpy=False if args.python else None)} rollup rows')
@@ -0,0 +1,40 @@
+"""
+Schema checks for Corporate Office 101
+Reports foreign keys without an index whose leading columns cover them; such
+keys make joins from the parent side and ON DELETE checks scan the child table
+"""
+import argparse
+
+from sqlalchemy import inspect
+
+
+def unindexed_foreign_keys(engine):
+    """Return (table, columns, referred table) for every foreign key lacking a covering index"""
+    inspector = inspect(engine)
+    missing = []
+    for table in inspector.get_table_names():
+        if table == 'alembic_version':
+            continue
+        prefixes = [tuple(index['column_names']) for index in inspector.get_indexes(table)]
+        prefixes += [tuple(c['column_names']) for c in inspector.get_unique_constraints(table)]
+        prefixes.append(tuple(inspector.get_pk_constraint(table)['constrained_columns']))
+        for fk in inspector.get_foreign_keys(table):
+            columns = tuple(fk['constrained_columns'])
+            if not any(prefix[:len(columns)] == columns for prefix in prefixes):
+                missing.append((table, columns, fk['referred_table']))
+    return missing
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report foreign keys without a covering index')
+    parser.add_argument('--strict', action='store_true', help='Exit non-zero when any are found')
+    args = parser.parse_args()
+
+    from app import app, db
+    with app.app_context():
+        missing = unindexed_foreign_keys(db.engine)
+    for table, columns, referred in missing:
+        print(f'{table}({", ".join(columns)}) -> {referred}: no covering index')
+    print(f'{len(missing)} foreign key(s) without an index')
+    if args.strict and missing:
+        raise SystemExit(1)
@@ -0,0 +1,139 @@
+"""
+Full-text search for Corporate Office 101
+One statement ranks matches across events, messages and service requests from
+their GIN-indexed search_vector columns (see fulltext.py) and pages through
+them with a keyset cursor on (rank, type, id), so later pages cost the same as
+the first. Snippets are highlighted only for the rows on the returned page
+"""
+import base64
+import html
+import json
+from collections import namedtuple
+
+from sqlalchemy import Float, and_, cast, func, literal, or_, select, union_all
+
+from fulltext import CONFIG
+from keys import parse_key
+from models import db, Event, Message, ServiceRequest
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_QUERY_LENGTH = 200
+SNIPPET_CHARS = 200
+
+# Control characters mark highlights so the snippet can be HTML-escaped afterwards
+_START, _STOP = '\x02', '\x03'
+HEADLINE_OPTIONS = (f'StartSel={_START}, StopSel={_STOP}, MaxWords=35, MinWords=15, '
+                    'MaxFragments=2, FragmentDelimiter=" … "')
+
+# title and body are what a result shows; body is highlighted
+Source = namedtuple('Source', ['model', 'title', 'body'])
+
+SOURCES = {
+    'events': Source(Event, Event.title, func.coalesce(Event.description, Event.title)),
+    'messages': Source(Message, literal(None), Message.content),
+    'service_requests': Source(ServiceRequest, ServiceRequest.type, ServiceRequest.description),
+}
+TYPES = tuple(SOURCES)
+
+
+class InvalidCursor(ValueError):
+    """The cursor was not produced by search()"""
+
+
+def encode_cursor(rank, kind, row_id):
+    data = json.dumps([rank, kind, str(row_id)], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        rank, kind, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if kind not in SOURCES:
+            raise ValueError(kind)
+        return float(rank), kind, parse_key(row_id)
+    except (TypeError, ValueError) as e:
+        raise InvalidCursor(str(e)) from e
+
+
+def _terms(text):
+    """Substring patterns for the SQLite fallback, with LIKE wildcards escaped"""
+    return ['%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            for term in text.split()]
+
+
+def _after(kind, rank, row_id, cursor):
+    """Keyset condition: rows that sort after the cursor in (rank DESC, type DESC, id DESC)"""
+    last_rank, last_kind, last_id = cursor
+    if kind < last_kind:
+        return rank <= last_rank
+    if kind > last_kind:
+        return rank < last_rank
+    return or_(rank < last_rank, and_(rank == last_rank, row_id < last_id))
+
+
+def _highlight(snippet):
+    return html.escape(snippet or '').replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+def search(text, types=TYPES, filters=None, limit=PAGE_SIZE, cursor=None):
+    """One page of matches, best first; returns (results, next cursor or None)
+
+    text uses web search syntax ("quoted phrase", -excluded, or). filters maps a
+    type to extra WHERE clauses, which is how callers restrict what a role may see.
+    """
+    filters = filters or {}
+    after = decode_cursor(cursor) if cursor else None
+    postgres = db.session.get_bind().dialect.name == 'postgresql'
+    query = func.websearch_to_tsquery(CONFIG, text)
+
+    branches = []
+    for kind in types:
+        model = SOURCES[kind].model
+        if postgres:
+            matched = model.search_vector.op('@@')(query)
+            rank = cast(func.ts_rank_cd(model.search_vector, query), Float)
+        else:
+            # SQLite development databases: every word as a substring, unranked
+            matched = and_(*(model.search_vector.ilike(term, escape='\\') for term in _terms(text)))
+            rank = cast(literal(0), Float)
+        branch = select(literal(kind).label('type'), model.id.label('id'), rank.label('rank'))
+        branch = branch.where(matched, *filters.get(kind, ()))
+        if after:
+            branch = branch.where(_after(kind, rank, model.id, after))
+        # Each branch stops at limit + 1 rows, so the merge never sees more than that per type
+        branches.append(select(branch.order_by(rank.desc(), model.id.desc()).limit(limit + 1).subquery()))
+
+    merged = union_all(*branches).subquery()
+    rows = db.session.execute(
+        select(merged).order_by(merged.c.rank.desc(), merged.c.type.desc(), merged.c.id.desc()).limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    details = {}
+    for kind in {row.type for row in rows}:
+        source = SOURCES[kind]
+        if postgres:
+            snippet = func.ts_headline(CONFIG, source.body, query, HEADLINE_OPTIONS)
+        else:
+            snippet = func.substr(source.body, 1, SNIPPET_CHARS)
+        for row in db.session.execute(
+            select(source.model.id, source.title.label('title'), snippet.label('snippet'), source.model.created_at)
+            .where(source.model.id.in_([r.id for r in rows if r.type == kind]))
+        ):
+            details[kind, row.id] = row
+
+    results = []
+    for row in rows:
+        detail = details[row.type, row.id]
+        results.append({
+            'type': row.type,
+            'id': row.id,
+            'rank': row.rank,
+            'title': detail.title,
+            'snippet': _highlight(detail.snippet),
+            'created_at': detail.created_at,
+        })
+    next_cursor = encode_cursor(rows[-1].rank, rows[-1].type, rows[-1].id) if has_more else None
+    return results, next_cursor
@@ -0,0 +1,186 @@
+"""
+Response serializers for Corporate Office 101 API
+Compiles one encoder per model and renders JSON through orjson when available
+"""
+import json
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import Date, DateTime, Numeric, Time, Uuid, select
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None
+
+from models import (
+    User, Tenant, PropertyManager, Payment, Event, EventDocument, EventRSVP,
+    Room, Booking, ServiceRequest, Message, DirectoryEntry, AuditLog
+)
+
+
+def _decimal(value):
+    """Render Decimal exactly (no float round trip)"""
+    return str(value)
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _converter_for(column_type, exact_decimals=False):
+    """Pick the value converter for a column type, or None when JSON-native
+
+    Numeric columns become JSON numbers, as the mobile client has always read
+    them; exact_decimals renders them as decimal strings instead.
+    """
+    if isinstance(column_type, Numeric):
+        return _decimal if exact_decimals else float
+    if isinstance(column_type, (Date, DateTime, Time)):
+        return _isoformat
+    if isinstance(column_type, Uuid):
+        return str
+    return None
+
+
+class ModelSerializer:
+    """Serializer for one model, compiled once from its column types"""
+
+    def __init__(self, model, fields, exact_decimals=False):
+        self.model = model
+        self.fields = tuple(fields)
+        self.exact_decimals = exact_decimals
+        self.encode = self._compile()
+
+    def _compile(self):
+        columns = self.model.__table__.columns
+        namespace = {}
+        items = []
+        for index, name in enumerate(self.fields):
+            converter = _converter_for(columns[name].type, self.exact_decimals)
+            if converter is None:
+                items.append(f'{name!r}: obj.{name}')
+            else:
+                namespace[f'_c{index}'] = converter
+                items.append(
+                    f'{name!r}: None if (v{index} := obj.{name}) is None else _c{index}(v{index})'
+                )
+        source = 'def encode(obj):\n    return {' + ', '.join(items) + '}\n'
+        exec(compile(source, f'<serializer {self.model.__name__}>', 'exec'), namespace)
+        return namespace['encode']
+
+    def many(self, objects):
+        encode = self.encode
+        return [encode(obj) for obj in objects]
+
+    def select(self):
+        """SELECT of just the serialized columns; rows feed encode() directly"""
+        return select(*(getattr(self.model, name) for name in self.fields))
+
+
+_registry = {}
+
+
+def register(model, fields):
+    """Register (or replace) the serializer for a model"""
+    serializer = ModelSerializer(model, fields)
+    _registry[model] = serializer
+    return serializer
+
+
+def serializer_for(model):
+    return _registry[model]
+
+
+def serialize(obj, model=None):
+    """Serialize a single model instance (or row with matching attributes)"""
+    return _registry[model or type(obj)].encode(obj)
+
+
+def serialize_many(objects, model):
+    """Serialize an iterable of model instances or rows"""
+    return _registry[model].many(objects)
+
+
+def select_fields(model):
+    """Column-projected SELECT for a model's serialized fields (no ORM hydration)"""
+    return _registry[model].select()
+
+
+register(User, ['id', 'email', 'role', 'created_at'])
+register(Tenant, ['id', 'user_id', 'business_name', 'suite_number', 'contact_info',
+                  'email_notifications_enabled'])
+register(PropertyManager, ['id', 'user_id', 'name', 'email'])
+register(Payment, ['id', 'amount', 'due_date', 'paid_date', 'status', 'is_recurring'])
+register(Event, ['id', 'title', 'description', 'event_date', 'event_time', 'location',
+                 'contact_person', 'requires_rsvp', 'created_at'])
+register(EventDocument, ['id', 'event_id', 'file_url', 'file_name', 'uploaded_at'])
+register(EventRSVP, ['id', 'event_id', 'tenant_id', 'status', 'rsvped_at'])
+register(Room, ['id', 'name', 'hourly_rate'])
+register(Booking, ['id', 'room_id', 'tenant_id', 'start_time', 'end_time', 'purpose',
+                   'num_attendees', 'status', 'created_at', 'approved_at'])
+register(ServiceRequest, ['id', 'tenant_id', 'type', 'description', 'urgency', 'photo_url',
+                          'status', 'created_at', 'updated_at'])
+register(Message, ['id', 'sender_id', 'recipient_type', 'content', 'is_urgent',
+                   'is_important', 'created_at', 'expires_at'])
+register(DirectoryEntry, ['id', 'suite_number', 'business_name', 'map_coordinates'])
+register(AuditLog, ['id', 'occurred_at', 'actor_id', 'source', 'ip', 'action', 'entity_type', 'entity_id',
+                    'changes'])
+
+
+# ==================== JSON BACKEND ====================
+
+def _default(obj):
+    """Fallback for types neither backend handles natively
+
+    Decimal becomes a JSON number, as Numeric columns do, so every endpoint
+    sends amounts the same way.
+    """
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps_bytes(obj, sort_keys=False, indent=False):
+    """Encode to UTF-8 JSON bytes with the fastest available backend"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+    return json.dumps(
+        obj, default=_default, sort_keys=sort_keys, indent=2 if indent else None,
+        separators=None if indent else (',', ':'), ensure_ascii=False
+    ).encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, falling back to the stdlib"""
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if set(kwargs) - {'sort_keys'}:
+            # indent, default, separators and the like: let the stdlib honor them
+            kwargs.setdefault('default', _default)
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj, sort_keys=kwargs.get('sort_keys', self.sort_keys)).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        body = dumps_bytes(obj, sort_keys=self.sort_keys, indent=indent)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
@@ -18,5 +18,13 @@ fi
 # Uncomment the following line after first deployment
 # python init_db.py
 
-# Start Gunicorn
-gunicorn --bind=0.0.0.0:8000 --timeout 600 --workers 4 app:app
+# Re-tile floor maps whose pages changed (a no-op when the map is unchanged)
+python map_tiles.py
+
+# Start the background job worker (billing, notifications, webhooks)
+python worker.py &
+
+# Start Gunicorn; workers read WEB_CONCURRENCY and WEB_THREADS to size their password hash pools
+export WEB_CONCURRENCY=${WEB_CONCURRENCY:-4}
+export WEB_THREADS=${WEB_THREADS:-4}
+gunicorn --bind=0.0.0.0:8000 --timeout 600 --workers "$WEB_CONCURRENCY" --threads "$WEB_THREADS" app:app
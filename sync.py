@@ -0,0 +1,200 @@
+"""
+Delta sync for Corporate Office 101 mobile clients
+Every insert or update of a synced model stamps the row with the next value of
+one global change counter, and every delete leaves a tombstone with its own
+version. Clients send the last version they saw and receive only newer rows,
+a bounded page at a time, so the work done scales with the amount of change
+
+Tombstones record the columns that decide who may see a row (SCOPES), so they
+can be filtered like the rows. A row whose scope changes, such as a booking
+moved to another tenant, also leaves a tombstone for the clients that lose it
+"""
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, event, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from jobs import task
+from models import db, Event, DirectoryEntry, Message, Booking, ServiceRequest, SyncCounter, SyncTombstone
+from serializers import serialize_many, select_fields
+
+SYNCED = {
+    'events': Event,
+    'directory_entries': DirectoryEntry,
+    'messages': Message,
+    'bookings': Booking,
+    'service_requests': ServiceRequest,
+}
+PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+TOMBSTONE_DAYS = int(os.getenv('SYNC_TOMBSTONE_DAYS', '30'))
+
+# Columns of synced rows that limit which clients see them; tombstones keep their values
+SCOPES = {
+    'bookings': ('tenant_id',),
+    'service_requests': ('tenant_id',),
+    'messages': ('recipient_type',),
+}
+
+_synced_models = frozenset(SYNCED.values())
+
+
+class SyncExpired(Exception):
+    """The client's version predates purged tombstones; it must resync from 0"""
+
+
+def allocate(connection, count):
+    """Reserve count consecutive versions and return the first
+
+    The UPDATE keeps the counter row locked until the transaction ends, so
+    versions become visible in the order they were handed out: a client that
+    has seen version N can never later miss a commit numbered below N.
+    """
+    table = SyncCounter.__table__
+    top = connection.execute(
+        update(table).where(table.c.id == 1).values(version=table.c.version + count).returning(table.c.version)
+    ).scalar()
+    if top is None:
+        connection.execute(insert(table).values(id=1, version=count, purged_version=0))
+        top = count
+    return top - count + 1
+
+
+def _noop(target, value, oldvalue, initiator):
+    return value
+
+
+# Load the replaced value on assignment so a moved row's tombstone gets its old scope
+for _name, _columns in SCOPES.items():
+    for _column in _columns:
+        event.listen(getattr(SYNCED[_name], _column), 'set', _noop, active_history=True, retval=True)
+
+
+def _old_scope(obj):
+    state = db.inspect(obj)
+    scope = {}
+    for name in SCOPES.get(obj.__tablename__, ()):
+        history = state.attrs[name].history
+        scope[name] = history.deleted[0] if history.deleted else getattr(obj, name)
+    return scope
+
+
+def _moved(obj):
+    state = db.inspect(obj)
+    return any(state.attrs[name].history.deleted for name in SCOPES.get(obj.__tablename__, ()))
+
+
+def _tombstone(obj, version):
+    return SyncTombstone(version=version, table_name=obj.__tablename__, row_id=str(obj.id), **_old_scope(obj))
+
+
+@event.listens_for(Session, 'before_flush')
+def _stamp_versions(session, flush_context, instances):
+    dirty = [obj for obj in session.dirty if type(obj) in _synced_models
+             and session.is_modified(obj, include_collections=False)]
+    changed = [obj for obj in session.new if type(obj) in _synced_models] + dirty
+    moved = [obj for obj in dirty if _moved(obj)]
+    deleted = [obj for obj in session.deleted if type(obj) in _synced_models]
+    if not changed and not deleted:
+        return
+    version = allocate(session.connection(), len(moved) + len(changed) + len(deleted))
+    # Numbered before the row's new version, so a client that can still see it re-adds it
+    for obj in moved:
+        session.add(_tombstone(obj, version))
+        version += 1
+    for obj in changed:
+        obj.change_version = version
+        version += 1
+    for obj in deleted:
+        session.add(_tombstone(obj, version))
+        version += 1
+
+
+def tombstones(connection, table_name, row_ids, first_version):
+    """Insert tombstones for rows removed by a bulk DELETE; versions come from allocate()
+
+    Only for tables without SCOPES, since the tombstones carry no scope.
+    """
+    if row_ids:
+        connection.execute(insert(SyncTombstone.__table__), [
+            {'version': first_version + i, 'table_name': table_name, 'row_id': str(row_id)}
+            for i, row_id in enumerate(row_ids)
+        ])
+
+
+def changes_since(since, limit=PAGE_SIZE, filters=None, deleted_filters=None):
+    """One page of rows and tombstones newer than since, in version order
+
+    filters maps a table name to extra WHERE clauses limiting what this client
+    may see, or to None to leave the table out. deleted_filters maps a table
+    name to the matching clauses on SyncTombstone's scope columns. Returns
+    (changes, deleted, version, has_more); version is the value to send as
+    since next time.
+    """
+    filters = filters or {}
+    deleted_filters = deleted_filters or {}
+    current, purged = db.session.execute(
+        select(SyncCounter.version, SyncCounter.purged_version).where(SyncCounter.id == 1)
+    ).first() or (0, 0)
+    if 0 < since < purged:
+        raise SyncExpired()
+
+    tables = [name for name in SYNCED if filters.get(name, ()) is not None]
+    page = []
+    for name in tables:
+        model = SYNCED[name]
+        rows = db.session.execute(
+            select_fields(model).add_columns(model.change_version)
+            .where(model.change_version > since, *filters.get(name, ()))
+            .order_by(model.change_version)
+            .limit(limit + 1)
+        ).all()
+        page.extend((row.change_version, name, row) for row in rows)
+    if since > 0:
+        # A client starting from 0 has nothing to delete
+        rows = db.session.execute(
+            select(SyncTombstone.version, SyncTombstone.table_name, SyncTombstone.row_id)
+            .where(SyncTombstone.version > since, or_(*(
+                and_(SyncTombstone.table_name == name, *deleted_filters.get(name, ())) for name in tables
+            )))
+            .order_by(SyncTombstone.version)
+            .limit(limit + 1)
+        ).all()
+        page.extend((row.version, None, row) for row in rows)
+
+    page.sort(key=lambda item: item[0])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    changed, deleted = {}, {}
+    current_rows = {(name, str(row.id)) for _, name, row in page if name is not None}
+    for _, name, row in page:
+        if name is None:
+            if (row.table_name, row.row_id) in current_rows:
+                continue  # moved, but still visible to this client at a later version in this page
+            deleted.setdefault(row.table_name, []).append(row.row_id)
+        else:
+            changed.setdefault(name, []).append(row)
+    changes = {name: serialize_many(rows, SYNCED[name]) for name, rows in changed.items()}
+
+    last = page[-1][0] if page else since
+    # Without more pages the client is current up to the committed counter,
+    # which also skips versions of rows it is not allowed to see
+    version = last if has_more else max(last, current)
+    return changes, deleted, version, has_more
+
+
+@task('sync.purge_tombstones')
+def purge_tombstones(days=TOMBSTONE_DAYS):
+    """Drop old tombstones; clients that have not synced since then start over"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    newest = db.session.execute(
+        select(func.max(SyncTombstone.version)).where(SyncTombstone.deleted_at < cutoff)
+    ).scalar()
+    if newest is None:
+        return
+    db.session.execute(delete(SyncTombstone).where(SyncTombstone.version <= newest))
+    # Everything at or below an earlier purged_version is already gone, so newest only grows
+    db.session.execute(update(SyncCounter.__table__).where(SyncCounter.id == 1).values(purged_version=newest))
+    db.session.commit()
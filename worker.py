@@ -0,0 +1,96 @@
+"""
+Background job worker for Corporate Office 101
+Runs alongside gunicorn: python worker.py
+Starts JOB_WORKERS processes that claim jobs from the jobs table; the parent
+process enqueues cron schedules and restarts children that exit
+"""
+import multiprocessing
+import os
+import signal
+import time
+
+# Worker processes
+workers = int(os.getenv('JOB_WORKERS', max(multiprocessing.cpu_count() // 2, 1)))
+poll_interval = float(os.getenv('JOB_POLL_INTERVAL', '1.0'))
+
+# Modules whose @task handlers the workers can run
+task_modules = ['billing', 'notifications', 'revocation', 'sync', 'dashboard', 'rollups', 'partitions',
+                'ratelimit']
+
+# Cron schedules (UTC): (task name, cron expression, payload)
+schedules = [
+    ('billing.run_cycle', '0 2 25 * *', {}),        # bill next month on the 25th
+    ('billing.sweep_overdue', '15 0 * * *', {}),    # daily after midnight
+    ('notifications.drain', '* * * * *', {}),       # every minute
+    ('notifications.purge', '55 3 * * *', {}),      # daily, drops delivered rows after NOTIFICATION_RETENTION_DAYS
+    ('auth.purge_revocations', '30 3 * * *', {}),   # daily
+    ('ratelimit.purge', '10 * * * *', {}),          # hourly, drops buckets idle for a day
+    ('sync.purge_tombstones', '45 3 * * *', {}),    # daily
+    ('dashboard.recompute', '5 * * * *', {}),       # hourly drift correction
+    ('rollups.rebuild', '0 4 * * 0', {}),           # weekly, reprices at current rates
+    ('partitions.ensure', '20 1 * * *', {}),        # daily, keeps future months ready
+    ('partitions.archive', '40 1 2 * *', {}),       # monthly, exports and drops old months
+    ('jobs.purge', '50 3 * * *', {}),               # daily, drops finished jobs after JOB_RETENTION_DAYS
+]
+
+_stopping = False
+
+
+def _stop(signum, frame):
+    global _stopping
+    _stopping = True
+
+
+def _load():
+    import importlib
+    from app import app
+    for module in task_modules:
+        importlib.import_module(module)
+    return app
+
+
+def child_main():
+    """Job loop for one worker process"""
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    import jobs
+    app = _load()
+    with app.app_context():
+        jobs.work(poll_interval=poll_interval, stop=lambda: _stopping)
+
+
+def main():
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    import jobs
+    app = _load()
+
+    context = multiprocessing.get_context('spawn')
+    children = []
+
+    def spawn():
+        process = context.Process(target=child_main, name='corporate-office-worker')
+        process.start()
+        return process
+
+    children = [spawn() for _ in range(workers)]
+    cron = [jobs.Schedule(name, expression, payload) for name, expression, payload in schedules]
+    last_minute = None
+
+    while not _stopping:
+        minute = int(time.time() // 60)
+        if minute != last_minute:
+            with app.app_context():
+                jobs.enqueue_due_schedules(cron)
+            last_minute = minute
+        children = [c if c.is_alive() else spawn() for c in children]
+        time.sleep(1)
+
+    for child in children:
+        child.terminate()
+    for child in children:
+        child.join(timeout=30)
+
+
+if __name__ == '__main__':
+    main()